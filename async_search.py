@@ -0,0 +1,167 @@
+import asyncio
+import time
+from collections.abc import Iterable
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Any
+
+from opensearchpy import TransportError
+from opensearchpy.helpers import expand_action
+
+from bulk_indexing import BuildBodies, BulkIndexResult, BulkItemFailure, GenerateActions, generate_index_actions
+from full_example import SEARCH_BODY_VARIANT, default_search_filters
+from query_builder import SearchFilters, build_search_body
+from query_cache import embed_query
+from result_cache import bump_write_generation
+
+
+async def async_hybrid_search(
+    client,
+    index_name,
+    query,
+    max_num_results=10,
+    variant=SEARCH_BODY_VARIANT,
+    executor: Executor | None = None,
+    filters: SearchFilters | None = None,
+):
+    # Same body as full_example.hybrid_search, default filters included
+    if filters is None:
+        filters = default_search_filters()
+    # The query is embedded in a worker thread so other searches on the loop keep going meanwhile
+    loop = asyncio.get_running_loop()
+    query_vector = await loop.run_in_executor(executor, embed_query, query)
+    search_body = build_search_body(variant, query, query_vector, max_num_results, filters)
+
+    return await client.search(
+        index=index_name,
+        search_pipeline="normalization_step",
+        body=search_body,
+        include_named_queries_score=True
+    )
+
+
+def _split_requests(client, actions: list[dict], chunk_size: int, max_chunk_bytes: int) -> list[list[tuple[str, str | None]]]:
+    # Serializes each action once and groups them into _bulk requests by count and payload size
+    serializer = client.transport.serializer
+    requests: list[list[tuple[str, str | None]]] = []
+    current: list[tuple[str, str | None]] = []
+    current_bytes = 0
+    for action in actions:
+        header, data = expand_action(action)
+        lines = serializer.dumps(header) + "\n" + serializer.dumps(data) + "\n"
+        size = len(lines.encode("utf-8"))
+        if current and (len(current) >= chunk_size or current_bytes + size > max_chunk_bytes):
+            requests.append(current)
+            current, current_bytes = [], 0
+        current.append((lines, action.get("_id")))
+        current_bytes += size
+    if current:
+        requests.append(current)
+    return requests
+
+
+async def async_bulk_index_documents(
+    client,
+    index_name: str,
+    documents: Iterable[Any],
+    build_bodies: BuildBodies,
+    embed_batch_size: int = 64,
+    chunk_size: int = 500,
+    max_chunk_bytes: int = 10 * 1024 * 1024,
+    concurrency: int = 4,
+    queue_size: int = 8,
+    max_retries: int = 5,
+    initial_backoff: float = 1.0,
+    max_backoff: float = 60.0,
+    executor: Executor | None = None,
+    refresh: bool = False,
+    generate_actions: GenerateActions = generate_index_actions,
+) -> BulkIndexResult:
+    # One producer embeds documents in the executor and hands finished batches to `concurrency`
+    # senders through a bounded queue. When the cluster answers 429 every sender holds off for the
+    # backoff period, the queue fills up and the producer blocks, so embedding slows to whatever
+    # rate the cluster can absorb instead of piling up bodies in memory.
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[list[dict] | None] = asyncio.Queue(maxsize=queue_size)
+    result = BulkIndexResult()
+    cooldown_until = 0.0
+
+    actions = generate_actions(index_name, documents, build_bodies, embed_batch_size)
+
+    def _next_batch() -> list[dict]:
+        # Runs in the executor, pulling from the generator is what triggers the embedding
+        return list(islice(actions, embed_batch_size))
+
+    async def _produce():
+        while batch := await loop.run_in_executor(executor, _next_batch):
+            await queue.put(batch)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def _send(request: list[tuple[str, str | None]]):
+        nonlocal cooldown_until
+        pending = request
+        for attempt in range(max_retries + 1):
+            delay = cooldown_until - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                response = await client.bulk(body="".join(lines for lines, _ in pending))
+            except TransportError as e:
+                if e.status_code == 429 and attempt < max_retries:
+                    cooldown_until = max(cooldown_until, loop.time() + min(max_backoff, initial_backoff * 2 ** attempt))
+                    continue
+                result.failures.extend(
+                    BulkItemFailure(document_id=document_id, status=e.status_code, error=e.error)
+                    for _, document_id in pending
+                )
+                return
+            except Exception as e:
+                result.failures.extend(
+                    BulkItemFailure(document_id=document_id, status=None, error=str(e))
+                    for _, document_id in pending
+                )
+                return
+
+            bump_write_generation(index_name)
+            rejected = []
+            for (lines, document_id), item in zip(pending, response["items"]):
+                _, info = item.popitem()
+                status = info.get("status", 500)
+                if 200 <= status < 300:
+                    result.indexed += 1
+                elif status == 429 and attempt < max_retries:
+                    rejected.append((lines, document_id))
+                else:
+                    result.failures.append(BulkItemFailure(
+                        document_id=info.get("_id", document_id),
+                        status=status,
+                        error=info.get("error"),
+                    ))
+            if not rejected:
+                return
+            pending = rejected
+            cooldown_until = max(cooldown_until, loop.time() + min(max_backoff, initial_backoff * 2 ** attempt))
+
+    async def _consume():
+        while (batch := await queue.get()) is not None:
+            for request in _split_requests(client, batch, chunk_size, max_chunk_bytes):
+                await _send(request)
+
+    start = time.perf_counter()
+    tasks = [asyncio.ensure_future(_produce()), *(asyncio.ensure_future(_consume()) for _ in range(concurrency))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # If one side fails the other would wait forever on the queue (the producer on a full one,
+        # the senders on an empty one), so everything still running is cancelled before re-raising
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    if refresh:
+        await client.indices.refresh(index=index_name)
+        bump_write_generation(index_name)
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
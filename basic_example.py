@@ -1,14 +1,17 @@
 from dataclasses import dataclass
 
-from opensearchpy import OpenSearch
-
-from utils import EMBEDDING_DIM, vectorize, TextType
-
-@dataclass
+from bulk_indexing import bulk_index_documents
+from hybrid_fusion import fused_hybrid_search
+from opensearch_client import get_opensearch_client
+from query_cache import embed_query
+from result_cache import bump_write_generation
+from utils import EMBEDDING_DIM, batch_vectorize, TextType
+
+@dataclass(slots=True)
 class MinimalChunk:
     content: str
 
-@dataclass
+@dataclass(slots=True)
 class MinimalDoc:
     title: str
     chunks: list[MinimalChunk]
@@ -44,16 +47,6 @@ DOC_3 = MinimalDoc(
 
 DOCUMENTS = [DOC_1, DOC_2, DOC_3]
 
-def get_opensearch_client():
-    return OpenSearch(
-        hosts=[{"host": "localhost", "port": 9200}],
-        http_auth=("admin", "D@nswer_1ndex"),
-        use_ssl=True,
-        verify_certs=False,
-        ssl_show_warn=False
-    )
-
-
 def create_index(client, index_name):
     hnsw_config = {
         "type": "knn_vector",
@@ -122,24 +115,44 @@ def add_normalization_processor(client):
     client.search_pipeline.put(id="normalization_step", body=pipeline_body)
 
 
-def index_document(client, index_name, document: MinimalDoc):
-    doc = {
-        "title": document.title,
-        "chunks": [
-            {
-                "content": chunk.content,
-                "embedding": vectorize(chunk.content, TextType.PASSAGE)
-            } for chunk in document.chunks
-        ],
-    }
+def build_index_bodies(documents: list[MinimalDoc]) -> list[dict]:
+    # All chunks of all the documents go through the model as one batch
+    embeddings = iter(batch_vectorize([
+        (chunk.content, TextType.PASSAGE)
+        for document in documents
+        for chunk in document.chunks
+    ]))
+
+    return [
+        {
+            "title": document.title,
+            "chunks": [
+                {
+                    "content": chunk.content,
+                    "embedding": next(embeddings)
+                } for chunk in document.chunks
+            ],
+        } for document in documents
+    ]
+
+
+def index_document(client, index_name, document: MinimalDoc, doc: dict | None = None):
+    if doc is None:
+        doc = build_index_bodies([document])[0]
 
     print(f"Indexing {document.title} document")
     response = client.index(index=index_name, body=doc)
+    bump_write_generation(index_name)
     print(response)
 
 
+def index_documents(client, index_name, documents: list[MinimalDoc]):
+    for document, doc in zip(documents, build_index_bodies(documents)):
+        index_document(client, index_name, document, doc)
+
+
 def hybrid_search_v1(client, index_name, query, max_num_results=10):
-        query_vector = vectorize(query, TextType.QUERY)
+        query_vector = embed_query(query)
 
         # We need to use the nested field and also hybrid
         # Either the hybrid is on the outside or the nested is on the outside
@@ -210,7 +223,7 @@ def hybrid_search_v1(client, index_name, query, max_num_results=10):
 
 
 def hybrid_search_v2(client, index_name, query, max_num_results=10):
-    query_vector = vectorize(query, TextType.QUERY)
+    query_vector = embed_query(query)
 
     # This one is wrong for other reasons, the inner hits are definitely not normalized
     # We tried changing the normalization weighting and it does not change anything
@@ -271,13 +284,19 @@ def main():
 
     add_normalization_processor(client)
 
-    for document in DOCUMENTS:
-       index_document(client, index_name, document)
+    result = bulk_index_documents(client, index_name, DOCUMENTS, build_index_bodies, refresh=True)
+    print(f"Indexed {result.indexed} documents in {result.elapsed_seconds:.2f}s, {len(result.failures)} failures")
+    for failure in result.failures:
+        print(failure)
 
     print("Performing hybrid search")
     print(hybrid_search_v1(client, index_name, "Florida"))
     print(hybrid_search_v2(client, index_name, "Florida"))
 
+    print("Performing client side fused hybrid search")
+    for fused_chunk in fused_hybrid_search(client, index_name, "Florida"):
+        print(fused_chunk)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
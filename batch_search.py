@@ -0,0 +1,65 @@
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+
+from opensearchpy import TransportError
+
+from full_example import SEARCH_BODY_VARIANT, default_search_filters
+from query_builder import SearchFilters, build_search_body
+from utils import TextType, batch_vectorize
+
+
+@dataclass
+class BatchSearchResult:
+    query: str
+    response: dict | None
+    error: object | None = None
+
+
+def _default_body(query, query_vector, max_num_results, filters: SearchFilters) -> dict:
+    return build_search_body(SEARCH_BODY_VARIANT, query, query_vector, max_num_results, filters)
+
+
+def batch_hybrid_search(
+    client,
+    index_name: str,
+    queries: Sequence[str],
+    max_num_results: int = 10,
+    msearch_chunk_size: int = 50,
+    search_pipeline: str | None = "normalization_step",
+    build_body: Callable[[str, object, int, SearchFilters], dict] = _default_body,
+    filters: SearchFilters | None = None,
+) -> list[BatchSearchResult]:
+    # All queries are embedded in one model batch, then sent msearch_chunk_size at a time as _msearch
+    # requests. Results come back in the order of `queries`. A query that fails, or whose whole
+    # _msearch request fails, gets its error recorded instead of failing the rest of the batch.
+    # Falls back to the same filters as full_example.hybrid_search
+    if filters is None:
+        filters = default_search_filters()
+    query_vectors = batch_vectorize([(query, TextType.QUERY) for query in queries])
+    params = {"search_pipeline": search_pipeline} if search_pipeline else None
+
+    results: list[BatchSearchResult] = []
+    for start in range(0, len(queries), msearch_chunk_size):
+        chunk_queries = queries[start:start + msearch_chunk_size]
+        chunk_vectors = query_vectors[start:start + msearch_chunk_size]
+
+        body = []
+        for query, query_vector in zip(chunk_queries, chunk_vectors):
+            body.append({})
+            # _msearch has no URL parameter for it, so each search asks for the _name scores in its
+            # body, the same scores hybrid_search gets back
+            body.append({"include_named_queries_score": True, **build_body(query, query_vector, max_num_results, filters)})
+
+        try:
+            response = client.msearch(index=index_name, body=body, params=params)
+        except TransportError as e:
+            results.extend(BatchSearchResult(query=query, response=None, error=e) for query in chunk_queries)
+            continue
+
+        for query, item in zip(chunk_queries, response["responses"]):
+            if "error" in item:
+                results.append(BatchSearchResult(query=query, response=None, error=item["error"]))
+            else:
+                results.append(BatchSearchResult(query=query, response=item))
+
+    return results
@@ -0,0 +1,42 @@
+# Looped single-query hybrid_search vs batch_hybrid_search over _msearch
+# Needs a running cluster with an index built by full_example
+# Run from the repo root: python -m benchmarks.batch_search
+import argparse
+import time
+
+from batch_search import batch_hybrid_search
+from benchmarks.corpus import synthetic_chunks
+from full_example import hybrid_search
+from opensearch_client import get_opensearch_client
+from utils import warmup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default="danswer-index")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--msearch-chunk-sizes", type=int, nargs="+", default=[10, 50, 100])
+    args = parser.parse_args()
+
+    client = get_opensearch_client()
+    warmup()
+
+    # Each run gets its own queries so none of them benefits from vectors cached by an earlier run
+    looped_queries = synthetic_chunks(args.num_queries, 1, 6, seed=1)
+    start = time.perf_counter()
+    for query in looped_queries:
+        hybrid_search(client, args.index, query)
+    elapsed = time.perf_counter() - start
+    print(f"looped hybrid_search        {args.num_queries / elapsed:8.1f} queries/s  ({elapsed:.2f}s)")
+
+    for seed, chunk_size in enumerate(args.msearch_chunk_sizes, start=2):
+        queries = synthetic_chunks(args.num_queries, 1, 6, seed=seed)
+        start = time.perf_counter()
+        results = batch_hybrid_search(client, args.index, queries, msearch_chunk_size=chunk_size)
+        elapsed = time.perf_counter() - start
+        errors = sum(result.error is not None for result in results)
+        print(f"batched (msearch of {chunk_size:>4})  {args.num_queries / elapsed:8.1f} queries/s  ({elapsed:.2f}s, {errors} errors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Initial load with and without bulk_load_mode: load time, resulting segments and query latency after
+# Needs a running cluster, the index is recreated for each run
+# Run from the repo root: python -m benchmarks.bulk_load
+import argparse
+import time
+
+import numpy as np
+
+import full_example
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.hnsw_sweep import embed_corpus
+from bulk_indexing import bulk_index_documents
+from bulk_load import bulk_load_mode
+from opensearch_client import get_opensearch_client
+from query_cache import embed_query
+
+
+def query_latencies_ms(client, index_name: str, queries: list[str]) -> np.ndarray:
+    for query in queries[:10]:
+        full_example.hybrid_search(client, index_name, query, use_cache=False)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        full_example.hybrid_search(client, index_name, query, use_cache=False)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000
+
+
+def segment_count(client, index_name: str) -> int:
+    shards = client.indices.segments(index=index_name)["indices"][index_name]["shards"]
+    return sum(len(copy["segments"]) for copies in shards.values() for copy in copies if copy["routing"]["primary"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default="bulk-load-bench")
+    parser.add_argument("--num-documents", type=int, default=5000)
+    parser.add_argument("--chunks-per-document", type=int, default=10)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--thread-count", type=int, default=4)
+    args = parser.parse_args()
+
+    client = get_opensearch_client()
+    full_example.add_normalization_processor(client)
+    # Embedded up front so both runs time indexing only
+    documents = list(generate_corpus(args.num_documents, args.chunks_per_document))
+    embed_corpus(documents)
+    queries = generate_queries(args.num_queries)
+    for query in queries:
+        embed_query(query)
+
+    for mode in ("default", "bulk_load_mode"):
+        full_example.create_index(client, args.index)
+        start = time.perf_counter()
+        if mode == "default":
+            bulk_index_documents(
+                client, args.index, documents, full_example.build_index_bodies,
+                thread_count=args.thread_count, refresh=True,
+            )
+        else:
+            with bulk_load_mode(client, args.index) as stats:
+                bulk_index_documents(client, args.index, documents, full_example.build_index_bodies, thread_count=args.thread_count)
+        elapsed = time.perf_counter() - start
+
+        latencies = query_latencies_ms(client, args.index, queries)
+        print(
+            f"{mode:<15} load {elapsed:7.1f}s  {segment_count(client, args.index):4} segments  "
+            f"query p50 {np.percentile(latencies, 50):6.2f}ms  p95 {np.percentile(latencies, 95):6.2f}ms"
+        )
+        if mode == "bulk_load_mode":
+            print(f"{'':<15} {stats}")
+
+    client.indices.delete(index=args.index, ignore=[404])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Deterministic synthetic corpus of DanswerDocuments for benchmarks
+# The same arguments and seed always produce the same documents, in the same order
+import random
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+
+from examples import DanswerDocument, DocumentChunk
+
+
+# The sample documents' words plus generated ones, sampled with Zipf-like frequencies so that
+# keyword scoring sees a realistic mix of very common and rare terms
+BASE_WORDS = (
+    "weather florida alaska sahara humid frigid dry animal world dog cat alligator food french "
+    "fries pizza sushi document search hybrid nested chunk vector keyword score index cluster"
+).split()
+
+
+def _vocabulary(size: int) -> tuple[list[str], list[float]]:
+    words = BASE_WORDS + [f"term{i}" for i in range(max(0, size - len(BASE_WORDS)))]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+VOCABULARY, VOCABULARY_WEIGHTS = _vocabulary(5000)
+
+
+def synthetic_text(rng: random.Random, min_words: int, max_words: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, weights=VOCABULARY_WEIGHTS, k=rng.randint(min_words, max_words)))
+
+
+def synthetic_chunks(num_chunks: int, min_words: int, max_words: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [synthetic_text(rng, min_words, max_words) for _ in range(num_chunks)]
+
+
+def generate_queries(num_queries: int, seed: int = 0) -> list[str]:
+    return synthetic_chunks(num_queries, 1, 6, seed=seed)
+
+
+def generate_corpus(
+    num_documents: int = 1000,
+    chunks_per_document: int = 10,
+    min_words_per_chunk: int = 50,
+    max_words_per_chunk: int = 200,
+    metadata_keys: int = 3,
+    metadata_values_per_key: int = 10,
+    num_document_sets: int = 5,
+    document_sets_per_document: int = 2,
+    start_date: datetime = datetime(2022, 1, 1),
+    end_date: datetime = datetime(2024, 1, 1),
+    hidden_fraction: float = 0.0,
+    seed: int = 0,
+) -> Iterator[DanswerDocument]:
+    # Yields documents one at a time so corpora larger than memory can be streamed into the indexers.
+    # Embeddings are left empty, the indexers embed the content themselves.
+    rng = random.Random(seed)
+    document_sets = [f"set{i}" for i in range(num_document_sets)]
+    date_range_seconds = int((end_date - start_date).total_seconds())
+
+    for i in range(num_documents):
+        chunk_texts = [
+            synthetic_text(rng, min_words_per_chunk, max_words_per_chunk)
+            for _ in range(chunks_per_document)
+        ]
+        yield DanswerDocument(
+            document_id=f"synthetic{i}",
+            semantic_id=f"Synthetic{i}",
+            title=synthetic_text(rng, 2, 8),
+            title_embedding=None,
+            content="NA",
+            chunks=[
+                DocumentChunk(
+                    link=None,
+                    max_num_tokens=512,
+                    num_tokens=len(text.split()),
+                    chunk_index=chunk_index,
+                    content=text,
+                    embedding=None,
+                )
+                for chunk_index, text in enumerate(chunk_texts)
+            ],
+            source_type="web",
+            document_sets=rng.sample(document_sets, min(document_sets_per_document, num_document_sets)),
+            metadata={
+                f"key{key}": f"value{rng.randrange(metadata_values_per_key)}"
+                for key in range(metadata_keys)
+            },
+            boost_count=rng.randint(-3, 3),
+            last_updated=start_date + timedelta(seconds=rng.randrange(date_range_seconds)),
+            hidden=rng.random() < hidden_fraction,
+        )
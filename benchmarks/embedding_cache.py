@@ -0,0 +1,40 @@
+# Embedding time for a first ingest vs re-ingesting the same unchanged content
+# Run from the repo root: python -m benchmarks.embedding_cache
+import argparse
+import time
+
+from benchmarks.corpus import synthetic_chunks
+from utils import TextType, batch_vectorize, embedding_cache
+
+
+def timed_pass(chunks: list[str]) -> float:
+    start = time.perf_counter()
+    batch_vectorize([(chunk, TextType.PASSAGE) for chunk in chunks])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-chunks", type=int, default=1000)
+    # Different seeds give content that the on-disk tier has not seen from earlier runs
+    parser.add_argument("--seed", type=int, default=int(time.time()))
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.num_chunks, 5, 300, seed=args.seed)
+
+    embedding_cache.reset_stats()
+    elapsed = timed_pass(chunks)
+    print(f"first ingest       {elapsed:8.3f}s  {embedding_cache.stats()}")
+
+    embedding_cache.reset_stats()
+    elapsed = timed_pass(chunks)
+    print(f"re-ingest (memory) {elapsed:8.3f}s  {embedding_cache.stats()}")
+
+    embedding_cache.clear_memory()
+    embedding_cache.reset_stats()
+    elapsed = timed_pass(chunks)
+    print(f"re-ingest (disk)   {elapsed:8.3f}s  {embedding_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
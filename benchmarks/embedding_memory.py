@@ -0,0 +1,65 @@
+# Memory held by chunks with list[float] embeddings vs slotted chunks with float32 rows of one matrix
+# Vectors are random so the model is not needed, results are extrapolated to 100k chunks
+# Run from the repo root: python -m benchmarks.embedding_memory
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass
+
+import numpy as np
+
+from examples import DocumentChunk
+from utils import EMBEDDING_DIM
+
+
+# The chunk class as it was before embeddings were kept as arrays
+@dataclass
+class ListDocumentChunk:
+    link: str | None
+    max_num_tokens: int
+    num_tokens: int
+    chunk_index: int
+    content: str
+    embedding: list[float]
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    chunks = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del chunks
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-chunks", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.random((args.num_chunks, EMBEDDING_DIM), dtype=np.float32)
+    contents = [f"chunk {i}" for i in range(args.num_chunks)]
+
+    def build_lists():
+        return [
+            ListDocumentChunk(None, 512, 2, i, contents[i], vectors[i].tolist())
+            for i in range(args.num_chunks)
+        ]
+
+    def build_arrays():
+        matrix = vectors.copy()
+        return [
+            DocumentChunk(None, 512, 2, i, contents[i], matrix[i])
+            for i in range(args.num_chunks)
+        ]
+
+    scale = 100_000 / args.num_chunks
+    for name, build in (("dataclass + list[float]", build_lists), ("slots + float32 matrix rows", build_arrays)):
+        used = measure(build)
+        print(f"{name:<28} {used * scale / 2 ** 20:9.1f} MiB per 100k chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# In-process encoding vs the embedding process pool at different worker counts
+# Run from the repo root: python -m benchmarks.embedding_pool
+import argparse
+import os
+import time
+
+from benchmarks.corpus import synthetic_chunks
+from embedding_pool import EmbeddingPool
+from utils import EMBEDDING_BATCH_SIZE, TextType, _encode_local, _prefix_text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-chunks", type=int, default=4000)
+    parser.add_argument("--min-words", type=int, default=5)
+    parser.add_argument("--max-words", type=int, default=300)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+
+    texts = [_prefix_text(chunk, TextType.PASSAGE) for chunk in synthetic_chunks(args.num_chunks, args.min_words, args.max_words)]
+    print(f"{os.cpu_count()} cores, {len(texts)} chunks")
+
+    # Untimed pass so the in process run doesn't pay for loading the model
+    _encode_local(texts[:8], args.batch_size)
+    start = time.perf_counter()
+    _encode_local(texts, args.batch_size)
+    baseline = time.perf_counter() - start
+    print(f"in process          {len(texts) / baseline:8.1f} chunks/s  ({baseline:.2f}s)")
+
+    for num_workers in args.workers:
+        with EmbeddingPool(num_workers) as pool:
+            # Enough untimed work for every worker to spawn and load the model
+            pool.encode(texts[:num_workers * pool.task_size], args.batch_size)
+            start = time.perf_counter()
+            pool.encode(texts, args.batch_size)
+            elapsed = time.perf_counter() - start
+        print(
+            f"{num_workers} workers x {pool.threads_per_worker} threads "
+            f"{len(texts) / elapsed:8.1f} chunks/s  ({elapsed:.2f}s, {baseline / elapsed:.2f}x in process)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Per-chunk vs batched embedding throughput on a synthetic corpus
+# Run from the repo root: python -m benchmarks.embedding_throughput
+import argparse
+import time
+
+from benchmarks.corpus import synthetic_chunks
+from utils import TextType, batch_vectorize
+
+
+def time_per_chunk(chunks: list[str]) -> float:
+    start = time.perf_counter()
+    for chunk in chunks:
+        batch_vectorize([(chunk, TextType.PASSAGE)], use_cache=False)
+    return time.perf_counter() - start
+
+
+def time_batched(chunks: list[str], batch_size: int) -> float:
+    start = time.perf_counter()
+    batch_vectorize([(chunk, TextType.PASSAGE) for chunk in chunks], batch_size=batch_size, use_cache=False)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-chunks", type=int, default=1000)
+    parser.add_argument("--min-words", type=int, default=5)
+    parser.add_argument("--max-words", type=int, default=300)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 128])
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.num_chunks, args.min_words, args.max_words)
+
+    # Untimed pass so neither side pays for model warmup
+    batch_vectorize([(chunk, TextType.PASSAGE) for chunk in chunks[:8]], use_cache=False)
+
+    elapsed = time_per_chunk(chunks)
+    print(f"per-chunk           {len(chunks) / elapsed:8.1f} chunks/s  ({elapsed:.2f}s)")
+
+    for batch_size in args.batch_sizes:
+        elapsed = time_batched(chunks, batch_size)
+        print(f"batched (size {batch_size:>4}) {len(chunks) / elapsed:8.1f} chunks/s  ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# End-to-end benchmark on a synthetic corpus: embedding throughput, indexing docs/s and
+# p50/p95/p99 query latency per search body variant, emitted as JSON for regression tracking.
+# Uses the cluster when one answers and the in-process LocalSearchEngine otherwise.
+# Run from the repo root: python -m benchmarks.end_to_end --output bench.json
+import argparse
+import json
+import platform
+import sys
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+import numpy as np
+
+import basic_example
+import full_example
+from benchmarks.corpus import generate_corpus, generate_queries
+from bulk_indexing import bulk_index_documents
+from local_engine import LocalSearchEngine
+from opensearch_client import get_opensearch_client
+from query_cache import embed_query
+from query_builder import SEARCH_BODY_VARIANTS
+from utils import TextType, batch_vectorize, warmup
+
+
+def latency_summary(latencies_seconds: list[float]) -> dict:
+    milliseconds = np.array(latencies_seconds) * 1000
+    return {
+        "count": len(milliseconds),
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+    }
+
+
+def time_queries(search: Callable[[str], object], queries: list[str]) -> dict:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    return latency_summary(latencies)
+
+
+def benchmark_embedding(documents) -> dict:
+    items = [(chunk.content, TextType.PASSAGE) for document in documents for chunk in document.chunks]
+    start = time.perf_counter()
+    batch_vectorize(items, use_cache=False)
+    elapsed = time.perf_counter() - start
+    return {"chunks": len(items), "seconds": elapsed, "chunks_per_second": len(items) / elapsed}
+
+
+def benchmark_opensearch(client, index_name: str, documents, queries: list[str], max_num_results: int) -> tuple[dict, dict]:
+    full_example.create_index(client, index_name)
+    full_example.add_normalization_processor(client)
+
+    result = bulk_index_documents(client, index_name, documents, full_example.build_index_bodies, refresh=True)
+    indexing = {
+        "documents": result.indexed,
+        "failures": len(result.failures),
+        "seconds": result.elapsed_seconds,
+        "docs_per_second": result.docs_per_second,
+    }
+
+    variants: dict[str, Callable[[str], object]] = {
+        f"full_example.{variant}": (
+            # Uncached, repeated queries would otherwise time the search result cache rather than OpenSearch
+            lambda query, variant=variant: full_example.hybrid_search(
+                client, index_name, query, max_num_results, variant, use_cache=False
+            )
+        )
+        for variant in SEARCH_BODY_VARIANTS
+    }
+    variants["basic_example.hybrid_search_v1"] = lambda query: basic_example.hybrid_search_v1(client, index_name, query, max_num_results)
+    variants["basic_example.hybrid_search_v2"] = lambda query: basic_example.hybrid_search_v2(client, index_name, query, max_num_results)
+
+    return indexing, {name: time_queries(search, queries) for name, search in variants.items()}
+
+
+def benchmark_local(documents, queries: list[str], max_num_results: int) -> tuple[dict, dict]:
+    engine = LocalSearchEngine()
+    start = time.perf_counter()
+    for batch_start in range(0, len(documents), 64):
+        batch = documents[batch_start:batch_start + 64]
+        engine.index_documents(full_example.build_index_bodies(batch), [document.document_id for document in batch])
+    elapsed = time.perf_counter() - start
+    indexing = {
+        "documents": len(documents),
+        "failures": 0,
+        "seconds": elapsed,
+        "docs_per_second": len(documents) / elapsed,
+    }
+
+    # The local engine has no query DSL, so it models the three kinds of scoring the variants use
+    query_vectors = dict(zip(queries, batch_vectorize([(query, TextType.QUERY) for query in queries])))
+    variants: dict[str, Callable[[str], object]] = {
+        "local.keyword": lambda query: engine.keyword_search(query, size=max_num_results),
+        "local.knn": lambda query: engine.knn_search(query_vectors[query], k=max_num_results, size=max_num_results),
+        "local.hybrid": lambda query: engine.hybrid_search(query, query_vectors[query], size=max_num_results),
+    }
+    return indexing, {name: time_queries(search, queries) for name, search in variants.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["auto", "opensearch", "local"], default="auto")
+    parser.add_argument("--index", default="danswer-benchmark")
+    parser.add_argument("--num-documents", type=int, default=1000)
+    parser.add_argument("--chunks-per-document", type=int, default=10)
+    parser.add_argument("--metadata-keys", type=int, default=3)
+    parser.add_argument("--metadata-values-per-key", type=int, default=10)
+    parser.add_argument("--num-document-sets", type=int, default=5)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--max-num-results", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Path of the JSON report, stdout if omitted")
+    args = parser.parse_args()
+
+    backend = args.backend
+    client = None
+    if backend != "local":
+        client = get_opensearch_client()
+        if not client.ping():
+            if backend == "opensearch":
+                sys.exit("No OpenSearch cluster is reachable")
+            client = None
+        backend = "opensearch" if client is not None else "local"
+
+    documents = list(generate_corpus(
+        num_documents=args.num_documents,
+        chunks_per_document=args.chunks_per_document,
+        metadata_keys=args.metadata_keys,
+        metadata_values_per_key=args.metadata_values_per_key,
+        num_document_sets=args.num_document_sets,
+        seed=args.seed,
+    ))
+    queries = generate_queries(args.num_queries, seed=args.seed + 1)
+
+    warmup()
+    embedding = benchmark_embedding(documents)
+    # Query vectors are embedded up front so the latencies below measure search rather than the model.
+    # Searches get their vectors from query_cache, which keeps its own cache apart from batch_vectorize's,
+    # so that is the one warmed here and every variant starts from the same cached vectors.
+    for query in queries:
+        embed_query(query)
+
+    if backend == "opensearch":
+        indexing, queries_report = benchmark_opensearch(client, args.index, documents, queries, args.max_num_results)
+    else:
+        indexing, queries_report = benchmark_local(documents, queries, args.max_num_results)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "backend": backend,
+        "python": platform.python_version(),
+        "config": vars(args),
+        "embedding": embedding,
+        "indexing": indexing,
+        "queries": queries_report,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# HNSW settings sweep: build time, index size, query latency and chunk recall@k against exact
+# top k over the same embeddings, for every engine / m / ef_construction / ef_search combination
+# Needs a running cluster, each build goes into a scratch index that is deleted afterwards
+# Run from the repo root: python -m benchmarks.hnsw_sweep --output sweep.json
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+
+import full_example
+from benchmarks.corpus import generate_corpus, generate_queries
+from bulk_indexing import bulk_index_documents
+from opensearch_client import get_opensearch_client
+from similarity import top_k_similar
+from utils import TextType, batch_vectorize, warmup
+
+
+def embed_corpus(documents) -> np.ndarray:
+    # Embeds every title and chunk once, the vectors are set on the documents so no build re-embeds
+    # them, and the chunk rows (in document then chunk order) are the ground truth corpus
+    texts = [text for document in documents for text in [document.title, *(chunk.content for chunk in document.chunks)]]
+    vectors = iter(batch_vectorize([(text, TextType.PASSAGE) for text in texts]))
+    chunk_vectors = []
+    for document in documents:
+        document.title_embedding = next(vectors)
+        for chunk in document.chunks:
+            chunk.embedding = next(vectors)
+            chunk_vectors.append(chunk.embedding)
+    return np.stack(chunk_vectors)
+
+
+def knn_body(query_vector, k: int, query_k: int) -> dict:
+    # The chunk level k-NN the way the search bodies run it, nested under the document. Parents are
+    # scored by their best chunk, the chunks themselves come back in inner_hits.
+    return {
+        "size": k,
+        "_source": False,
+        "query": {
+            "nested": {
+                "path": "chunks",
+                "score_mode": "max",
+                "query": {"knn": {"chunks.embedding": {"vector": query_vector, "k": query_k}}},
+                "inner_hits": {"size": k, "_source": False},
+            },
+        },
+    }
+
+
+def top_chunks(response: dict, k: int) -> list[tuple[str, int]]:
+    chunks = [
+        (inner_hit["_score"], hit["_id"], inner_hit["_nested"]["offset"])
+        for hit in response["hits"]["hits"]
+        for inner_hit in hit["inner_hits"]["chunks"]["hits"]["hits"]
+    ]
+    chunks.sort(key=lambda chunk: -chunk[0])
+    return [(document_id, offset) for _, document_id, offset in chunks[:k]]
+
+
+def run_queries(client, index_name: str, query_vectors, exact: list[set], k: int, query_k: int) -> dict:
+    # One untimed pass so every setting is measured with its graphs loaded
+    for query_vector in query_vectors[:10]:
+        client.search(index=index_name, body=knn_body(query_vector, k, query_k))
+
+    latencies = []
+    recalls = []
+    for query_vector, expected in zip(query_vectors, exact):
+        start = time.perf_counter()
+        response = client.search(index=index_name, body=knn_body(query_vector, k, query_k))
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(top_chunks(response, k)) & expected) / len(expected))
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+    }
+
+
+def build(client, index_name: str, documents, vector_method: dict, force_merge: bool) -> dict:
+    full_example.create_index(client, index_name, vector_method)
+    start = time.perf_counter()
+    result = bulk_index_documents(client, index_name, documents, full_example.build_index_bodies, refresh=True)
+    if force_merge:
+        # Merging rebuilds the graphs into one, so it counts toward the build time
+        client.indices.forcemerge(index=index_name, max_num_segments=1, request_timeout=3600)
+        client.indices.refresh(index=index_name)
+    build_seconds = time.perf_counter() - start
+    store = client.indices.stats(index=index_name, metric="store")["indices"][index_name]["primaries"]["store"]
+    return {
+        "build_seconds": build_seconds,
+        "index_mib": store["size_in_bytes"] / 2**20,
+        "failures": len(result.failures),
+    }
+
+
+def pareto_front(rows: list[dict]) -> list[bool]:
+    # A setting is on the front when no other setting has at least its recall at no more latency
+    # while being strictly better on one of the two
+    return [
+        not any(
+            other["recall"] >= row["recall"] and other["p50_ms"] <= row["p50_ms"]
+            and (other["recall"] > row["recall"] or other["p50_ms"] < row["p50_ms"])
+            for other in rows
+        )
+        for row in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default="hnsw-sweep")
+    parser.add_argument("--num-documents", type=int, default=2000)
+    parser.add_argument("--chunks-per-document", type=int, default=10)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--engines", nargs="+", default=["lucene", "nmslib", "faiss"])
+    parser.add_argument("--space-type", default="cosinesimil")
+    parser.add_argument("--m", type=int, nargs="+", default=[16, 32, 48])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100, 200, 400])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--no-force-merge", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    client = get_opensearch_client()
+    documents = list(generate_corpus(args.num_documents, args.chunks_per_document))
+    chunk_vectors = embed_corpus(documents)
+    chunk_ids = [(document.document_id, chunk.chunk_index) for document in documents for chunk in document.chunks]
+    query_vectors = batch_vectorize([(query, TextType.QUERY) for query in generate_queries(args.num_queries)])
+
+    # Exact ground truth with the same metric the index uses
+    exact_indices, _ = top_k_similar(np.stack(query_vectors), chunk_vectors, args.k)
+    exact = [{chunk_ids[i] for i in row} for row in exact_indices]
+
+    rows = []
+    for engine, m, ef_construction in itertools.product(args.engines, args.m, args.ef_construction):
+        vector_method = {
+            "name": "hnsw",
+            "space_type": args.space_type,
+            "engine": engine,
+            "parameters": {"ef_construction": ef_construction, "m": m},
+        }
+        setting = {"engine": engine, "m": m, "ef_construction": ef_construction}
+        try:
+            built = build(client, args.index, documents, vector_method, not args.no_force_merge)
+            # Loads nmslib and faiss graphs into native memory ahead of the timed queries
+            warmup(client, args.index)
+        except Exception as e:
+            print(f"{setting} could not be built: {e}")
+            continue
+
+        for ef_search in args.ef_search:
+            if engine == "lucene":
+                # Lucene has no ef_search setting, its candidate queue is the query's k, so
+                # ef_search is applied as k with the top k chunks taken from the results
+                query_k = max(ef_search, args.k)
+            else:
+                query_k = args.k
+                client.indices.put_settings(index=args.index, body={"index": {"knn.algo_param.ef_search": ef_search}})
+            measured = run_queries(client, args.index, query_vectors, exact, args.k, query_k)
+            rows.append({**setting, "ef_search": ef_search, **built, **measured})
+
+        client.indices.delete(index=args.index, ignore=[404])
+
+    rows.sort(key=lambda row: row["p50_ms"])
+    front = pareto_front(rows)
+    print(
+        f"{'engine':<7} {'m':>3} {'ef_c':>5} {'ef_s':>5} {'build s':>8} {'MiB':>8} "
+        f"{'p50 ms':>7} {'p95 ms':>7} {f'recall@{args.k}':>10}  pareto"
+    )
+    for row, on_front in zip(rows, front):
+        row["pareto"] = on_front
+        print(
+            f"{row['engine']:<7} {row['m']:>3} {row['ef_construction']:>5} {row['ef_search']:>5} "
+            f"{row['build_seconds']:>8.1f} {row['index_mib']:>8.1f} {row['p50_ms']:>7.2f} {row['p95_ms']:>7.2f} "
+            f"{row['recall']:>10.3f}  {'*' if on_front else ''}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"k": args.k, "num_chunks": len(chunk_ids), "num_queries": args.num_queries, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Nested vs flat (chunk per document) index layouts on the same corpus: load time, index size,
+# search latency and rounds needed for enough distinct documents, and the cost of a document update
+# Needs a running cluster, each layout gets its own scratch index
+# Run from the repo root: python -m benchmarks.index_layouts
+import argparse
+import random
+import time
+
+import numpy as np
+
+import basic_example
+import full_example
+import index_layouts
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.hnsw_sweep import embed_corpus
+from opensearch_client import get_opensearch_client
+from query_cache import embed_query
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-prefix", default="layout-bench")
+    parser.add_argument("--num-documents", type=int, default=5000)
+    parser.add_argument("--chunks-per-document", type=int, default=10)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--num-documents-per-search", type=int, default=10)
+    parser.add_argument("--num-updates", type=int, default=100)
+    args = parser.parse_args()
+
+    client = get_opensearch_client()
+    # search_documents runs the keyword and vector legs through the two leg normalization_step
+    basic_example.add_normalization_processor(client)
+    documents = list(generate_corpus(args.num_documents, args.chunks_per_document))
+    embed_corpus(documents)
+    queries = generate_queries(args.num_queries)
+    for query in queries:
+        embed_query(query)
+    updated_ids = random.Random(0).sample([document.document_id for document in documents], args.num_updates)
+
+    for layout in index_layouts.LAYOUTS:
+        index_name = f"{args.index_prefix}-{layout}"
+        full_example.create_index(client, index_name, layout=layout)
+        result = index_layouts.index_documents(client, index_name, layout, documents, remove_stale_chunks=False, refresh=True)
+        client.indices.forcemerge(index=index_name, max_num_segments=1, request_timeout=3600)
+        size_mib = client.indices.stats(index=index_name, metric="store")["indices"][index_name]["primaries"]["store"]["size_in_bytes"] / 2**20
+
+        for query in queries[:10]:
+            index_layouts.search_documents(client, index_name, layout, query, args.num_documents_per_search)
+        latencies, rounds, short = [], [], 0
+        for query in queries:
+            start = time.perf_counter()
+            found = index_layouts.search_documents(client, index_name, layout, query, args.num_documents_per_search)
+            latencies.append(time.perf_counter() - start)
+            rounds.append(found.rounds)
+            short += len(found.documents) < args.num_documents_per_search
+        milliseconds = np.array(latencies) * 1000
+
+        start = time.perf_counter()
+        rewritten = sum(
+            index_layouts.update_document_fields(client, index_name, layout, document_id, {"boost_count": 1})
+            for document_id in updated_ids
+        )
+        update_ms = 1000 * (time.perf_counter() - start) / len(updated_ids)
+
+        print(
+            f"{layout:<7} load {result.elapsed_seconds:7.1f}s  {size_mib:8.1f} MiB  "
+            f"search p50 {np.percentile(milliseconds, 50):6.2f}ms p95 {np.percentile(milliseconds, 95):6.2f}ms  "
+            f"{np.mean(rounds):.2f} rounds, {short} short  "
+            f"update {update_ms:6.2f}ms, {rewritten / len(updated_ids):.1f} docs rewritten"
+        )
+        client.indices.delete(index=index_name, ignore=[404])
+
+
+if __name__ == "__main__":
+    main()
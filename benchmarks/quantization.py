@@ -0,0 +1,76 @@
+# Float32 vs int8 dynamically quantized e5-small-v2: speed, and how far the vectors and rankings move
+# Run from the repo root: python -m benchmarks.quantization
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.corpus import generate_queries, synthetic_chunks
+from similarity import normalize_rows, top_k_similar
+from utils import EMBEDDING_BATCH_SIZE, TextType, _encode_local, _prefix_text, load_model
+
+
+def query_latency_ms(model, queries: list[str]) -> float:
+    # One query per encode, the way hybrid_search embeds them
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        _encode_local([query], batch_size=1, model=model)
+        timings.append(time.perf_counter() - start)
+    return 1000 * statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-chunks", type=int, default=2000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--min-words", type=int, default=20)
+    parser.add_argument("--max-words", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+
+    passages = [_prefix_text(chunk, TextType.PASSAGE) for chunk in synthetic_chunks(args.num_chunks, args.min_words, args.max_words)]
+    queries = [_prefix_text(query, TextType.QUERY) for query in generate_queries(args.num_queries)]
+
+    results = {}
+    for quantization in ("", "int8"):
+        model = load_model(quantization)
+        _encode_local(passages[:8], args.batch_size, model=model)
+
+        start = time.perf_counter()
+        corpus = _encode_local(passages, args.batch_size, model=model)
+        elapsed = time.perf_counter() - start
+        results[quantization or "float32"] = {
+            "chunks_per_second": len(passages) / elapsed,
+            "query_ms": query_latency_ms(model, queries),
+            "corpus": normalize_rows(corpus),
+            "queries": normalize_rows(_encode_local(queries, args.batch_size, model=model)),
+        }
+
+    full, int8 = results["float32"], results["int8"]
+    for name, result in results.items():
+        print(f"{name:<8} {result['chunks_per_second']:8.1f} chunks/s  {result['query_ms']:6.2f}ms per query (median)")
+    print(
+        f"int8 speedup: {int8['chunks_per_second'] / full['chunks_per_second']:.2f}x ingest, "
+        f"{full['query_ms'] / int8['query_ms']:.2f}x query"
+    )
+
+    # Cosine between the float and the int8 vector of the same text
+    drift = np.concatenate([
+        np.einsum("ij,ij->i", full["corpus"], int8["corpus"]),
+        np.einsum("ij,ij->i", full["queries"], int8["queries"]),
+    ])
+    print(f"cosine to float32: mean {drift.mean():.5f}, p1 {np.percentile(drift, 1):.5f}, min {drift.min():.5f}")
+
+    # Each model ranks the corpus with its own vectors, then the two top k lists are compared
+    full_top, _ = top_k_similar(full["queries"], full["corpus"], args.k, normalized=True)
+    int8_top, _ = top_k_similar(int8["queries"], int8["corpus"], args.k, normalized=True)
+    overlap = np.array([len(set(a) & set(b)) / args.k for a, b in zip(full_top, int8_top)])
+    top1 = (full_top[:, 0] == int8_top[:, 0]).mean()
+    print(f"top-{args.k} overlap: mean {overlap.mean():.3f}, min {overlap.min():.3f}; same top-1 {top1:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Per request cost of the compiled search bodies vs rebuilding the whole literal, and with
+# --index, whether repeated filters are served from the nodes' query cache
+# Run from the repo root: python -m benchmarks.query_builder [--index danswer-index]
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.corpus import generate_queries
+from full_example import default_search_filters, hybrid_search
+from query_builder import (
+    ALL_TEMPLATE, COMPLETE_TEMPLATE, CONTENT_ONLY_TEMPLATE, HYBRID_INSIDE_TEMPLATE, HYBRID_OUTSIDE_TEMPLATE,
+    DEFAULT_INNER_HITS_SOURCE, DEFAULT_SOURCE, OMIT, Param, build_search_body,
+)
+from opensearch_client import get_opensearch_client
+from utils import EMBEDDING_DIM
+
+
+def rebuild(template, params: dict):
+    # What a dict literal in a function costs: every dict and list is created again on every call
+    if isinstance(template, Param):
+        return params[template.name]
+    if isinstance(template, dict):
+        return {key: value for key, sub in template.items() if (value := rebuild(sub, params)) is not OMIT}
+    if isinstance(template, list):
+        return [rebuild(sub, params) for sub in template]
+    return template
+
+
+def time_per_call(build, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        build()
+    return 1e6 * (time.perf_counter() - start) / repeats
+
+
+def query_cache_stats(client) -> dict[str, int]:
+    totals = {"hit_count": 0, "miss_count": 0, "cache_size": 0}
+    for node in client.nodes.stats(metric="indices", index_metric="query_cache")["nodes"].values():
+        for key in totals:
+            totals[key] += node["indices"]["query_cache"][key]
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=20000)
+    parser.add_argument("--index", default=None, help="Also run filtered searches against this index and report query cache use")
+    parser.add_argument("--num-queries", type=int, default=200)
+    args = parser.parse_args()
+
+    query_vector = np.random.default_rng(0).random(EMBEDDING_DIM, dtype=np.float32)
+    filters = default_search_filters()
+    params = {
+        "query": "florida weather",
+        "query_vector": query_vector,
+        "size": 10,
+        "k": 10,
+        "filters": filters.to_clauses(),
+        "source": DEFAULT_SOURCE,
+        "inner_hits_source": DEFAULT_INNER_HITS_SOURCE,
+    }
+    all_templates = [COMPLETE_TEMPLATE, HYBRID_INSIDE_TEMPLATE, HYBRID_OUTSIDE_TEMPLATE, CONTENT_ONLY_TEMPLATE, ALL_TEMPLATE]
+
+    timings = {
+        "all five literals (before)": lambda: [rebuild(template, params) for template in all_templates],
+        "complete literal": lambda: rebuild(COMPLETE_TEMPLATE, params),
+        "complete compiled": lambda: build_search_body("complete", "florida weather", query_vector, 10, filters),
+        "hybrid_outside compiled": lambda: build_search_body("hybrid_outside", "florida weather", query_vector, 10, filters),
+    }
+    for name, build in timings.items():
+        print(f"{name:<28} {time_per_call(build, args.repeats):8.2f}us per body")
+
+    if args.index is None:
+        return
+
+    # The query cache only keeps filters that get reused (and only on segments above a minimum size),
+    # so the same filters go out with many different queries and the hit count should climb
+    client = get_opensearch_client()
+    before = query_cache_stats(client)
+    for query in generate_queries(args.num_queries):
+        hybrid_search(client, args.index, query, variant="complete", filters=filters, use_cache=False)
+    after = query_cache_stats(client)
+    print(
+        f"query cache over {args.num_queries} searches: +{after['hit_count'] - before['hit_count']} hits, "
+        f"+{after['miss_count'] - before['miss_count']} misses, {after['cache_size']} entries"
+    )
+
+
+if __name__ == "__main__":
+    main()
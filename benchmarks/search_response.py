@@ -0,0 +1,122 @@
+# Size and parse time of a 50 hit hybrid_search response with the full _source and with the default excludes,
+# and the cost of reading it through SearchResults. The responses are synthetic but shaped like
+# the real ones: full document _source per hit plus nested inner hits with chunk _source, with the
+# excludes applied by _exclude below. With --index the two responses come from hybrid_search on
+# that index instead, so OpenSearch applies the excludes (sizes are of the responses re-serialized).
+# Run from the repo root: python -m benchmarks.search_response [--index danswer-index]
+import argparse
+import json
+import time
+
+import numpy as np
+import orjson
+
+from benchmarks.corpus import generate_corpus
+from examples import QUERY
+from full_example import build_index_bodies, hybrid_search
+from opensearch_client import get_opensearch_client
+from query_builder import DEFAULT_INNER_HITS_SOURCE, DEFAULT_SOURCE
+from search_response import SearchResults
+from utils import EMBEDDING_DIM
+
+
+def _exclude(source: dict, excludes: list[str], prefix: str = "") -> dict:
+    # Minimal _source excludes for the paths used here ("title_vector", "chunks", "chunks.embedding", ...)
+    projected = {}
+    for key, value in source.items():
+        path = f"{prefix}{key}"
+        if path in excludes:
+            continue
+        if isinstance(value, list) and any(exclude.startswith(f"{path}.") for exclude in excludes):
+            value = [_exclude(item, excludes, f"{path}.") for item in value]
+        projected[key] = value
+    return projected
+
+
+def synthetic_response(num_hits: int, chunks_per_document: int, inner_hits: int, with_vectors: bool) -> dict:
+    rng = np.random.default_rng(0)
+    documents = list(generate_corpus(num_hits, chunks_per_document))
+    for document in documents:
+        document.title_embedding = rng.random(EMBEDDING_DIM, dtype=np.float32)
+        for chunk in document.chunks:
+            chunk.embedding = rng.random(EMBEDDING_DIM, dtype=np.float32)
+
+    hits = []
+    for rank, (document, body) in enumerate(zip(documents, build_index_bodies(documents))):
+        source = body if with_vectors else _exclude(body, DEFAULT_SOURCE["excludes"])
+        chunk_hits = []
+        for offset, chunk in enumerate(body["chunks"][:inner_hits]):
+            chunk_source = chunk if with_vectors else _exclude({"chunks": [chunk]}, DEFAULT_INNER_HITS_SOURCE["excludes"])["chunks"][0]
+            chunk_hits.append({
+                "_index": "danswer-index",
+                "_id": document.document_id,
+                "_nested": {"field": "chunks", "offset": offset},
+                "_score": 1.0 / (offset + 1),
+                "_source": chunk_source,
+                "matched_queries": {"chunk_vector_score": 1.0 / (offset + 1)},
+            })
+        hits.append({
+            "_index": "danswer-index",
+            "_id": document.document_id,
+            "_score": 1.0 / (rank + 1),
+            "_source": source,
+            "matched_queries": {"chunk_vector_score": 1.0 / (rank + 1)},
+            "inner_hits": {"chunks": {"hits": {"total": {"value": len(chunk_hits), "relation": "eq"}, "hits": chunk_hits}}},
+        })
+    return {"took": 5, "timed_out": False, "hits": {"total": {"value": num_hits, "relation": "eq"}, "hits": hits}}
+
+
+def real_response(client, index_name: str, query: str, num_hits: int, with_vectors: bool) -> dict:
+    if with_vectors:
+        return hybrid_search(client, index_name, query, num_hits, source=None, inner_hits_source=None, use_cache=False)
+    return hybrid_search(client, index_name, query, num_hits, use_cache=False)
+
+
+def time_ms(function, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return 1000 * (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-hits", type=int, default=50)
+    parser.add_argument("--chunks-per-document", type=int, default=10)
+    parser.add_argument("--inner-hits", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--read-top", type=int, default=10, help="Documents whose chunks are read through SearchResults")
+    parser.add_argument("--index", default=None, help="Measure real hybrid_search responses from this index")
+    parser.add_argument("--query", default=QUERY)
+    args = parser.parse_args()
+
+    client = get_opensearch_client() if args.index else None
+    print(f"{'real responses from ' + args.index if args.index else 'synthetic responses'}, {args.num_hits} hits")
+    for name, with_vectors in (("full _source", True), ("default excludes", False)):
+        if client is not None:
+            response = real_response(client, args.index, args.query, args.num_hits, with_vectors)
+        else:
+            response = synthetic_response(args.num_hits, args.chunks_per_document, args.inner_hits, with_vectors)
+        payload = orjson.dumps(response, option=orjson.OPT_SERIALIZE_NUMPY)
+        text = payload.decode("utf-8")
+        orjson_ms = time_ms(lambda: orjson.loads(payload), args.repeats)
+        json_ms = time_ms(lambda: json.loads(text), args.repeats)
+
+        response = orjson.loads(payload)
+
+        def read_top():
+            for i, document in enumerate(SearchResults(response)):
+                if i == args.read_top:
+                    break
+                for chunk in document.chunks:
+                    chunk.content
+
+        read_ms = time_ms(read_top, args.repeats * 10)
+        print(
+            f"{name:<17} {len(payload) / 1024:9.1f} KiB  parse orjson {orjson_ms:7.2f}ms  json {json_ms:7.2f}ms  "
+            f"read top {args.read_top} via SearchResults {read_ms:6.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Serialize/deserialize time of the stock JSONSerializer vs OrjsonSerializer for a typical
+# bulk body, a hybrid search body and a search response. Needs neither a cluster nor the model.
+# Run from the repo root: python -m benchmarks.serializer
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+from opensearchpy.serializer import JSONSerializer
+
+from serializer import OrjsonSerializer
+from utils import EMBEDDING_DIM
+
+
+def bulk_lines(num_documents: int, chunks_per_document: int, rng: np.random.Generator) -> list[dict]:
+    lines = []
+    for i in range(num_documents):
+        embeddings = rng.random((chunks_per_document + 1, EMBEDDING_DIM), dtype=np.float32)
+        lines.append({"index": {"_index": "danswer-index", "_id": f"doc{i}"}})
+        lines.append({
+            "title": f"Document {i}",
+            "title_vector": embeddings[0],
+            "chunks": [
+                {"chunk_index": c, "content": "The weather in Florida is hot and humid " * 20, "embedding": embeddings[c + 1]}
+                for c in range(chunks_per_document)
+            ],
+            "document_sets": ["set1", "set2"],
+            "last_updated": datetime(2023, 9, 10),
+            "not_hidden": True,
+        })
+    return lines
+
+
+def hybrid_body(rng: np.random.Generator) -> dict:
+    query_vector = rng.random(EMBEDDING_DIM, dtype=np.float32)
+    return {
+        "size": 10,
+        "query": {"hybrid": {"queries": [
+            {"multi_match": {"query": "Florida", "fields": ["title^1.2", "chunks.content"]}},
+            {"knn": {"title_vector": {"vector": query_vector, "k": 10}}},
+            {"nested": {"path": "chunks", "query": {"knn": {"chunks.embedding": {"vector": query_vector, "k": 10}}}}},
+        ]}},
+    }
+
+
+def time_call(function, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bulk-documents", type=int, default=500)
+    parser.add_argument("--chunks-per-document", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    lines = bulk_lines(args.bulk_documents, args.chunks_per_document, rng)
+    body = hybrid_body(rng)
+    serializers = {"JSONSerializer": JSONSerializer(), "OrjsonSerializer": OrjsonSerializer()}
+
+    # A response carrying the documents back with their vectors, what an unfiltered search returns
+    response_text = OrjsonSerializer().dumps({"hits": {"hits": [{"_source": line} for line in lines[1::2][:50]]}})
+
+    for name, serializer in serializers.items():
+        bulk = time_call(lambda: "\n".join(map(serializer.dumps, lines)), args.repeats)
+        search = time_call(lambda: serializer.dumps(body), args.repeats * 100)
+        parse = time_call(lambda: serializer.loads(response_text), args.repeats)
+        print(
+            f"{name:<17} bulk dumps {bulk * 1000:8.2f}ms  "
+            f"hybrid body dumps {search * 1e6:8.1f}us  "
+            f"50 hit response loads {parse * 1000:7.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Import time of the modules vs time until the first query embedding is ready
+# Each measurement runs in a fresh interpreter so nothing is shared between them
+# Run from the repo root: python -m benchmarks.startup
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+SCENARIOS = {
+    "import utils": "import utils",
+    "import examples": "import examples",
+    "import full_example": "import full_example",
+    "import utils + warmup": "import utils; utils.warmup()",
+    "import utils + first query": "import utils; utils.vectorize('Florida', utils.TextType.QUERY)",
+}
+
+
+def time_scenario(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_scenario("pass") for _ in range(args.repeats))
+    print(f"{'interpreter only':<28} {baseline:7.3f}s")
+
+    for name, code in SCENARIOS.items():
+        elapsed = statistics.median(time_scenario(code) for _ in range(args.repeats))
+        print(f"{name:<28} {elapsed:7.3f}s  (+{elapsed - baseline:.3f}s over interpreter)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any
+
+from opensearchpy import helpers
+
+from result_cache import bump_write_generation
+
+
+# build_index_bodies from full_example (DanswerDocument) or basic_example (MinimalDoc)
+BuildBodies = Callable[[list[Any]], list[dict]]
+# (index name, documents, build_bodies, embed batch size) to _bulk actions, generate_index_actions
+# by default, index_layouts has one for indexes with a document per chunk
+GenerateActions = Callable[[str, Iterable[Any], BuildBodies, int], Iterator[dict]]
+
+
+@dataclass
+class BulkItemFailure:
+    document_id: str | None
+    status: int | None
+    error: object
+
+
+@dataclass
+class BulkIndexResult:
+    indexed: int = 0
+    failures: list[BulkItemFailure] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.indexed / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class _LockedIterator:
+    # Lets several bulk senders pull from one generator, only one thread runs it at a time
+    def __init__(self, iterable: Iterable):
+        self._iterator = iter(iterable)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._iterator)
+
+
+class _GenerationBumpingClient:
+    # What streaming_bulk gets instead of the client: the same client, except every _bulk request
+    # bumps the index's write generation once its response is in (or it failed part way)
+    def __init__(self, client, index_name: str):
+        self._client = client
+        self._index_name = index_name
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+    def bulk(self, *args, **kwargs):
+        try:
+            return self._client.bulk(*args, **kwargs)
+        finally:
+            bump_write_generation(self._index_name)
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def generate_index_actions(
+    index_name: str,
+    documents: Iterable[Any],
+    build_bodies: BuildBodies,
+    embed_batch_size: int = 64,
+) -> Iterator[dict]:
+    # Documents are embedded embed_batch_size at a time as the stream is consumed, so the
+    # whole input is never materialized. Documents with a document_id are indexed under it
+    # which makes re-ingesting a document overwrite it rather than add a duplicate.
+    for batch in _batched(documents, embed_batch_size):
+        for document, body in zip(batch, build_bodies(batch)):
+            action = {"_index": index_name, "_source": body}
+            document_id = getattr(document, "document_id", None)
+            if document_id is not None:
+                action["_id"] = document_id
+            yield action
+
+
+def bulk_index_documents(
+    client,
+    index_name: str,
+    documents: Iterable[Any],
+    build_bodies: BuildBodies,
+    chunk_size: int = 500,
+    max_chunk_bytes: int = 10 * 1024 * 1024,
+    max_retries: int = 5,
+    initial_backoff: float = 1.0,
+    max_backoff: float = 60.0,
+    embed_batch_size: int = 64,
+    thread_count: int = 1,
+    refresh: bool = False,
+    generate_actions: GenerateActions = generate_index_actions,
+) -> BulkIndexResult:
+    # A _bulk request is flushed once it holds chunk_size documents or max_chunk_bytes of payload,
+    # whichever comes first. Items rejected with 429 are retried with exponential backoff starting at
+    # initial_backoff, any other per-item failure is recorded and the load carries on.
+    actions = generate_actions(index_name, documents, build_bodies, embed_batch_size)
+    result = BulkIndexResult()
+    result_lock = threading.Lock()
+
+    def _send(action_stream: Iterable[dict]):
+        for ok, item in helpers.streaming_bulk(
+            # Once per _bulk response rather than at the end, so cached searches don't outlive a long load
+            _GenerationBumpingClient(client, index_name),
+            action_stream,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            max_retries=max_retries,
+            initial_backoff=initial_backoff,
+            max_backoff=max_backoff,
+            raise_on_error=False,
+            raise_on_exception=False,
+        ):
+            _, info = item.popitem()
+            with result_lock:
+                if ok:
+                    result.indexed += 1
+                else:
+                    result.failures.append(BulkItemFailure(
+                        document_id=info.get("_id"),
+                        status=info.get("status"),
+                        error=info.get("error"),
+                    ))
+
+    start = time.perf_counter()
+    if thread_count <= 1:
+        _send(actions)
+    else:
+        # Each thread batches and retries on its own, while one embeds the next documents the others send
+        shared_actions = _LockedIterator(actions)
+        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+            for future in [executor.submit(_send, shared_actions) for _ in range(thread_count)]:
+                future.result()
+
+    if refresh:
+        client.indices.refresh(index=index_name)
+        bump_write_generation(index_name)
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
@@ -0,0 +1,66 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from result_cache import bump_write_generation
+
+
+# Settings the load changes, with the values used during it
+LOAD_SETTINGS = {
+    # No refreshes means no small segments (and no HNSW graphs built for them) until the load is done
+    "index.refresh_interval": "-1",
+    # Replicas are rebuilt from the merged primaries afterwards instead of indexing every document twice
+    "index.number_of_replicas": "0",
+}
+
+
+@dataclass
+class BulkLoadStats:
+    load_seconds: float = 0.0
+    merge_seconds: float = 0.0
+    warmup_seconds: float = 0.0
+    segments: int | None = None
+
+
+def _current_settings(client, index_name: str) -> dict[str, str | None]:
+    # Explicitly set values are put back as they were, settings left at their default are reset
+    # to the default (None) rather than pinned to whatever the default is today
+    response = client.indices.get_settings(index=index_name, flat_settings=True)[index_name]["settings"]
+    return {name: response.get(name) for name in LOAD_SETTINGS}
+
+
+@contextmanager
+def bulk_load_mode(client, index_name: str, max_num_segments: int = 1, warm: bool = True, merge_timeout: int = 3600):
+    # For initial loads into a new or freshly emptied index:
+    #     with bulk_load_mode(client, index_name) as stats:
+    #         bulk_index_documents(client, index_name, documents, build_index_bodies)
+    # Refresh and replicas are off while the block runs and restored when it exits, failed or not.
+    # After a successful load the index is refreshed, merged down to max_num_segments (one graph
+    # per segment, fewer segments is faster k-NN) and its k-NN graphs are loaded into memory.
+    original = _current_settings(client, index_name)
+    stats = BulkLoadStats()
+    client.indices.put_settings(index=index_name, body=LOAD_SETTINGS)
+    start = time.perf_counter()
+    try:
+        yield stats
+        stats.load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        client.indices.refresh(index=index_name)
+        client.indices.forcemerge(index=index_name, max_num_segments=max_num_segments, request_timeout=merge_timeout)
+        client.indices.refresh(index=index_name)
+        stats.merge_seconds = time.perf_counter() - start
+    finally:
+        client.indices.put_settings(index=index_name, body=original)
+        bump_write_generation(index_name)
+
+    segments = client.indices.segments(index=index_name)["indices"][index_name]["shards"]
+    stats.segments = sum(len(copy["segments"]) for copies in segments.values() for copy in copies if copy["routing"]["primary"])
+
+    if warm:
+        start = time.perf_counter()
+        # Replicas recover from the merged primaries, graphs are only loaded once they are allocated
+        client.cluster.health(index=index_name, wait_for_no_initializing_shards=True, timeout="5m")
+        # Only the nmslib and faiss engines have anything to load, lucene graphs warm up through the page cache
+        client.transport.perform_request("GET", f"/_plugins/_knn/warmup/{index_name}")
+        stats.warmup_seconds = time.perf_counter() - start
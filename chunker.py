@@ -0,0 +1,169 @@
+import dataclasses
+import re
+from collections import deque
+from collections.abc import Iterable, Iterator
+
+from examples import DanswerDocument, DocumentChunk
+from utils import MAX_SEQ_LENGTH, TextType, _prefix_text, get_tokenizer
+
+
+# Segments tokenized per tokenizer call, the fast tokenizer is much quicker on a batch than one text at a time
+TOKENIZE_BATCH_SIZE = 64
+# Lines longer than this are cut up (at whitespace when there is some) before tokenizing,
+# so one enormous line never has to be tokenized in one go
+MAX_SEGMENT_CHARS = 2048
+
+_LINES = re.compile(r"[^\n]*\n|[^\n]+")
+
+
+def passage_token_budget(tokenizer=None) -> int:
+    # Tokens of content a passage can have before the model starts truncating it
+    tokenizer = tokenizer or get_tokenizer()
+    prefix_tokens = len(tokenizer(_prefix_text("", TextType.PASSAGE), add_special_tokens=False)["input_ids"])
+    return MAX_SEQ_LENGTH - tokenizer.num_special_tokens_to_add() - prefix_tokens
+
+
+def count_tokens(texts: list[str], tokenizer=None) -> list[int]:
+    # Content tokens per text, the same count DocumentChunk.num_tokens holds
+    tokenizer = tokenizer or get_tokenizer()
+    return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+
+def _segments(text: str | Iterable[str]) -> Iterator[str]:
+    # Splits the text lazily into lines (newlines kept, so the segments concatenate back to the
+    # text exactly), long lines are cut into MAX_SEGMENT_CHARS pieces
+    for part in [text] if isinstance(text, str) else text:
+        for match in _LINES.finditer(part):
+            line = match.group()
+            while len(line) > MAX_SEGMENT_CHARS:
+                cut = line.rfind(" ", 0, MAX_SEGMENT_CHARS) + 1 or MAX_SEGMENT_CHARS
+                yield line[:cut]
+                line = line[cut:]
+            if line:
+                yield line
+
+
+def _batched_offsets(segments: Iterator[str], tokenizer, batch_size: int) -> Iterator[tuple[str, list[tuple[int, int]]]]:
+    batch: list[str] = []
+    for segment in segments:
+        batch.append(segment)
+        if len(batch) == batch_size:
+            yield from zip(batch, _offsets(batch, tokenizer))
+            batch = []
+    if batch:
+        yield from zip(batch, _offsets(batch, tokenizer))
+
+
+def _offsets(batch: list[str], tokenizer) -> list[list[tuple[int, int]]]:
+    return tokenizer(
+        batch,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )["offset_mapping"]
+
+
+def chunk_text(
+    text: str | Iterable[str],
+    max_num_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    link: str | None = None,
+    tokenizer=None,
+    tokenize_batch_size: int = TOKENIZE_BATCH_SIZE,
+) -> Iterator[DocumentChunk]:
+    # Yields chunks of at most max_num_tokens model tokens, each starting overlap_tokens before the
+    # end of the previous one. Chunk contents are the original text from their first token to their
+    # last, num_tokens is what the model will see of them (besides the prefix and special tokens).
+    #
+    # The text can be one string or any iterable of strings (a file object for instance). Only the
+    # tokens of the chunk being built and the lines they come from are held at any one time.
+    # max_num_tokens defaults to, and is capped at, what fits in the model window.
+    tokenizer = tokenizer or get_tokenizer()
+    budget = passage_token_budget(tokenizer)
+    if max_num_tokens is not None:
+        budget = min(budget, max_num_tokens)
+    if not 0 <= overlap_tokens < budget:
+        raise ValueError(f"overlap_tokens must be at least 0 and less than the chunk size of {budget} tokens")
+
+    segments: dict[int, str] = {}
+    # (segment number, start, end) of every token not yet dropped
+    tokens: deque[tuple[int, int, int]] = deque()
+    # Tokens that aren't in any chunk yet, the rest of `tokens` is overlap
+    fresh = 0
+    chunk_index = 0
+
+    def build_chunk(count: int) -> DocumentChunk:
+        first_segment, start, _ = tokens[0]
+        last_segment, _, end = tokens[count - 1]
+        if first_segment == last_segment:
+            content = segments[first_segment][start:end]
+        else:
+            content = "".join([
+                segments[first_segment][start:],
+                *(segments[i] for i in range(first_segment + 1, last_segment)),
+                segments[last_segment][:end],
+            ])
+        return DocumentChunk(
+            link=link,
+            max_num_tokens=budget,
+            num_tokens=count,
+            chunk_index=chunk_index,
+            content=content,
+            embedding=None,
+        )
+
+    for segment_number, (segment, offsets) in enumerate(_batched_offsets(_segments(text), tokenizer, tokenize_batch_size)):
+        segments[segment_number] = segment
+        tokens.extend((segment_number, start, end) for start, end in offsets)
+        fresh += len(offsets)
+
+        while len(tokens) >= budget:
+            yield build_chunk(budget)
+            chunk_index += 1
+            for _ in range(budget - overlap_tokens):
+                tokens.popleft()
+            fresh = len(tokens) - overlap_tokens
+            # Lines entirely before the next chunk are no longer needed
+            for number in range(min(segments), tokens[0][0] if tokens else segment_number + 1):
+                del segments[number]
+
+    if fresh > 0:
+        yield build_chunk(len(tokens))
+
+
+def chunk_documents(
+    documents: Iterable[DanswerDocument],
+    max_num_tokens: int | None = None,
+    overlap_tokens: int = 0,
+    include_title: bool = True,
+    tokenizer=None,
+) -> Iterator[DanswerDocument]:
+    # Gives every document that comes without chunks chunks of its content as the documents stream
+    # through, documents that already have chunks pass through as they are. Chunked documents are
+    # copies, the ones passed in are left alone. build_index_bodies runs its documents through here,
+    # so any indexer built on it can be handed unchunked documents.
+    #
+    # With include_title every chunk starts with the title on its own line, so a chunk matched on
+    # its own still says which document it is from. The title's tokens come out of each chunk's
+    # budget, titles taking over half of it are left out.
+    for document in documents:
+        if document.chunks or not document.content:
+            yield document
+            continue
+
+        tokenizer = tokenizer or get_tokenizer()
+        budget = passage_token_budget(tokenizer)
+        if max_num_tokens is not None:
+            budget = min(budget, max_num_tokens)
+        title_line = f"{document.title}\n" if include_title and document.title else ""
+        title_tokens = count_tokens([title_line], tokenizer)[0] if title_line else 0
+        if title_tokens > budget // 2:
+            title_line, title_tokens = "", 0
+
+        chunks = list(chunk_text(document.content, budget - title_tokens, overlap_tokens, tokenizer=tokenizer))
+        for chunk in chunks:
+            chunk.content = title_line + chunk.content
+            chunk.num_tokens += title_tokens
+            chunk.max_num_tokens = budget
+        yield dataclasses.replace(document, chunks=chunks)
@@ -0,0 +1,187 @@
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+
+# index.max_inner_result_window, the most inner hits one nested query can return
+MAX_INNER_HITS = 100
+# index.max_result_window, the most hits one search can return
+MAX_RESULT_WINDOW = 10000
+
+
+@dataclass
+class ContextWindow:
+    document_id: str
+    # Requested range, the chunks can stop short of it at the end of the document
+    first_chunk_index: int
+    last_chunk_index: int
+    # chunk_index of the hits the window was built around
+    hit_chunk_indices: list[int]
+    # In chunk_index order, without embeddings
+    chunks: list[dict]
+
+
+def merge_windows(hits: Iterable[tuple[str, int]], window: int) -> list[ContextWindow]:
+    # One window of +-window chunks around every hit, windows of the same document that overlap
+    # or touch are merged so no chunk is fetched twice. Documents keep the order of their first hit.
+    ranges: dict[str, list[tuple[int, int, int]]] = {}
+    for document_id, chunk_index in hits:
+        ranges.setdefault(document_id, []).append((max(0, chunk_index - window), chunk_index + window, chunk_index))
+
+    merged = []
+    for document_id, document_ranges in ranges.items():
+        current = None
+        for first, last, hit in sorted(document_ranges):
+            if current is not None and first <= current.last_chunk_index + 1:
+                current.last_chunk_index = max(current.last_chunk_index, last)
+                if hit not in current.hit_chunk_indices:
+                    current.hit_chunk_indices.append(hit)
+            else:
+                current = ContextWindow(document_id, first, last, [hit], [])
+                merged.append(current)
+    return merged
+
+
+def _range(field: str, first: int, last: int) -> dict:
+    return {"range": {field: {"gte": first, "lte": last}}}
+
+
+def _by_document(windows: list[ContextWindow]) -> dict[str, list[ContextWindow]]:
+    by_document: dict[str, list[ContextWindow]] = {}
+    for context_window in windows:
+        by_document.setdefault(context_window.document_id, []).append(context_window)
+    return by_document
+
+
+def _nested_search(document_id: str, ranges: list[tuple[int, int]], size: int) -> dict:
+    # Just the one document, with the chunks in `ranges` as its inner hits
+    return {
+        "size": 1,
+        "_source": False,
+        "query": {
+            "bool": {
+                "filter": [{"ids": {"values": [document_id]}}],
+                "must": [{
+                    "nested": {
+                        "path": "chunks",
+                        "query": {"bool": {
+                            "should": [_range("chunks.chunk_index", first, last) for first, last in ranges],
+                            "minimum_should_match": 1,
+                        }},
+                        "inner_hits": {
+                            "size": size,
+                            "sort": [{"chunks.chunk_index": "asc"}],
+                            "_source": {"excludes": ["chunks.embedding"]},
+                        },
+                    },
+                }],
+            },
+        },
+    }
+
+
+def _nested_searches(windows: list[ContextWindow]) -> list[tuple[list[ContextWindow], dict]]:
+    # One search per document, more when its windows hold over MAX_INNER_HITS chunks
+    searches = []
+    for document_id, document_windows in _by_document(windows).items():
+        ranges: list[tuple[int, int]] = []
+        size = 0
+        for context_window in document_windows:
+            for first in range(context_window.first_chunk_index, context_window.last_chunk_index + 1, MAX_INNER_HITS):
+                last = min(first + MAX_INNER_HITS - 1, context_window.last_chunk_index)
+                if size + last - first + 1 > MAX_INNER_HITS:
+                    searches.append((document_windows, _nested_search(document_id, ranges, size)))
+                    ranges, size = [], 0
+                ranges.append((first, last))
+                size += last - first + 1
+        searches.append((document_windows, _nested_search(document_id, ranges, size)))
+    return searches
+
+
+def _flat_search(ranges: list[tuple[str, int, int]], size: int) -> dict:
+    # The chunks of every (document_id, first, last) range, as hits
+    return {
+        "size": size,
+        "_source": {"excludes": ["embedding"]},
+        "query": {"bool": {
+            "should": [
+                {"bool": {"filter": [
+                    {"term": {"document_id": document_id}},
+                    _range("chunk_index", first, last),
+                ]}}
+                for document_id, first, last in ranges
+            ],
+            "minimum_should_match": 1,
+        }},
+        "sort": [{"chunk_index": "asc"}],
+    }
+
+
+def _flat_searches(windows: list[ContextWindow]) -> list[dict]:
+    # As few searches as fit the windows' chunks in MAX_RESULT_WINDOW hits each
+    searches = []
+    ranges: list[tuple[str, int, int]] = []
+    size = 0
+    for context_window in windows:
+        first = context_window.first_chunk_index
+        while first <= context_window.last_chunk_index:
+            if size == MAX_RESULT_WINDOW:
+                searches.append(_flat_search(ranges, size))
+                ranges, size = [], 0
+            # Fill the current search, carrying the rest of the window over to the next one
+            last = min(first + MAX_RESULT_WINDOW - size - 1, context_window.last_chunk_index)
+            ranges.append((context_window.document_id, first, last))
+            size += last - first + 1
+            first = last + 1
+    searches.append(_flat_search(ranges, size))
+    return searches
+
+
+def _assign(windows: list[ContextWindow], chunks: Iterable[dict]):
+    # Each chunk goes to the window of its document that covers its chunk_index
+    for chunk in chunks:
+        for context_window in windows:
+            if context_window.first_chunk_index <= chunk["chunk_index"] <= context_window.last_chunk_index:
+                context_window.chunks.append(chunk)
+                break
+
+
+def expand_context(
+    client,
+    index_name: str,
+    hits: Iterable[tuple[str, int]],
+    window: int = 1,
+    layout: str = "nested",
+) -> list[ContextWindow]:
+    # Fetches the chunks within `window` of every (document_id, chunk_index) hit in one round trip.
+    # Nested layout: one _msearch with a search per document, its nested inner_hits filtered to the
+    # merged chunk_index ranges. Flat layout (index_layouts): one _msearch of searches for the ranges,
+    # split so none asks for more than MAX_RESULT_WINDOW hits.
+    windows = merge_windows(hits, window)
+    if not windows:
+        return windows
+
+    if layout == "nested":
+        searches = _nested_searches(windows)
+        body = []
+        for _, search in searches:
+            body.extend([{}, search])
+        responses = client.msearch(index=index_name, body=body)["responses"]
+        for (search_windows, _), response in zip(searches, responses):
+            if "error" in response:
+                raise RuntimeError(f"Fetching context of {search_windows[0].document_id} failed: {response['error']}")
+            for hit in response["hits"]["hits"]:
+                _assign(search_windows, (inner_hit["_source"] for inner_hit in hit["inner_hits"]["chunks"]["hits"]["hits"]))
+    elif layout == "flat":
+        body = []
+        for search in _flat_searches(windows):
+            body.extend([{}, search])
+        responses = client.msearch(index=index_name, body=body)["responses"]
+        by_document = _by_document(windows)
+        for response in responses:
+            if "error" in response:
+                raise RuntimeError(f"Fetching context failed: {response['error']}")
+            for hit in response["hits"]["hits"]:
+                _assign(by_document[hit["_source"]["document_id"]], [hit["_source"]])
+    else:
+        raise ValueError(f"Unknown index layout {layout}")
+    return windows
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import numpy as np
+
+
+def embedding_cache_key(model_name: str, prefix: str, text: str) -> str:
+    # Content addressed so that the same text under the same model and prefix is only ever embedded once
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{model_name}|{prefix}|{digest}"
+
+
+class DiskEmbeddingStore:
+    # Append-only store: the vectors file holds float32 rows back to back and line N of the keys file
+    # is the key of row N. Reads go through a memory map so only touched pages are loaded.
+    # Meant for a single writing process, concurrent writers from several processes are not coordinated.
+    def __init__(self, directory: str, dim: int):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self._row_bytes = dim * np.dtype(np.float32).itemsize
+        self._vectors_path = os.path.join(directory, f"vectors_{dim}.f32")
+        self._keys_path = os.path.join(directory, f"keys_{dim}.txt")
+        self._lock = threading.Lock()
+        self._rows: dict[str, int] = {}
+        self._matrix: np.memmap | None = None
+
+        keys: list[str] = []
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, encoding="utf-8") as f:
+                keys = [line.rstrip("\n") for line in f]
+        num_vector_rows = 0
+        if os.path.exists(self._vectors_path):
+            num_vector_rows = os.path.getsize(self._vectors_path) // self._row_bytes
+
+        # An interrupted write can leave the two files out of step, only rows present in both are kept
+        num_rows = min(len(keys), num_vector_rows)
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) != num_rows * self._row_bytes:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(num_rows * self._row_bytes)
+        if len(keys) != num_rows:
+            keys = keys[:num_rows]
+            with open(self._keys_path, "w", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in keys)
+
+        self._num_rows = num_rows
+        for row, key in enumerate(keys):
+            self._rows[key] = row
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _mapped_matrix(self) -> np.memmap:
+        # Remap lazily once rows have been appended past the end of the current mapping
+        if self._matrix is None or self._matrix.shape[0] < self._num_rows:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(self._num_rows, self.dim)
+            )
+        return self._matrix
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._mapped_matrix()[row])
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        with self._lock:
+            new: dict[str, int] = {}
+            for i, key in enumerate(keys):
+                if key not in self._rows and key not in new:
+                    new[key] = i
+            if not new:
+                return
+            rows = np.ascontiguousarray(np.asarray(vectors)[list(new.values())], dtype=np.float32)
+
+            # Vectors are written before keys so a key never points past the end of the vectors file
+            with open(self._vectors_path, "ab") as f:
+                f.write(rows.tobytes())
+            with open(self._keys_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{key}\n" for key in new)
+            for key in new:
+                self._rows[key] = self._num_rows
+                self._num_rows += 1
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int, dim: int, disk_directory: str | None = None):
+        self.max_entries = max_entries
+        self.dim = dim
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk_directory = disk_directory
+        self._disk: DiskEmbeddingStore | None = None
+        self._disk_lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_store(self) -> DiskEmbeddingStore | None:
+        # Opened on first use since reading a large keys file shouldn't slow down imports
+        if self.disk_directory is None:
+            return None
+        if self._disk is None:
+            with self._disk_lock:
+                if self._disk is None:
+                    self._disk = DiskEmbeddingStore(self.disk_directory, self.dim)
+        return self._disk
+
+    def _remember(self, key: str, vector: np.ndarray):
+        # Caller holds the lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str]) -> list[np.ndarray | None]:
+        results: list[np.ndarray | None] = []
+        for key in keys:
+            with self._lock:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results.append(vector)
+                    continue
+
+            disk = self._disk_store()
+            vector = disk.get(key) if disk is not None else None
+            with self._lock:
+                if vector is None:
+                    self.misses += 1
+                else:
+                    self.disk_hits += 1
+                    self._remember(key, vector)
+            results.append(vector)
+        return results
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                # Copy so cached entries don't keep the caller's whole batch matrix alive
+                self._remember(key, np.array(vector, dtype=np.float32))
+        disk = self._disk_store()
+        if disk is not None:
+            disk.put_many(keys, vectors)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk) if self._disk is not None else 0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.memory_hits = 0
+            self.disk_hits = 0
+            self.misses = 0
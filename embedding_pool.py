@@ -0,0 +1,94 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import utils
+from utils import EMBEDDING_BATCH_SIZE, EMBEDDING_DIM
+
+
+# Texts sent to a worker at a time. Several batches per task keeps the per task overhead
+# (pickling the texts, waking a worker) small next to the encode itself.
+TASK_SIZE = 4 * EMBEDDING_BATCH_SIZE
+
+
+def _init_worker(threads: int):
+    # Runs once per worker before torch is imported, so OpenMP/MKL size their pools to the
+    # worker's share of the cores instead of every worker starting one thread per core
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    import torch  # type:ignore
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    utils.get_model()
+
+
+def _encode_into(shm_name: str, total: int, positions: list[int], prefixed_texts: list[str], batch_size: int):
+    # Writes the vectors straight into the caller's output matrix, only the texts are pickled
+    shm = SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray((total, EMBEDDING_DIM), dtype=np.float32, buffer=shm.buf)
+        output[positions] = utils._encode_local(prefixed_texts, batch_size)
+        del output
+    finally:
+        shm.close()
+
+
+class EmbeddingPool:
+    # Worker processes that each hold their own copy of the model. One large encode is split in
+    # tasks of similar length texts (longest first so the slowest tasks don't end up last), the
+    # workers write their rows into a shared memory matrix and the rows come back in input order.
+    #
+    # Workers are spawned rather than forked, forking a process that already has torch's thread
+    # pools running can deadlock.
+    def __init__(self, num_workers: int, threads_per_worker: int | None = None, task_size: int = TASK_SIZE):
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        self.task_size = task_size
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker,),
+        )
+
+    def encode(self, prefixed_texts: list[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+        total = len(prefixed_texts)
+        if total == 0:
+            return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+        order = np.argsort([-len(text) for text in prefixed_texts], kind="stable")
+        shm = SharedMemory(create=True, size=total * EMBEDDING_DIM * np.dtype(np.float32).itemsize)
+        try:
+            futures = []
+            for start in range(0, total, self.task_size):
+                positions = order[start:start + self.task_size].tolist()
+                futures.append(self._executor.submit(
+                    _encode_into, shm.name, total, positions, [prefixed_texts[i] for i in positions], batch_size,
+                ))
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+            output = np.ndarray((total, EMBEDDING_DIM), dtype=np.float32, buffer=shm.buf)
+            embeddings = output.copy()
+            del output
+            return embeddings
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
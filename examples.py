@@ -1,22 +1,28 @@
 from dataclasses import dataclass
 from datetime import datetime
-from utils import vectorize, TextType
+from functools import cache
 
-@dataclass
+import numpy as np
+
+from utils import batch_vectorize, TextType
+
+# Slotted so millions of chunks don't each carry a __dict__, embeddings are float32 arrays
+# (usually rows of one batch matrix) and only become JSON lists when a request is serialized
+@dataclass(slots=True)
 class DocumentChunk:
     link: str | None
     max_num_tokens: int
     num_tokens: int
     chunk_index: int
     content: str
-    embedding: list[float]
+    embedding: np.ndarray | None
 
-@dataclass
+@dataclass(slots=True)
 class DanswerDocument:
     document_id: str
     semantic_id: str
     title: str
-    title_embedding: list[float]
+    title_embedding: np.ndarray | None
     content: str
     chunks: list[DocumentChunk]
     source_type: str  # really an enum
@@ -44,64 +50,44 @@ t3_chunk2 = "The best food is pizza"
 t3_chunk3 = "The best food is sushi"
 
 
-TEST1 = DanswerDocument(
-    document_id="test1",
-    semantic_id="Test1",
-    title=t1_title,
-    title_embedding=vectorize(t1_title, TextType.PASSAGE),
-    content="NA",
-    chunks=[
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t1_chunk1.split()), chunk_index=0, content=t1_chunk1, embedding=vectorize(t1_chunk1, TextType.PASSAGE)),
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t1_chunk2.split()), chunk_index=1, content=t1_chunk2, embedding=vectorize(t1_chunk2, TextType.PASSAGE)),
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t1_chunk3.split()), chunk_index=2, content=t1_chunk3, embedding=vectorize(t1_chunk3, TextType.PASSAGE)),
-    ],
-    source_type="web",
-    document_sets=["test_set"],
-    metadata={"space": "HR"},
-    boost_count=0,
-    last_updated=datetime(2023, 9, 10),
-    hidden=False,
-)
-
-
-TEST2 = DanswerDocument(
-    document_id="test2",
-    semantic_id="Test2",
-    title=t2_title,
-    title_embedding=vectorize(t2_title, TextType.PASSAGE),
-    content="NA",
-    chunks=[
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t2_chunk1.split()), chunk_index=0, content=t2_chunk1, embedding=vectorize(t2_chunk1, TextType.PASSAGE)),
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t2_chunk2.split()), chunk_index=1, content=t2_chunk2, embedding=vectorize(t2_chunk2, TextType.PASSAGE)),
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t2_chunk3.split()), chunk_index=2, content=t2_chunk3, embedding=vectorize(t2_chunk3, TextType.PASSAGE)),
-    ],
-    source_type="web",
-    document_sets=["test_set"],
-    metadata={"space": "HR"},
-    boost_count=0,
-    last_updated=datetime(2023, 9, 10),
-    hidden=False,
-)
-
-TEST3 = DanswerDocument(
-    document_id="test3",
-    semantic_id="Test3",
-    title=t3_title,
-    title_embedding=vectorize(t3_title, TextType.PASSAGE),
-    content="NA",
-    chunks=[
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t3_chunk1.split()), chunk_index=0, content=t3_chunk1, embedding=vectorize(t3_chunk1, TextType.PASSAGE)),
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t3_chunk2.split()), chunk_index=1, content=t3_chunk2, embedding=vectorize(t3_chunk2, TextType.PASSAGE)),
-        DocumentChunk(link=None, max_num_tokens=4096, num_tokens=len(t3_chunk3.split()), chunk_index=2, content=t3_chunk3, embedding=vectorize(t3_chunk3, TextType.PASSAGE)),
-    ],
-    source_type="web",
-    document_sets=["test_set"],
-    metadata={"space": "HR"},
-    boost_count=0,
-    last_updated=datetime(2023, 9, 10),
-    hidden=False,
-)
-
-DOCUMENTS = [TEST1, TEST2, TEST3]
+def _build_test_document(document_id: str, semantic_id: str, title: str, chunk_texts: list[str]) -> DanswerDocument:
+    from chunker import count_tokens  # chunker builds DocumentChunks, so it imports this module
+
+    title_embedding, *chunk_embeddings = batch_vectorize([(text, TextType.PASSAGE) for text in [title, *chunk_texts]])
+    return DanswerDocument(
+        document_id=document_id,
+        semantic_id=semantic_id,
+        title=title,
+        title_embedding=title_embedding,
+        content="NA",
+        chunks=[
+            DocumentChunk(link=None, max_num_tokens=4096, num_tokens=num_tokens, chunk_index=i, content=chunk, embedding=embedding)
+            for i, (chunk, embedding, num_tokens) in enumerate(zip(chunk_texts, chunk_embeddings, count_tokens(chunk_texts)))
+        ],
+        source_type="web",
+        document_sets=["test_set"],
+        metadata={"space": "HR"},
+        boost_count=0,
+        last_updated=datetime(2023, 9, 10),
+        hidden=False,
+    )
+
+
+@cache
+def _build_documents() -> dict[str, DanswerDocument | list[DanswerDocument]]:
+    test1 = _build_test_document("test1", "Test1", t1_title, [t1_chunk1, t1_chunk2, t1_chunk3])
+    test2 = _build_test_document("test2", "Test2", t2_title, [t2_chunk1, t2_chunk2, t2_chunk3])
+    test3 = _build_test_document("test3", "Test3", t3_title, [t3_chunk1, t3_chunk2, t3_chunk3])
+    return {"TEST1": test1, "TEST2": test2, "TEST3": test3, "DOCUMENTS": [test1, test2, test3]}
+
+
+def __getattr__(name: str):
+    # TEST1..TEST3 and DOCUMENTS are embedded on first access instead of at import time,
+    # so importing the data model doesn't load the embedding model.
+    # Use `examples.DOCUMENTS` rather than `from examples import DOCUMENTS` to keep it lazy.
+    if name in ("TEST1", "TEST2", "TEST3", "DOCUMENTS"):
+        return _build_documents()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 QUERY = "Florida"
\ No newline at end of file
@@ -1,39 +1,104 @@
 from datetime import datetime
 
-from opensearchpy import OpenSearch
 from opensearchpy.helpers.document import Document, InnerDoc
 from opensearchpy.helpers.field import Text, Double, Nested, Date, DenseVector
 from opensearchpy import Search
 
-from examples import DOCUMENTS, DanswerDocument, QUERY
+import examples
+from examples import DanswerDocument, QUERY
 
-from utils import vectorize, TextType, EMBEDDING_DIM
+from bulk_indexing import bulk_index_documents
+from bulk_load import bulk_load_mode
+from chunker import chunk_documents
+from opensearch_client import get_opensearch_client
+from query_builder import DEFAULT_INNER_HITS_SOURCE, DEFAULT_SOURCE, SearchFilters, build_search_body
+from query_cache import embed_query, normalize_query
+from result_cache import bump_write_generation, search_cache_key, search_result_cache
+from search_response import SearchResults
+from utils import batch_vectorize, content_hash, TextType, EMBEDDING_DIM
 
 
-def get_opensearch_client():
-    return OpenSearch(
-        hosts=[{"host": "localhost", "port": 9200}],
-        http_auth=("admin", "D@nswer_1ndex"),
-        use_ssl=True,
-        verify_certs=False,
-        ssl_show_warn=False
-    )
+# k-NN method for title_vector and chunks.embedding, benchmarks/hnsw_sweep.py compares alternatives
+DEFAULT_VECTOR_METHOD = {
+    "name": "hnsw",
+    "space_type": "cosinesimil",
+    "engine": "lucene",
+    "parameters": {
+        "ef_construction": 200,
+        "m": 48
+    }
+}
 
-def create_index(client, index_name):
+
+def create_index(client, index_name, vector_method: dict | None = None, layout: str = "nested"):
+    # layout "nested" is one OpenSearch document per document with its chunks nested inside it,
+    # "flat" is one OpenSearch document per chunk carrying a copy of its document's fields
+    # (see index_layouts for indexing and searching either)
     hnsw_config = {
         "type": "knn_vector",
         "dimension": EMBEDDING_DIM,
-        "method": {
-            "name": "hnsw",
-            "space_type": "cosinesimil",
-            "engine": "lucene",
-            "parameters": {
-                "ef_construction": 200,
-                "m": 48
+        "method": vector_method or DEFAULT_VECTOR_METHOD,
+    }
+
+    document_properties = {
+        "source_type": {"type": "keyword"},
+        "document_sets": {"type": "keyword"},
+        "metadata": {
+            "type": "nested",
+            "properties": {
+                "key": {"type": "keyword"},
+                # The value can be a single term or an array (just add multiple to it at indexing time)
+                "value": {"type": "keyword"}
             }
-        }
+        },
+        "last_updated": {"type": "date"},
+        # 0 default, positive for upvoted, negative for downvoted
+        "boost_count": {"type": "integer", "null_value": 0},
+        "not_hidden": {"type": "boolean", "null_value": True},
     }
 
+    if layout == "nested":
+        properties = {
+            "title": {"type": "text"},
+            "content": {"type": "text", "index": False},  # All keyword contents are stored at the "chunk" level
+            "title_vector": hnsw_config,
+            # Hashes are only read back from _source to find what changed on re-index, never searched
+            "title_hash": {"type": "keyword", "index": False, "doc_values": False},
+            "chunks": {
+                "type": "nested",
+                "properties": {
+                    "link": {"type": "text", "index": False},  # Nullable by default
+                    "max_num_tokens": {"type": "integer", "index": False, "null_value": 512},
+                    "num_tokens": {"type": "integer", "index": False},
+                    # Indexed so context_expansion can fetch neighbouring chunks by range
+                    "chunk_index": {"type": "integer"},
+                    "content": {"type": "text"},
+                    "content_hash": {"type": "keyword", "index": False, "doc_values": False},
+                    "embedding": hnsw_config
+                }
+            },
+            **document_properties,
+        }
+    elif layout == "flat":
+        properties = {
+            # Collapsing, fetching and updating a document's chunks all go through document_id
+            "document_id": {"type": "keyword"},
+            # Indexed here so neighbouring chunks and chunks left over from a longer version can be found by range
+            "chunk_index": {"type": "integer"},
+            "title": {"type": "text"},
+            "title_hash": {"type": "keyword", "index": False, "doc_values": False},
+            # No title_vector, it would be one more HNSW entry per chunk rather than per document
+            "link": {"type": "text", "index": False},
+            "max_num_tokens": {"type": "integer", "index": False, "null_value": 512},
+            "num_tokens": {"type": "integer", "index": False},
+            "content": {"type": "text"},
+            "content_hash": {"type": "keyword", "index": False, "doc_values": False},
+            "embedding": hnsw_config,
+            **document_properties,
+        }
+    else:
+        raise ValueError(f"Unknown index layout {layout}")
+
     schema = {
         "settings": {
             "index": {
@@ -42,36 +107,7 @@ def create_index(client, index_name):
             }
         },
         "mappings": {
-            "properties": {
-                "title": {"type": "text"},
-                "content": {"type": "text", "index": False},  # All keyword contents are stored at the "chunk" level
-                "title_vector": hnsw_config,
-                "chunks": {
-                    "type": "nested",
-                    "properties": {
-                        "link": {"type": "text", "index": False},  # Nullable by default
-                        "max_num_tokens": {"type": "integer", "index": False, "null_value": 512},
-                        "num_tokens": {"type": "integer", "index": False},
-                        "chunk_index": {"type": "integer", "index": False},
-                        "content": {"type": "text"},
-                        "embedding": hnsw_config
-                    }
-                },
-                "source_type": {"type": "keyword"},
-                "document_sets": {"type": "keyword"},
-                "metadata": {
-                    "type": "nested",
-                    "properties": {
-                        "key": {"type": "keyword"},
-                        # The value can be a single term or an array (just add multiple to it at indexing time)
-                        "value": {"type": "keyword"}
-                    }
-                },
-                "last_updated": {"type": "date"},
-                # 0 default, positive for upvoted, negative for downvoted
-                "boost_count": {"type": "integer", "null_value": 0},
-                "not_hidden": {"type": "boolean", "null_value": True},
-            }
+            "properties": properties
         }
     }
 
@@ -105,351 +141,129 @@ def add_normalization_processor(client):
     }
     client.search_pipeline.put(id="normalization_step", body=pipeline_body)
 
-def index_document(client, index_name, document: Document):
-    def _expand_dict(dict):
-        return [
-            {"key": k, "value": v} for k, v in dict.items()
+def _expand_dict(dict):
+    return [
+        {"key": k, "value": v} for k, v in dict.items()
+    ]
+
+def build_index_bodies(documents: list[DanswerDocument]) -> list[dict]:
+    # Documents without chunks are chunked from their content first (see chunker.chunk_documents).
+    # Titles and chunks that don't carry an embedding yet are embedded together as one batch,
+    # the float32 arrays go into the body as is and are only turned into JSON by the serializer
+    documents = list(chunk_documents(documents))
+    embeddings = iter(batch_vectorize([
+        (text, TextType.PASSAGE)
+        for document in documents
+        for text, embedding in [
+            (document.title, document.title_embedding),
+            *((chunk.content, chunk.embedding) for chunk in document.chunks),
         ]
+        if embedding is None
+    ]))
 
-    doc = {
-        "title": document.title,
-        "content": document.content,
-        "title_vector": vectorize(document.title, TextType.PASSAGE),
-        "chunks": [
-            {
-                "link": chunk.link,
-                "max_num_tokens": chunk.max_num_tokens,
-                "num_tokens": chunk.num_tokens,
-                "chunk_index": chunk.chunk_index,
-                "content": chunk.content,
-                "embedding": vectorize(chunk.content, TextType.PASSAGE)
-            } for chunk in document.chunks
-        ],
-        "metadata": _expand_dict(document.metadata),
-        "source_type": "web",
-        "document_sets": document.document_sets,
-        "last_updated": document.last_updated,
-        "boost_count": 0,
-        "not_hidden": not document.hidden
-    }
+    def _embedding(existing):
+        return existing if existing is not None else next(embeddings)
+
+    return [
+        {
+            "title": document.title,
+            "content": document.content,
+            "title_vector": _embedding(document.title_embedding),
+            "title_hash": content_hash(document.title),
+            "chunks": [
+                {
+                    "link": chunk.link,
+                    "max_num_tokens": chunk.max_num_tokens,
+                    "num_tokens": chunk.num_tokens,
+                    "chunk_index": chunk.chunk_index,
+                    "content": chunk.content,
+                    "content_hash": content_hash(chunk.content),
+                    "embedding": _embedding(chunk.embedding)
+                } for chunk in document.chunks
+            ],
+            "metadata": _expand_dict(document.metadata),
+            "source_type": document.source_type,
+            "document_sets": document.document_sets,
+            "last_updated": document.last_updated,
+            "boost_count": document.boost_count,
+            "not_hidden": not document.hidden
+        } for document in documents
+    ]
+
+def index_document(client, index_name, document: DanswerDocument, doc: dict | None = None, bump_generation: bool = True):
+    if doc is None:
+        doc = build_index_bodies([document])[0]
 
     print(f"Indexing {document.title} document")
-    response = client.index(index=index_name, body=doc)
+    response = client.index(index=index_name, body=doc, id=document.document_id)
+    if bump_generation:
+        bump_write_generation(index_name)
     print(response)
 
-def hybrid_search(client, index_name, query, max_num_results=10):
-    # TODO ADD ACL
-    start_date_str = datetime(2023, 11, 14).isoformat()
-    end_date_str = datetime(2023, 11, 16).isoformat()
-    query_vector = vectorize(query, TextType.QUERY)
-
-    # https://opensearch.org/docs/latest/search-plugins/search-pipelines/normalization-processor/#search-tuning-recommendations
-    search_body_complete = {
-        "size": max_num_results,  # Number of results to return
-        "query": {
-            "bool": {
-                "must": [
-                    {
-                        "function_score": {
-                            "query": {
-                                "function_score": {
-                                    "query": {
-                                        "nested": {
-                                            "path": "chunks",
-                                            "query": {
-                                                # Apply the Normalization pipeline step for each result within the queries of hybrid
-                                                "hybrid": {
-                                                    "queries": [
-                                                        # Keyword score that includes both the overall document title and the chunk content
-                                                        {
-                                                            # This may still be filtering out all the docs, need to verify
-                                                            "multi_match": {
-                                                                "query": query,
-                                                                "type": "most_fields",
-                                                                "fields": [
-                                                                    "title^1.2",  # Means it"s boosted
-                                                                    "chunks.content"
-                                                                ],
-                                                                "_name": "combined_keyword_score",
-                                                            },
-                                                        },
-                                                        # Title Vector Score
-                                                        {
-                                                            "knn": {
-                                                                "title_vector": {
-                                                                    "vector": query_vector,
-                                                                    "k": max_num_results,  # Similar to the size but it"s per shard (in this case we only have one)
-                                                                    "_name": "title_vector_score"
-                                                                },
-                                                            },
-                                                        },
-                                                        # Chunk Vector Score
-                                                        {
-                                                            "knn": {
-                                                                "chunks.embedding": {
-                                                                    "vector": query_vector,
-                                                                    "k": max_num_results,
-                                                                    "_name": "chunk_vector_score"
-                                                                },
-                                                            },
-                                                        },
-                                                    ],
-                                                },
-                                            },
-                                            "inner_hits": {
-                                                "size": 20
-                                            },
-                                        },
-                                    },
-                                    "functions": [
-                                        {
-                                            "filter": {"exists": {"field": "last_updated"}},
-                                            "gauss": {
-                                                "last_updated": {
-                                                    "origin": "now",
-                                                    # Reaches 0.5 score at 1 year (but this is 0.5 of the 0.25)
-                                                    # Slower decay over time eventually
-                                                    "scale": "365d",
-                                                    "decay": 0.5  # This could be set at query time to affect the rate of decay
-                                                }
-                                            },
-                                            "weight": 0.25
-                                        },
-                                        {
-                                            # If no date, then give a ~1/4th penalty (like 1 quarter old)
-                                            # Note that if we modify the decay rate, this may not be approximate to 1 quarter anymore
-                                            "filter": {"bool": {"must_not": {"exists": {"field": "last_updated"}}}},
-                                            "weight": 0.18
-                                        },
-                                        # Always add a 0.75 capping the decay
-                                        {
-                                            "weight": 0.75
-                                        }
-                                    ],
-                                    "score_mode": "sum",
-                                    "boost_mode": "multiply"
-                                },
-                            },
-                            # 0.5 to 2x score: piecewise sigmoid function stretched out by factor of 3
-                            # meaning requires 3x the number of feedback votes to have default sigmoid effect
-                            "script_score": {
-                                "script": {
-                                    "source": """
-                                    double boost_count = doc["boost_count"].value;
-                                    if (boost_count < 0) {
-                                        return 0.5 + (1 / (1 + Math.exp(-boost_count / 3)));
-                                    } else {
-                                        return 2 / (1 + Math.exp(-boost_count / 3));
-                                    }
-                                    """,
-                                    "lang": "painless"
-                                }
-                            },
-                            "boost_mode": "multiply"
-                        },
-                    },
-                ],
-                "filter": [
-                    # More efficient as filters are cached where as must_not is not
-                    # Only boolean scores, likely just more efficient overall
-                    {
-                        "term": {"not_hidden": True}
-                    },
-                    {
-                        "range": {
-                            "last_updated": {
-                                "gte": start_date_str,
-                                "lte": end_date_str
-                            }
-                        }
-                    },
-                    {
-                        "terms": {
-                            # This does an "or" of the values
-                            # for matching every one, it would be 3 lines with single value rather than array
-                            "document_sets": ["set1", "set2"]
-                        }
-                    },
-                    {
-                        "nested": {
-                            "path": "metadata",
-                            "query": {
-                                "bool": {
-                                    "must": [
-                                        {"term": {"metadata.key": "space"}},
-                                        {"term": {"metadata.value": "IT"}}
-                                    ]
-                                }
-                            }
-                        }
-                    },
-                    {
-                        "nested": {
-                            "path": "metadata",
-                            "query": {
-                                "bool": {
-                                    "must": [
-                                        {"term": {"metadata.key": "space"}},
-                                        {"term": {"metadata.value": "HR"}}
-                                    ]
-                                }
-                            }
-                        }
-                    }
-                ],
-            },
-        },
-    }
+def index_documents(client, index_name, documents: list[DanswerDocument]):
+    # One write generation bump for the lot rather than one per document
+    try:
+        for document, doc in zip(documents, build_index_bodies(documents)):
+            index_document(client, index_name, document, doc, bump_generation=False)
+    finally:
+        bump_write_generation(index_name)
 
+def default_search_filters() -> SearchFilters:
+    # The filters the POC has been testing with, hybrid_search falls back to these
+    return SearchFilters(
+        last_updated_from=datetime(2023, 11, 14),
+        last_updated_to=datetime(2023, 11, 16),
+        document_sets=["set1", "set2"],
+        metadata={"space": ["IT", "HR"]},
+    )
 
-    # Gets one chunk per doc for some reason
-    # Normalization is not applied as expected, not sure if applied at all (it's not applied across the same chunks of the doc either), no clue what is going on
-    # Can get inner hits but it's just one chunk per hit as well
-    search_body_hybrid_inside = {
-        "size": max_num_results,  # Number of results to return
-        "query": {
-            "nested": {
-                "path": "chunks",
-                "query": {
-                    "hybrid": {
-                        "queries": [
-                            # Keyword score that includes both the overall document title and the chunk content
-                            # {
-                            #     "multi_match": {
-                            #         "query": query,
-                            #         "fields": [
-                            #             "title^1.2",  # Means it's boosted
-                            #             "chunks.content"
-                            #         ],
-                            #         "_name": "combined_keyword_score",
-                            #     },
-                            # },
-                            # Title Vector Score
-                            # {
-                            #     "knn": {
-                            #         "title_vector": {
-                            #             "vector": query_vector,
-                            #             "k": max_num_results,
-                            #             "_name": "title_vector_score"
-                            #         },
-                            #     },
-                            # },
-                            # Chunk Vector Score
-                            {
-                                "knn": {
-                                    "chunks.embedding": {
-                                        "vector": query_vector,
-                                        "k": max_num_results,
-                                        "_name": "chunk_vector_score"
-                                    },
-                                },
-                            },
-                        ],
-                    },
-                },
-                "score_mode": "max",
-                "inner_hits": {
-                    "size": 20
-                },
-            },
-        },
-    }
 
-    
-    # The sections seem to be getting the normalization applied correctly
-    # However with just the chunk vectors, the calculations aren't correct
-    # Checked:
-    # - if the normalization for the chunks is done by taking into all chunks irrespective of the doc
-    # - if the normalization for the chunks is done by taking the max chunk score of each document
-    # Unverified: whether the scores are correct for the chunk or mixing the max scores of each query (meaning mixing chunks)
-    search_body_hybrid_outside = {
-        "size": max_num_results,  # Number of results to return
-        "query": {
-            "hybrid": {
-                "queries": [
-                    # Keyword score that includes both the overall document title and the chunk content
-                    # {
-                    #     "nested": {
-                    #         "path": "chunks",
-                    #         "query": {
-                    #             "match": {
-                    #                 "chunks.content": {
-                    #                     "query": query,
-                    #                     "_name": "content_keyword_score"
-                    #                 }
-                    #             }
-                    #         },
-                    #         "score_mode": "max",
-                    #         "inner_hits": {
-                    #             "size": 20
-                    #         }
-                    #     },
-                    # },
-                    # Title Vector Score
-                    # {
-                    #     "knn": {
-                    #         "title_vector": {
-                    #             "vector": query_vector,
-                    #             "k": max_num_results,
-                    #             "_name": "title_vector_score"
-                    #         },
-                    #     },
-                    # },
-                    # Chunk Vector Score
-                    # This way of nesting apparently doesn't give back the inner hits
-                    # Gives back documents that are normalized
-                    {
-                        "nested": {
-                            "path": "chunks",
-                            "query": {
-                                "knn": {
-                                    "chunks.embedding": {
-                                        "vector": query_vector,
-                                        "k": max_num_results,
-                                        "_name": "chunk_vector_score"
-                                    },
-                                },
-                            },
-                            "score_mode": "max",
-                            "inner_hits": {
-                                "size": 20
-                            }
-                        },
-                    },
-                ],
-            },
-        },
-    }
+# The body from query_builder that hybrid_search actually sends
+SEARCH_BODY_VARIANT = "hybrid_outside"
 
-    search_body_content_only = {
-        "size": max_num_results,  # Number of results to return
-        "query": {
-            "nested": {
-                "path": "chunks",
-                "query": {
-                    "match": {
-                        "chunks.content": query,
-                    }
-                },
-            },
-        }
-    }
 
-    search_body_all = {
-        "size": max_num_results,  # Number of results to return
-        "query": {
-            "match_all": {}
-        }
-    }
-    
-    response = client.search(
-        index=index_name,
-        search_pipeline="normalization_step",
-        body=search_body_hybrid_outside,
-        include_named_queries_score=True
-    )
+def hybrid_search(
+    client,
+    index_name,
+    query,
+    max_num_results=10,
+    variant=SEARCH_BODY_VARIANT,
+    filters: SearchFilters | None = None,
+    use_cache: bool = True,
+    max_staleness_seconds: float = 0.0,
+    source: dict | bool | None = DEFAULT_SOURCE,
+    inner_hits_source: dict | bool | None = DEFAULT_INNER_HITS_SOURCE,
+):
+    # Returns the raw response, search_response.SearchResults reads it as result objects
+    if filters is None:
+        filters = default_search_filters()
+    search_pipeline = "normalization_step"
+
+    def _search():
+        query_vector = embed_query(query)
+        search_body = build_search_body(variant, query, query_vector, max_num_results, filters, source, inner_hits_source)
 
-    return response
+        return client.search(
+            index=index_name,
+            search_pipeline=search_pipeline,
+            body=search_body,
+            include_named_queries_score=True
+        )
+
+    if not use_cache:
+        return _search()
+
+    cache_key = search_cache_key(
+        index_name=index_name,
+        query=normalize_query(query),
+        filters=filters.to_clauses(),
+        size=max_num_results,
+        pipeline=search_pipeline,
+        variant=variant,
+        source=source,
+        inner_hits_source=inner_hits_source,
+    )
+    return search_result_cache.get_or_search(cache_key, index_name, _search, max_staleness_seconds)
 
 
 def main():
@@ -460,11 +274,20 @@ def main():
 
     add_normalization_processor(client)
 
-    for document in DOCUMENTS:
-       index_document(client, index_name, document)
+    with bulk_load_mode(client, index_name) as load_stats:
+        result = bulk_index_documents(client, index_name, examples.DOCUMENTS, build_index_bodies)
+    print(f"Indexed {result.indexed} documents in {result.elapsed_seconds:.2f}s, {len(result.failures)} failures")
+    print(load_stats)
+    for failure in result.failures:
+        print(failure)
 
     print("Performing hybrid search")
-    print(hybrid_search(client, index_name, QUERY))
+    results = SearchResults(hybrid_search(client, index_name, QUERY))
+    print(f"{results.total} hits in {results.took_ms}ms")
+    for document in results:
+        print(document)
+        for chunk in document.chunks:
+            print(f"    {chunk}")
 
 if __name__ == "__main__":
     main()
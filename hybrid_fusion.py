@@ -0,0 +1,186 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from query_cache import embed_query
+
+
+# Same weights as the normalization_step pipeline in basic_example: keyword, then vector
+DEFAULT_WEIGHTS = (0.3, 0.7)
+# Same title boost as the keyword query of full_example.hybrid_search ("title^1.2")
+TITLE_BOOST = 1.2
+
+
+class FusedChunk(NamedTuple):
+    document_id: str
+    chunk_index: int
+    score: float
+    keyword_score: float  # After normalization, the leg's lowest if the keyword leg didn't return the chunk
+    vector_score: float  # After normalization, the leg's lowest if the vector leg didn't return the chunk
+    source: dict
+
+
+def normalize_scores(scores: np.ndarray, technique: str = "min_max") -> np.ndarray:
+    if scores.size == 0:
+        return scores
+    if technique == "min_max":
+        low, high = scores.min(), scores.max()
+        # Matches the normalization processor, a leg where every score is equal counts as a full match
+        if high == low:
+            return np.ones_like(scores)
+        return (scores - low) / (high - low)
+    if technique == "z_score":
+        std = scores.std()
+        if std == 0:
+            return np.zeros_like(scores)
+        return (scores - scores.mean()) / std
+    raise ValueError(f"Unknown normalization technique {technique}")
+
+
+def _nested_leg(
+    chunk_query: dict,
+    num_documents: int,
+    inner_hits_size: int,
+    filters: list[dict],
+    document_query: dict | None = None,
+) -> dict:
+    query: dict = {
+        "nested": {
+            "path": "chunks",
+            "query": chunk_query,
+            "score_mode": "max",
+            "inner_hits": {
+                "size": inner_hits_size,
+                # The embeddings are not needed to rank and are by far the largest part of a chunk
+                "_source": {"excludes": ["chunks.embedding"]},
+            },
+        },
+    }
+    if document_query is not None:
+        # Summed with the best chunk's score, _chunk_scores takes it back out of the document score
+        query = {"bool": {"should": [query, document_query]}}
+    if filters:
+        query = {"bool": {"must": [query], "filter": filters}}
+    return {"size": num_documents, "_source": False, "query": query}
+
+
+def build_fusion_searches(
+    query: str,
+    query_vector,
+    num_documents: int = 10,
+    inner_hits_size: int = 20,
+    filters: list[dict] | None = None,
+) -> list[dict]:
+    # BM25 and k-NN run as separate sub-searches so each one keeps its own per-chunk scores
+    # in inner_hits, rather than having the nested max and the hybrid normalization mixed on the server.
+    # The keyword leg scores the title as well as the chunk content, like hybrid_search's most_fields
+    # query over title^1.2 and chunks.content.
+    keyword_leg = _nested_leg(
+        {"match": {"chunks.content": {"query": query}}},
+        num_documents, inner_hits_size, filters or [],
+        document_query={"match": {"title": {"query": query, "boost": TITLE_BOOST}}},
+    )
+    vector_leg = _nested_leg(
+        {"knn": {"chunks.embedding": {"vector": query_vector, "k": num_documents}}},
+        num_documents, inner_hits_size, filters or [],
+    )
+    return [{}, keyword_leg, {}, vector_leg]
+
+
+def _chunk_scores(response: dict, with_document_score: bool = False) -> dict[tuple[str, int], tuple[float, dict]]:
+    # with_document_score adds what the document scored besides its best chunk (the title match of
+    # the keyword leg) to each of its chunks, the way most_fields sums the title and content scores
+    scores = {}
+    for hit in response["hits"]["hits"]:
+        inner_hits = hit["inner_hits"]["chunks"]["hits"]["hits"]
+        document_score = 0.0
+        if with_document_score:
+            best_chunk = max((inner_hit["_score"] for inner_hit in inner_hits), default=0.0)
+            document_score = max(hit["_score"] - best_chunk, 0.0)
+        for inner_hit in inner_hits:
+            source = inner_hit.get("_source", {})
+            # The stored chunk_index, the nested offset only matches it while chunks are stored in order
+            chunk_index = source.get("chunk_index")
+            if chunk_index is None:
+                chunk_index = inner_hit["_nested"]["offset"]
+            scores[(hit["_id"], chunk_index)] = (inner_hit["_score"] + document_score, source)
+    return scores
+
+
+def _leg_scores(scores: dict[tuple[str, int], tuple[float, dict]], positions: dict[tuple[str, int], int], technique: str) -> np.ndarray:
+    # One leg's normalized scores over every chunk. A chunk the leg didn't return gets the bottom of
+    # the leg's normalized range: 0 for min_max, the lowest score for z_score (where 0 is the mean).
+    leg = np.zeros(len(positions), dtype=np.float32)
+    if not scores:
+        return leg
+    normalized = normalize_scores(np.fromiter((score for score, _ in scores.values()), dtype=np.float32, count=len(scores)), technique)
+    leg[:] = min(float(normalized.min()), 0.0)
+    leg[np.fromiter((positions[key] for key in scores), dtype=np.intp, count=len(scores))] = normalized
+    return leg
+
+
+def fuse_responses(
+    keyword_response: dict,
+    vector_response: dict,
+    weights: tuple[float, float] = DEFAULT_WEIGHTS,
+    technique: str = "min_max",
+    top_k: int | None = None,
+) -> list[FusedChunk]:
+    keyword = _chunk_scores(keyword_response, with_document_score=True)
+    vector = _chunk_scores(vector_response)
+
+    # Every chunk either leg returned, in the order the legs returned them so ties always break the same way
+    keys = list(dict.fromkeys([*keyword, *vector]))
+    positions = {key: i for i, key in enumerate(keys)}
+    keyword_scores = _leg_scores(keyword, positions, technique)
+    vector_scores = _leg_scores(vector, positions, technique)
+
+    # Weighted arithmetic mean, same combination as the normalization_step pipeline
+    keyword_weight, vector_weight = weights
+    combined = (keyword_weight * keyword_scores + vector_weight * vector_scores) / (keyword_weight + vector_weight)
+
+    order = np.argsort(-combined, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+
+    fused = []
+    for i in order:
+        document_id, chunk_index = keys[i]
+        source = keyword.get(keys[i], vector.get(keys[i], (0.0, {})))[1]
+        fused.append(FusedChunk(
+            document_id=document_id,
+            chunk_index=chunk_index,
+            score=float(combined[i]),
+            keyword_score=float(keyword_scores[i]),
+            vector_score=float(vector_scores[i]),
+            source=source,
+        ))
+    return fused
+
+
+def fused_hybrid_search(
+    client,
+    index_name: str,
+    query: str,
+    num_documents: int = 10,
+    inner_hits_size: int = 20,
+    weights: tuple[float, float] = DEFAULT_WEIGHTS,
+    technique: str = "min_max",
+    filters: list[dict] | None = None,
+    top_k: int | None = None,
+) -> list[FusedChunk]:
+    # Chunk level hybrid ranking done client side: both legs go out in one _msearch round trip,
+    # each leg's chunk scores are normalized on their own and then combined with the pipeline weights.
+    # Note that a nested k-NN leg only returns the chunks that made its top k, other chunks score 0 there.
+    query_vector = embed_query(query)
+    response = client.msearch(
+        index=index_name,
+        body=build_fusion_searches(query, query_vector, num_documents, inner_hits_size, filters),
+    )
+
+    keyword_response, vector_response = response["responses"]
+    for leg, leg_response in (("keyword", keyword_response), ("vector", vector_response)):
+        if "error" in leg_response:
+            raise RuntimeError(f"The {leg} leg of the hybrid search failed: {leg_response['error']}")
+
+    return fuse_responses(keyword_response, vector_response, weights, technique, top_k)
@@ -0,0 +1,132 @@
+import dataclasses
+from dataclasses import dataclass
+
+import numpy as np
+from opensearchpy.exceptions import ConflictError
+
+from chunker import chunk_documents
+from examples import DanswerDocument
+from full_example import build_index_bodies
+from result_cache import bump_write_generation
+from utils import content_hash
+
+
+# Everything in the indexed body apart from the title and the chunks, these can be changed with a partial update
+DOCUMENT_FIELDS = ("content", "metadata", "source_type", "document_sets", "last_updated", "boost_count", "not_hidden")
+
+
+@dataclass
+class UpsertReport:
+    document_id: str
+    action: str  # "created", "reindexed", "partial_update" or "unchanged"
+    embeddings_computed: int
+    embeddings_reused: int
+    bytes_sent: int
+    # Compared to sending the whole document body, as a plain re-index would
+    bytes_saved: int
+
+
+def _without_vectors(chunks: list[dict]) -> list[dict]:
+    return [{key: value for key, value in chunk.items() if key != "embedding"} for chunk in chunks]
+
+
+def upsert_document(client, index_name: str, document: DanswerDocument, max_conflict_retries: int = 3) -> UpsertReport:
+    # Re-indexes a document under its document_id doing as little as possible. Stored per chunk
+    # content hashes decide which chunks changed. Only those go through the model, the others
+    # keep the vectors already in the index. If neither the title nor any chunk changed, only
+    # the changed document level fields are sent through the _update API.
+    #
+    # The write only goes through if the stored document is still the one that was read, another
+    # writer getting there first makes it fail with a 409 and the whole upsert starts over from a
+    # fresh read, up to max_conflict_retries times.
+    # Chunked up front so the chunks compared below are the ones that get indexed
+    document = next(chunk_documents([document]))
+    for attempt in range(max_conflict_retries + 1):
+        try:
+            return _upsert_once(client, index_name, document)
+        except ConflictError:
+            if attempt == max_conflict_retries:
+                raise
+
+
+def _upsert_once(client, index_name: str, document: DanswerDocument) -> UpsertReport:
+    serializer = client.transport.serializer
+    stored = client.get(index=index_name, id=document.document_id, ignore=[404])
+
+    if not stored.get("found"):
+        embeddings_needed = (document.title_embedding is None) + sum(chunk.embedding is None for chunk in document.chunks)
+        body = build_index_bodies([document])[0]
+        size = len(serializer.dumps(body).encode("utf-8"))
+        # Fails if someone else created the document since the read
+        client.index(index=index_name, id=document.document_id, body=body, op_type="create")
+        bump_write_generation(index_name)
+        return UpsertReport(document.document_id, "created", embeddings_needed, 0, size, 0)
+
+    source = stored["_source"]
+    # Only write over the version that was read
+    expected_version = {"if_seq_no": stored["_seq_no"], "if_primary_term": stored["_primary_term"]}
+    stored_vectors = {chunk.get("content_hash"): chunk["embedding"] for chunk in source.get("chunks", [])}
+    stored_vectors[source.get("title_hash")] = source.get("title_vector")
+
+    # Take over stored vectors for unchanged texts, build_index_bodies then embeds only the rest.
+    # They go into a copy, the caller's document keeps the embeddings it came with.
+    embeddings_reused = 0
+    embeddings_computed = 0
+
+    def _embedding(existing, text):
+        nonlocal embeddings_reused, embeddings_computed
+        if existing is not None:
+            return existing
+        vector = stored_vectors.get(content_hash(text))
+        if vector is None:
+            embeddings_computed += 1
+            return None
+        embeddings_reused += 1
+        return np.asarray(vector, dtype=np.float32)
+
+    document = dataclasses.replace(
+        document,
+        title_embedding=_embedding(document.title_embedding, document.title),
+        chunks=[dataclasses.replace(chunk, embedding=_embedding(chunk.embedding, chunk.content)) for chunk in document.chunks],
+    )
+    body = build_index_bodies([document])[0]
+    full_size = len(serializer.dumps(body).encode("utf-8"))
+
+    # JSON round trip so values compare the way they were stored, datetimes as strings for instance
+    new = serializer.loads(serializer.dumps({
+        **{field: body[field] for field in DOCUMENT_FIELDS},
+        "title": body["title"],
+        "title_hash": body["title_hash"],
+        "chunks": _without_vectors(body["chunks"]),
+    }))
+    content_unchanged = (
+        new["title_hash"] == source.get("title_hash")
+        and new["title"] == source.get("title")
+        and new["chunks"] == _without_vectors(source.get("chunks", []))
+    )
+
+    if not content_unchanged:
+        client.index(index=index_name, id=document.document_id, body=body, **expected_version)
+        bump_write_generation(index_name)
+        return UpsertReport(document.document_id, "reindexed", embeddings_computed, embeddings_reused, full_size, 0)
+
+    partial = {field: new[field] for field in DOCUMENT_FIELDS if new[field] != source.get(field)}
+    if not partial:
+        return UpsertReport(document.document_id, "unchanged", 0, embeddings_reused, 0, full_size)
+
+    update_body = {"doc": partial}
+    size = len(serializer.dumps(update_body).encode("utf-8"))
+    client.update(index=index_name, id=document.document_id, body=update_body, **expected_version)
+    bump_write_generation(index_name)
+    return UpsertReport(document.document_id, "partial_update", 0, embeddings_reused, size, full_size - size)
+
+
+def upsert_documents(client, index_name: str, documents: list[DanswerDocument]) -> list[UpsertReport]:
+    reports = [upsert_document(client, index_name, document) for document in documents]
+    computed = sum(report.embeddings_computed for report in reports)
+    reused = sum(report.embeddings_reused for report in reports)
+    print(
+        f"Upserted {len(reports)} documents: {computed} embeddings computed, {reused} reused, "
+        f"{sum(report.bytes_sent for report in reports)} bytes sent, {sum(report.bytes_saved for report in reports)} bytes saved"
+    )
+    return reports
@@ -0,0 +1,270 @@
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+from bulk_indexing import BuildBodies, BulkIndexResult, _batched, bulk_index_documents
+from chunker import chunk_documents
+from examples import DanswerDocument
+from full_example import build_index_bodies
+from query_builder import SearchFilters
+from query_cache import embed_query
+from result_cache import bump_write_generation
+
+
+# The two layouts create_index in full_example can build, everything here takes the layout the
+# index was created with:
+# - "nested": one OpenSearch document per document, chunks nested inside it
+# - "flat": one OpenSearch document per chunk, the document's fields copied onto every chunk
+LAYOUTS = ("nested", "flat")
+
+# Fields copied from a document onto each of its chunks in the flat layout
+DOCUMENT_FIELDS = ("title", "title_hash", "metadata", "source_type", "document_sets", "last_updated", "boost_count", "not_hidden")
+
+
+@dataclass
+class DocumentHit:
+    document_id: str
+    score: float
+    # Best matching chunks first, without their embeddings
+    chunks: list[dict]
+
+
+@dataclass
+class LayoutSearchResult:
+    documents: list[DocumentHit]
+    # Chunk candidates (k) of the last round, and how many rounds it took to get enough documents
+    k: int
+    rounds: int
+    # Server side time summed over the rounds
+    took_ms: int = 0
+
+
+def flat_chunk_id(document_id: str, chunk_index: int) -> str:
+    return f"{document_id}__{chunk_index}"
+
+
+def build_flat_index_bodies(documents: list[DanswerDocument]) -> list[list[dict]]:
+    # One body per chunk for every document, same fields (and embeddings) as the nested layout
+    bodies = []
+    for document, body in zip(documents, build_index_bodies(documents)):
+        parent = {name: body[name] for name in DOCUMENT_FIELDS}
+        bodies.append([{**parent, "document_id": document.document_id, **chunk} for chunk in body["chunks"]])
+    return bodies
+
+
+def generate_flat_index_actions(
+    index_name: str,
+    documents: Iterable[DanswerDocument],
+    build_bodies: BuildBodies = build_flat_index_bodies,
+    embed_batch_size: int = 64,
+) -> Iterator[dict]:
+    # bulk_indexing.GenerateActions for the flat layout, chunks are indexed under
+    # document_id + chunk_index so re-indexing a document overwrites its chunks in place
+    for batch in _batched(documents, embed_batch_size):
+        for document, chunk_bodies in zip(batch, build_bodies(batch)):
+            for body in chunk_bodies:
+                yield {"_index": index_name, "_id": flat_chunk_id(document.document_id, body["chunk_index"]), "_source": body}
+
+
+def _stale_chunks_query(chunk_counts: dict[str, int]) -> dict:
+    # Chunks past the current end of their document, left over from a longer earlier version
+    return {
+        "bool": {
+            "should": [
+                {"bool": {"filter": [
+                    {"term": {"document_id": document_id}},
+                    {"range": {"chunk_index": {"gte": count}}},
+                ]}}
+                for document_id, count in chunk_counts.items()
+            ],
+            "minimum_should_match": 1,
+        }
+    }
+
+
+def index_documents(
+    client,
+    index_name: str,
+    layout: str,
+    documents: Iterable[DanswerDocument],
+    remove_stale_chunks: bool = True,
+    stale_batch_size: int = 500,
+    **bulk_kwargs: Any,
+) -> BulkIndexResult:
+    # Indexes or re-indexes documents in either layout through bulk_index_documents. In the flat
+    # layout, `indexed` counts chunks, and a document that now has fewer chunks than before gets
+    # its extra chunks deleted once the load is done. Initial loads into an empty index can skip that.
+    if layout == "nested":
+        return bulk_index_documents(client, index_name, documents, build_index_bodies, **bulk_kwargs)
+    if layout != "flat":
+        raise ValueError(f"Unknown index layout {layout}")
+
+    chunk_counts: dict[str, int] = {}
+
+    def _counted(documents: Iterable[DanswerDocument]) -> Iterator[DanswerDocument]:
+        for document in documents:
+            chunk_counts[document.document_id] = len(document.chunks)
+            yield document
+
+    # Chunked here rather than in build_index_bodies so the counts are of the chunks actually indexed
+    result = bulk_index_documents(
+        client, index_name, _counted(chunk_documents(documents)), build_flat_index_bodies,
+        generate_actions=generate_flat_index_actions, **bulk_kwargs,
+    )
+    if remove_stale_chunks and chunk_counts:
+        start = time.perf_counter()
+        for batch in _batched(chunk_counts.items(), stale_batch_size):
+            client.delete_by_query(
+                index=index_name,
+                body={"query": _stale_chunks_query(dict(batch))},
+                refresh=bulk_kwargs.get("refresh", False),
+                conflicts="proceed",
+            )
+        bump_write_generation(index_name)
+        result.elapsed_seconds += time.perf_counter() - start
+    return result
+
+
+def update_document_fields(client, index_name: str, layout: str, document_id: str, fields: dict) -> int:
+    # Changes document level fields (boost_count, document_sets, ...) and returns how many OpenSearch
+    # documents had to be rewritten for it: 1 in the nested layout, one per chunk in the flat one
+    if layout == "nested":
+        client.update(index=index_name, id=document_id, body={"doc": fields})
+        bump_write_generation(index_name)
+        return 1
+    if layout != "flat":
+        raise ValueError(f"Unknown index layout {layout}")
+
+    response = client.update_by_query(
+        index=index_name,
+        body={
+            "query": {"term": {"document_id": document_id}},
+            "script": {
+                "source": "for (entry in params.fields.entrySet()) { ctx._source[entry.getKey()] = entry.getValue() }",
+                "lang": "painless",
+                "params": {"fields": fields},
+            },
+        },
+        conflicts="proceed",
+    )
+    bump_write_generation(index_name)
+    return response["updated"]
+
+
+# Two legs, keyword then vector, the order the normalization_step pipeline from
+# basic_example.add_normalization_processor weights them in
+SEARCH_PIPELINE = "normalization_step"
+
+
+def _filtered(query: dict, filters: list[dict]) -> dict:
+    return {"bool": {"must": [query], "filter": filters}} if filters else query
+
+
+def _search_body(
+    layout: str,
+    query: str,
+    query_vector,
+    num_documents: int,
+    k: int,
+    inner_hits_size: int,
+    filters: list[dict],
+    hybrid: bool,
+) -> dict:
+    # The keyword leg scores the title boosted by 1.2 plus the chunk content, like the keyword
+    # query of full_example.hybrid_search. A hybrid query has to be the top level query, so
+    # the filters go into each leg.
+    if layout == "nested":
+        keyword = {
+            "bool": {
+                "should": [
+                    {"match": {"title": {"query": query, "boost": 1.2}}},
+                    {"nested": {"path": "chunks", "score_mode": "max", "query": {"match": {"chunks.content": query}}}},
+                ],
+            },
+        }
+        knn = {
+            "nested": {
+                "path": "chunks",
+                "score_mode": "max",
+                "query": {"knn": {"chunks.embedding": {"vector": query_vector, "k": k}}},
+                "inner_hits": {"size": inner_hits_size, "_source": {"excludes": ["chunks.embedding"]}},
+            },
+        }
+        body = {"_source": {"excludes": ["chunks", "title_vector"]}}
+    else:
+        keyword = {"multi_match": {"query": query, "type": "most_fields", "fields": ["title^1.2", "content"]}}
+        knn = {"knn": {"embedding": {"vector": query_vector, "k": k}}}
+        body = {
+            "_source": {"excludes": ["embedding"]},
+            # Best chunk per document, the rest of the document's matching chunks in inner_hits
+            "collapse": {
+                "field": "document_id",
+                "inner_hits": {
+                    "name": "chunks",
+                    "size": inner_hits_size,
+                    "sort": [{"_score": "desc"}],
+                    "_source": {"excludes": ["embedding"]},
+                },
+            },
+        }
+    if hybrid:
+        query_body = {"hybrid": {"queries": [_filtered(keyword, filters), _filtered(knn, filters)]}}
+    else:
+        query_body = _filtered(knn, filters)
+    return {**body, "size": num_documents, "track_total_hits": True, "query": query_body}
+
+
+def _document_hits(layout: str, response: dict) -> list[DocumentHit]:
+    hits = []
+    for hit in response["hits"]["hits"]:
+        # Both layouts name their inner hits "chunks", nested ones after the path and collapsed ones explicitly
+        inner_hits = hit.get("inner_hits", {}).get("chunks", {}).get("hits", {}).get("hits", [])
+        chunks = [inner_hit["_source"] for inner_hit in inner_hits]
+        document_id = hit["_id"] if layout == "nested" else hit["_source"]["document_id"]
+        hits.append(DocumentHit(document_id=document_id, score=hit["_score"], chunks=chunks))
+    return hits
+
+
+def search_documents(
+    client,
+    index_name: str,
+    layout: str,
+    query: str,
+    num_documents: int = 10,
+    inner_hits_size: int = 3,
+    filters: SearchFilters | None = None,
+    initial_k_factor: int = 2,
+    max_k: int = 1000,
+    hybrid: bool = True,
+    search_pipeline: str | None = SEARCH_PIPELINE,
+) -> LayoutSearchResult:
+    # Hybrid search returning num_documents distinct documents with their best chunks, the same
+    # keyword and chunk k-NN legs in either layout, combined by search_pipeline. hybrid=False runs
+    # the k-NN leg alone. k chunk candidates can belong to fewer than num_documents documents (several chunks of
+    # one document, or candidates removed by the filters), so k starts at initial_k_factor times
+    # num_documents and doubles until there are enough documents, k reaches max_k, or a larger k
+    # stopped finding new candidates.
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown index layout {layout}")
+    query_vector = embed_query(query)
+    clauses = filters.to_clauses() if filters is not None else []
+
+    k = min(num_documents * initial_k_factor, max_k)
+    rounds = 0
+    took_ms = 0
+    previous_total = -1
+    while True:
+        response = client.search(
+            index=index_name,
+            body=_search_body(layout, query, query_vector, num_documents, k, inner_hits_size, clauses, hybrid),
+            search_pipeline=search_pipeline if hybrid else None,
+        )
+        rounds += 1
+        took_ms += response.get("took", 0)
+        documents = _document_hits(layout, response)
+        total = response["hits"]["total"]["value"]
+        if len(documents) >= num_documents or k >= max_k or total <= previous_total:
+            return LayoutSearchResult(documents=documents, k=k, rounds=rounds, took_ms=took_ms)
+        previous_total = total
+        k = min(k * 2, max_k)
@@ -0,0 +1,216 @@
+import math
+import re
+from array import array
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+
+from hybrid_fusion import DEFAULT_WEIGHTS, normalize_scores
+from utils import EMBEDDING_DIM
+
+
+# Close enough to the standard analyzer for the english test content: lowercase and split on non word characters
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def analyze(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _as_numpy(values: array) -> np.ndarray:
+    # Zero copy view of an array("I") column, its item size depends on the platform
+    return np.frombuffer(values, dtype=f"u{values.itemsize}")
+
+
+class LocalHit(NamedTuple):
+    document_id: str
+    score: float
+    # (chunk offset, chunk score) of the best matching chunks, like the nested inner_hits
+    inner_hits: list[tuple[int, float]]
+
+
+class LocalSearchEngine:
+    # In-process stand-in for the nested index from create_index, meant as ground truth for ranking
+    # tests and benchmarks. Documents are the same bodies that build_index_bodies produces.
+    #
+    # Every chunk is a row: BM25 runs over an inverted index of array-backed postings and k-NN is
+    # an exact cosine over one contiguous float32 matrix, document scores are the max over chunks
+    # (score_mode max). Filters, title fields and function scores are not modeled.
+    def __init__(self, dim: int = EMBEDDING_DIM, k1: float = 1.2, b: float = 0.75):
+        self.dim = dim
+        self.k1 = k1
+        self.b = b
+
+        self._document_ids: list[str] = []
+        self._sources: list[dict] = []
+        self._positions: dict[str, int] = {}
+
+        # Per chunk columns, a chunk's row number is its id everywhere below
+        self._chunk_document = array("I")
+        self._chunk_offset = array("I")
+        self._chunk_length = array("I")
+        self._chunk_alive = bytearray()
+        self._total_length = 0
+
+        # term -> (chunk ids, term frequencies)
+        self._postings: dict[str, tuple[array, array]] = {}
+
+        # Normalized rows, grown by doubling so appends stay amortized O(1)
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self._chunk_document)
+
+    @property
+    def num_documents(self) -> int:
+        return len(self._positions)
+
+    def _append_embeddings(self, rows: np.ndarray):
+        start = self.num_chunks
+        needed = start + len(rows)
+        if needed > len(self._matrix):
+            grown = np.empty((max(needed, 2 * len(self._matrix), 1024), self.dim), dtype=np.float32)
+            grown[:start] = self._matrix[:start]
+            self._matrix = grown
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        self._matrix[start:needed] = rows / np.where(norms == 0, 1, norms)
+
+    def index_document(self, source: dict, document_id: str | None = None):
+        # Re-indexing an id replaces the document, the old chunks stay in the arrays but are skipped
+        if document_id is None:
+            document_id = str(len(self._document_ids))
+        previous = self._positions.get(document_id)
+        if previous is not None:
+            for chunk_id in np.flatnonzero(_as_numpy(self._chunk_document) == previous):
+                self._chunk_alive[chunk_id] = 0
+
+        position = len(self._document_ids)
+        self._document_ids.append(document_id)
+        self._positions[document_id] = position
+
+        chunks = source.get("chunks", [])
+        self._sources.append({
+            **{key: value for key, value in source.items() if key not in ("chunks", "title_vector")},
+            "chunks": [{key: value for key, value in chunk.items() if key != "embedding"} for chunk in chunks],
+        })
+        if not chunks:
+            return
+
+        self._append_embeddings(np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32))
+        for offset, chunk in enumerate(chunks):
+            chunk_id = self.num_chunks
+            terms = analyze(chunk["content"])
+            self._chunk_document.append(position)
+            self._chunk_offset.append(offset)
+            self._chunk_length.append(len(terms))
+            self._chunk_alive.append(1)
+            self._total_length += len(terms)
+            for term, frequency in Counter(terms).items():
+                chunk_ids, frequencies = self._postings.setdefault(term, (array("I"), array("I")))
+                chunk_ids.append(chunk_id)
+                frequencies.append(frequency)
+
+    def index_documents(self, sources: list[dict], document_ids: list[str] | None = None):
+        for i, source in enumerate(sources):
+            self.index_document(source, document_ids[i] if document_ids is not None else None)
+
+    def get_source(self, document_id: str) -> dict:
+        return self._sources[self._positions[document_id]]
+
+    def keyword_chunk_scores(self, query: str) -> np.ndarray:
+        # Lucene BM25 of a match query (an OR over the query terms) for every chunk, 0 where nothing matched.
+        # Like in Lucene, replaced chunks still count towards the statistics until they are merged away.
+        scores = np.zeros(self.num_chunks, dtype=np.float32)
+        if not self.num_chunks:
+            return scores
+        lengths = _as_numpy(self._chunk_length).astype(np.float32)
+        # At least 1 so an index of only empty chunks doesn't divide by 0 (nothing matches there anyway)
+        average_length = max(self._total_length, 1) / self.num_chunks
+        length_norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+        for term in analyze(query):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            chunk_ids = _as_numpy(postings[0])
+            frequencies = _as_numpy(postings[1]).astype(np.float32)
+            idf = math.log(1 + (self.num_chunks - len(chunk_ids) + 0.5) / (len(chunk_ids) + 0.5))
+            scores[chunk_ids] += idf * frequencies / (frequencies + length_norm[chunk_ids])
+        return scores
+
+    def vector_chunk_scores(self, query_vector) -> np.ndarray:
+        # Cosine similarity mapped to the lucene cosinesimil score of (1 + cosine) / 2
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        return (1 + self._matrix[:self.num_chunks] @ query) / 2
+
+    def _alive_mask(self) -> np.ndarray:
+        return np.frombuffer(self._chunk_alive, dtype=np.uint8).astype(bool)
+
+    def _nested_max(self, chunk_ids: np.ndarray, chunk_scores: np.ndarray, size: int, inner_hits_size: int) -> list[LocalHit]:
+        # score_mode max: each document scores as its best matching chunk
+        chunk_document = _as_numpy(self._chunk_document)[chunk_ids]
+        document_scores = np.full(len(self._document_ids), -np.inf, dtype=np.float32)
+        np.maximum.at(document_scores, chunk_document, chunk_scores)
+
+        matched = np.flatnonzero(document_scores > -np.inf)
+        top = matched[np.argsort(-document_scores[matched], kind="stable")[:size]]
+
+        chunk_offset = _as_numpy(self._chunk_offset)
+        hits = []
+        for position in top:
+            in_document = chunk_document == position
+            ids, scores = chunk_ids[in_document], chunk_scores[in_document]
+            best = np.argsort(-scores, kind="stable")[:inner_hits_size]
+            hits.append(LocalHit(
+                document_id=self._document_ids[position],
+                score=float(document_scores[position]),
+                inner_hits=[(int(chunk_offset[ids[i]]), float(scores[i])) for i in best],
+            ))
+        return hits
+
+    def keyword_search(self, query: str, size: int = 10, inner_hits_size: int = 20) -> list[LocalHit]:
+        scores = self.keyword_chunk_scores(query)
+        chunk_ids = np.flatnonzero((scores > 0) & self._alive_mask())
+        return self._nested_max(chunk_ids, scores[chunk_ids], size, inner_hits_size)
+
+    def knn_search(self, query_vector, k: int = 10, size: int = 10, inner_hits_size: int = 20) -> list[LocalHit]:
+        # Exact top k chunks, then the nested max over whichever documents those chunks belong to
+        scores = self.vector_chunk_scores(query_vector)
+        alive = np.flatnonzero(self._alive_mask())
+        if len(alive) > k:
+            alive = alive[np.argpartition(-scores[alive], k - 1)[:k]]
+        return self._nested_max(alive, scores[alive], size, inner_hits_size)
+
+    def hybrid_search(
+        self,
+        query: str,
+        query_vector,
+        size: int = 10,
+        k: int | None = None,
+        weights: tuple[float, float] = DEFAULT_WEIGHTS,
+        technique: str = "min_max",
+    ) -> list[LocalHit]:
+        # Reference for the hybrid query with the normalization_step pipeline: each leg's top `size`
+        # documents are normalized on their own, then combined by weighted arithmetic mean
+        legs = [
+            self.keyword_search(query, size=size),
+            self.knn_search(query_vector, k=k or size, size=size),
+        ]
+
+        combined: dict[str, float] = {}
+        inner_hits: dict[str, list[tuple[int, float]]] = {}
+        for weight, hits in zip(weights, legs):
+            normalized = normalize_scores(np.array([hit.score for hit in hits], dtype=np.float32), technique)
+            for hit, score in zip(hits, normalized):
+                combined[hit.document_id] = combined.get(hit.document_id, 0.0) + weight * float(score)
+                inner_hits.setdefault(hit.document_id, hit.inner_hits)
+
+        total_weight = sum(weights)
+        ranked = sorted(combined.items(), key=lambda item: item[1], reverse=True)[:size]
+        return [
+            LocalHit(document_id=document_id, score=score / total_weight, inner_hits=inner_hits[document_id])
+            for document_id, score in ranked
+        ]
@@ -0,0 +1,101 @@
+import os
+import threading
+
+from opensearchpy import AsyncOpenSearch, OpenSearch
+
+from serializer import OrjsonSerializer
+
+
+# Comma separated host:port pairs, every node listed is used round robin
+OPENSEARCH_HOSTS = os.environ.get("OPENSEARCH_HOSTS", "localhost:9200")
+OPENSEARCH_USER = os.environ.get("OPENSEARCH_USER", "admin")
+OPENSEARCH_PASSWORD = os.environ.get("OPENSEARCH_PASSWORD", "D@nswer_1ndex")
+
+# Connections kept open per node, should be at least the number of threads sharing the client
+DEFAULT_POOL_MAXSIZE = 25
+DEFAULT_TIMEOUT = 30
+# Every query body carries 384 floats per vector clause and bulk bodies carry thousands of them,
+# as JSON these compress several times over so gzip is on unless asked otherwise
+DEFAULT_HTTP_COMPRESS = True
+
+
+def _parse_hosts(hosts: str) -> list[dict]:
+    parsed = []
+    for host in hosts.split(","):
+        name, _, port = host.strip().rpartition(":")
+        parsed.append({"host": name, "port": int(port)})
+    return parsed
+
+
+def client_options(
+    hosts: str = OPENSEARCH_HOSTS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    timeout: int = DEFAULT_TIMEOUT,
+    http_compress: bool = DEFAULT_HTTP_COMPRESS,
+    sniff: bool = False,
+    sniff_interval: int = 60,
+) -> dict:
+    # Shared by the sync and async factories so both talk to the cluster the same way
+    options = {
+        "hosts": _parse_hosts(hosts),
+        "http_auth": (OPENSEARCH_USER, OPENSEARCH_PASSWORD),
+        "use_ssl": True,
+        "verify_certs": False,
+        "ssl_show_warn": False,
+        "http_compress": http_compress,
+        "timeout": timeout,
+        # Idle connections stay in the pool and are reused, so the TLS handshake is paid once per connection
+        "maxsize": pool_maxsize,
+        "headers": {"Connection": "keep-alive"},
+        "retry_on_timeout": True,
+        "max_retries": 3,
+        # Encodes the float32 embeddings straight from their arrays and parses responses on the same fast path
+        "serializer": OrjsonSerializer(),
+    }
+    if sniff:
+        # Discover the rest of the cluster from the seed hosts and refresh the node list periodically
+        options.update({
+            "sniff_on_start": True,
+            "sniff_on_connection_fail": True,
+            "sniffer_timeout": sniff_interval,
+        })
+    return options
+
+
+_clients: dict[tuple, OpenSearch] = {}
+_clients_pid = os.getpid()
+_clients_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # A child must not share the parent's sockets, it builds its own clients on first use
+    global _clients, _clients_pid, _clients_lock
+    _clients = {}
+    _clients_pid = os.getpid()
+    _clients_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_opensearch_client(**kwargs) -> OpenSearch:
+    # One client per process (and per distinct set of options), the client is thread safe and
+    # reusing it is what keeps the connection pool warm. kwargs are the ones of client_options.
+    if os.getpid() != _clients_pid:
+        # Covers processes started in ways that skip the fork hook
+        _reset_after_fork()
+
+    key = tuple(sorted(kwargs.items()))
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = OpenSearch(**client_options(**kwargs))
+                _clients[key] = client
+    return client
+
+
+def get_async_opensearch_client(**kwargs) -> AsyncOpenSearch:
+    # Not cached, an async client is tied to the event loop it was first used on
+    return AsyncOpenSearch(**client_options(**kwargs))
@@ -0,0 +1,369 @@
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+
+# Search bodies are compiled once from the templates below. Building a body for a request then
+# only creates the dicts and lists on the way to a parameter, every subtree without one (the
+# decay functions, the boost script, ...) is the same object in every body. Bodies are meant to
+# be serialized and sent, not modified.
+
+
+@dataclass
+class SearchFilters:
+    # None or empty means no filter on that field
+    include_hidden: bool = False
+    last_updated_from: datetime | None = None
+    last_updated_to: datetime | None = None
+    source_types: list[str] | None = None  # Any of them
+    document_sets: list[str] | None = None  # Any of them
+    # Every key must match, when the value is a list every element must match
+    metadata: dict[str, str | list[str]] = field(default_factory=dict)
+
+    def to_clauses(self) -> list[dict]:
+        # Filter context clauses are scored as booleans and cached by the nodes per segment,
+        # keyed on the clause itself. Values are sorted and clauses always come in the same
+        # order so that equal filters give equal clauses whatever order they were given in,
+        # the same clause then hits the same cache entry.
+        clauses: list[dict] = []
+        if not self.include_hidden:
+            clauses.append({"term": {"not_hidden": True}})
+        if self.source_types:
+            clauses.append({"terms": {"source_type": sorted(set(self.source_types))}})
+        if self.document_sets:
+            clauses.append({"terms": {"document_sets": sorted(set(self.document_sets))}})
+        for key in sorted(self.metadata):
+            values = self.metadata[key]
+            for value in sorted(set([values] if isinstance(values, str) else values)):
+                clauses.append({
+                    "nested": {
+                        "path": "metadata",
+                        "query": {
+                            "bool": {
+                                "filter": [
+                                    {"term": {"metadata.key": key}},
+                                    {"term": {"metadata.value": value}}
+                                ]
+                            }
+                        }
+                    }
+                })
+        if self.last_updated_from is not None or self.last_updated_to is not None:
+            date_range = {}
+            if self.last_updated_from is not None:
+                date_range["gte"] = self.last_updated_from.isoformat()
+            if self.last_updated_to is not None:
+                date_range["lte"] = self.last_updated_to.isoformat()
+            clauses.append({"range": {"last_updated": date_range}})
+        return clauses
+
+
+class Param:
+    # Placeholder in a template, filled in per request
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+# A parameter given this value drops its key from the enclosing dict
+OMIT = object()
+
+QUERY = Param("query")
+QUERY_VECTOR = Param("query_vector")
+SIZE = Param("size")
+K = Param("k")
+FILTERS = Param("filters")
+SOURCE = Param("source")
+INNER_HITS_SOURCE = Param("inner_hits_source")
+
+# Vectors are by far the largest part of a document and nothing reads them back from search
+# results, so by default they are left out of both the hits and the inner hits. The hits also
+# leave out the chunks and the full content, the matching chunks come back as inner hits already.
+DEFAULT_SOURCE = {"excludes": ["title_vector", "chunks", "content"]}
+DEFAULT_INNER_HITS_SOURCE = {"excludes": ["chunks.embedding"]}
+
+
+def compile_template(template: Any) -> Callable[[dict[str, Any]], Any]:
+    if isinstance(template, Param):
+        name = template.name
+        return lambda params: params[name]
+    if isinstance(template, dict):
+        items = [(key, compile_template(value)) for key, value in template.items()]
+        if all(getattr(build, "static", False) for _, build in items):
+            return _static(template)
+        return lambda params: {key: value for key, build in items if (value := build(params)) is not OMIT}
+    if isinstance(template, list):
+        builds = [compile_template(value) for value in template]
+        if all(getattr(build, "static", False) for build in builds):
+            return _static(template)
+        return lambda params: [build(params) for build in builds]
+    return _static(template)
+
+
+def template_params(template: Any) -> set[str]:
+    if isinstance(template, Param):
+        return {template.name}
+    if isinstance(template, dict):
+        template = list(template.values())
+    if isinstance(template, list):
+        return set().union(*(template_params(value) for value in template))
+    return set()
+
+
+def _static(value: Any) -> Callable[[dict[str, Any]], Any]:
+    def build(params):
+        return value
+    build.static = True
+    return build
+
+
+# https://opensearch.org/docs/latest/search-plugins/search-pipelines/normalization-processor/#search-tuning-recommendations
+COMPLETE_TEMPLATE = {
+    "size": SIZE,  # Number of results to return
+    "_source": SOURCE,
+    "query": {
+        "bool": {
+            "must": [
+                {
+                    "function_score": {
+                        "query": {
+                            "function_score": {
+                                "query": {
+                                    "nested": {
+                                        "path": "chunks",
+                                        "query": {
+                                            # Apply the Normalization pipeline step for each result within the queries of hybrid
+                                            "hybrid": {
+                                                "queries": [
+                                                    # Keyword score that includes both the overall document title and the chunk content
+                                                    {
+                                                        # This may still be filtering out all the docs, need to verify
+                                                        "multi_match": {
+                                                            "query": QUERY,
+                                                            "type": "most_fields",
+                                                            "fields": [
+                                                                "title^1.2",  # Means it"s boosted
+                                                                "chunks.content"
+                                                            ],
+                                                            "_name": "combined_keyword_score",
+                                                        },
+                                                    },
+                                                    # Title Vector Score
+                                                    {
+                                                        "knn": {
+                                                            "title_vector": {
+                                                                "vector": QUERY_VECTOR,
+                                                                "k": K,  # Similar to the size but it"s per shard (in this case we only have one)
+                                                                "_name": "title_vector_score"
+                                                            },
+                                                        },
+                                                    },
+                                                    # Chunk Vector Score
+                                                    {
+                                                        "knn": {
+                                                            "chunks.embedding": {
+                                                                "vector": QUERY_VECTOR,
+                                                                "k": K,
+                                                                "_name": "chunk_vector_score"
+                                                            },
+                                                        },
+                                                    },
+                                                ],
+                                            },
+                                        },
+                                        "inner_hits": {
+                                            "size": 20,
+                                            "_source": INNER_HITS_SOURCE,
+                                        },
+                                    },
+                                },
+                                "functions": [
+                                    {
+                                        "filter": {"exists": {"field": "last_updated"}},
+                                        "gauss": {
+                                            "last_updated": {
+                                                "origin": "now",
+                                                # Reaches 0.5 score at 1 year (but this is 0.5 of the 0.25)
+                                                # Slower decay over time eventually
+                                                "scale": "365d",
+                                                "decay": 0.5  # This could be set at query time to affect the rate of decay
+                                            }
+                                        },
+                                        "weight": 0.25
+                                    },
+                                    {
+                                        # If no date, then give a ~1/4th penalty (like 1 quarter old)
+                                        # Note that if we modify the decay rate, this may not be approximate to 1 quarter anymore
+                                        "filter": {"bool": {"must_not": {"exists": {"field": "last_updated"}}}},
+                                        "weight": 0.18
+                                    },
+                                    # Always add a 0.75 capping the decay
+                                    {
+                                        "weight": 0.75
+                                    }
+                                ],
+                                "score_mode": "sum",
+                                "boost_mode": "multiply"
+                            },
+                        },
+                        # 0.5 to 2x score: piecewise sigmoid function stretched out by factor of 3
+                        # meaning requires 3x the number of feedback votes to have default sigmoid effect
+                        "script_score": {
+                            "script": {
+                                "source": """
+                                double boost_count = doc["boost_count"].value;
+                                if (boost_count < 0) {
+                                    return 0.5 + (1 / (1 + Math.exp(-boost_count / 3)));
+                                } else {
+                                    return 2 / (1 + Math.exp(-boost_count / 3));
+                                }
+                                """,
+                                "lang": "painless"
+                            }
+                        },
+                        "boost_mode": "multiply"
+                    },
+                },
+            ],
+            # Omitted when there are no filters
+            "filter": FILTERS,
+        },
+    },
+}
+
+
+# Gets one chunk per doc for some reason
+# Normalization is not applied as expected, not sure if applied at all (it's not applied across the same chunks of the doc either), no clue what is going on
+# Can get inner hits but it's just one chunk per hit as well
+HYBRID_INSIDE_TEMPLATE = {
+    "size": SIZE,  # Number of results to return
+    "_source": SOURCE,
+    "query": {
+        "nested": {
+            "path": "chunks",
+            "query": {
+                "hybrid": {
+                    "queries": [
+                        # Chunk Vector Score, the keyword and title vector sub-queries are left out
+                        {
+                            "knn": {
+                                "chunks.embedding": {
+                                    "vector": QUERY_VECTOR,
+                                    "k": K,
+                                    "_name": "chunk_vector_score"
+                                },
+                            },
+                        },
+                    ],
+                },
+            },
+            "score_mode": "max",
+            "inner_hits": {
+                "size": 20,
+                "_source": INNER_HITS_SOURCE,
+            },
+        },
+    },
+}
+
+
+# The sections seem to be getting the normalization applied correctly
+# However with just the chunk vectors, the calculations aren't correct
+# Checked:
+# - if the normalization for the chunks is done by taking into all chunks irrespective of the doc
+# - if the normalization for the chunks is done by taking the max chunk score of each document
+# Unverified: whether the scores are correct for the chunk or mixing the max scores of each query (meaning mixing chunks)
+HYBRID_OUTSIDE_TEMPLATE = {
+    "size": SIZE,  # Number of results to return
+    "_source": SOURCE,
+    "query": {
+        "hybrid": {
+            "queries": [
+                # Chunk Vector Score, the keyword and title vector sub-queries are left out
+                # This way of nesting apparently doesn't give back the inner hits
+                # Gives back documents that are normalized
+                {
+                    "nested": {
+                        "path": "chunks",
+                        "query": {
+                            "knn": {
+                                "chunks.embedding": {
+                                    "vector": QUERY_VECTOR,
+                                    "k": K,
+                                    "_name": "chunk_vector_score"
+                                },
+                            },
+                        },
+                        "score_mode": "max",
+                        "inner_hits": {
+                            "size": 20,
+                            "_source": INNER_HITS_SOURCE,
+                        }
+                    },
+                },
+            ],
+        },
+    },
+}
+
+CONTENT_ONLY_TEMPLATE = {
+    "size": SIZE,  # Number of results to return
+    "_source": SOURCE,
+    "query": {
+        "nested": {
+            "path": "chunks",
+            "query": {
+                "match": {
+                    "chunks.content": QUERY,
+                }
+            },
+        },
+    }
+}
+
+ALL_TEMPLATE = {
+    "size": SIZE,  # Number of results to return
+    "_source": SOURCE,
+    "query": {
+        "match_all": {}
+    }
+}
+
+# Only "complete" applies filters, the hybrid query has to be the top level query so the others can't wrap it in a bool
+_TEMPLATES = {
+    "complete": COMPLETE_TEMPLATE,
+    "hybrid_inside": HYBRID_INSIDE_TEMPLATE,
+    "hybrid_outside": HYBRID_OUTSIDE_TEMPLATE,
+    "content_only": CONTENT_ONLY_TEMPLATE,
+    "all": ALL_TEMPLATE,
+}
+_COMPILED = {variant: compile_template(template) for variant, template in _TEMPLATES.items()}
+_FILTERED_VARIANTS = {variant for variant, template in _TEMPLATES.items() if FILTERS.name in template_params(template)}
+
+SEARCH_BODY_VARIANTS = tuple(_TEMPLATES)
+
+
+def build_search_body(
+    variant: str,
+    query: str,
+    query_vector,
+    max_num_results: int = 10,
+    filters: SearchFilters | None = None,
+    source: dict | bool | None = DEFAULT_SOURCE,
+    inner_hits_source: dict | bool | None = DEFAULT_INNER_HITS_SOURCE,
+) -> dict:
+    # source and inner_hits_source are _source filters (includes/excludes or False), None returns
+    # the full _source, vectors included
+    # TODO ADD ACL
+    clauses = filters.to_clauses() if filters is not None and variant in _FILTERED_VARIANTS else []
+    return _COMPILED[variant]({
+        "query": query,
+        "query_vector": query_vector,
+        "size": max_num_results,
+        "k": max_num_results,
+        "filters": clauses or OMIT,
+        "source": OMIT if source is None else source,
+        "inner_hits_source": OMIT if inner_hits_source is None else inner_hits_source,
+    })
@@ -0,0 +1,129 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils import MODEL_ID, TextType, batch_vectorize
+
+
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 10_000))
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get("QUERY_CACHE_TTL_SECONDS", 3600))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    # e5-small-v2 uses an uncased tokenizer, so case and runs of whitespace never change the vector
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+class QueryVectorCache:
+    # Query vectors by (model, normalized query), bounded by entry count (LRU) and by age (TTL).
+    # Concurrent misses on the same query wait on the one encode already running for it rather
+    # than each running their own.
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_SIZE,
+        ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+        model_name: str = MODEL_ID,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.model_name = model_name
+        self._entries: OrderedDict[tuple[str, str], tuple[float, np.ndarray]] = OrderedDict()
+        self._inflight: dict[tuple[str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.encode_seconds = 0.0
+        self.lookup_seconds = 0.0
+        self.lookups = 0
+
+    def _encode(self, normalized_query: str) -> np.ndarray:
+        # Skips the content addressed embedding cache, query vectors have no business on its disk tier
+        return batch_vectorize([(normalized_query, TextType.QUERY)], use_cache=False)[0]
+
+    def get(self, query: str) -> np.ndarray:
+        start = time.perf_counter()
+        normalized = normalize_query(query)
+        key = (self.model_name, normalized)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.lookups += 1
+                self.lookup_seconds += time.perf_counter() - start
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.expired += 1
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            vector = future.result()
+        else:
+            try:
+                encode_start = time.perf_counter()
+                vector = self._encode(normalized)
+                encode_seconds = time.perf_counter() - encode_start
+            except BaseException as e:
+                with self._lock:
+                    del self._inflight[key]
+                future.set_exception(e)
+                raise
+
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                del self._inflight[key]
+                self.encode_seconds += encode_seconds
+            future.set_result(vector)
+
+        with self._lock:
+            self.lookups += 1
+            self.lookup_seconds += time.perf_counter() - start
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "expired": self.expired,
+                "hit_rate": (self.hits + self.coalesced) / self.lookups if self.lookups else 0.0,
+                "entries": len(self._entries),
+                "mean_encode_ms": 1000 * self.encode_seconds / self.misses if self.misses else 0.0,
+                "mean_lookup_ms": 1000 * self.lookup_seconds / self.lookups if self.lookups else 0.0,
+            }
+
+
+query_vector_cache = QueryVectorCache()
+
+
+def embed_query(query: str) -> np.ndarray:
+    return query_vector_cache.get(query)
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import orjson
+
+
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 1000))
+# Writes only show up in searches after the next refresh, 1s by default. Results fetched within this
+# long of a write may not include it yet so they are not cached.
+REFRESH_INTERVAL_SECONDS = float(os.environ.get("SEARCH_CACHE_REFRESH_INTERVAL_SECONDS", 1.0))
+
+
+def search_cache_key(**parts: Any) -> str:
+    # Canonical hash of everything that shapes a search: the same parts hash the same whatever
+    # the order of dict keys (filters included)
+    return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)).hexdigest()
+
+
+class SearchResultCache:
+    # LRU of search responses. Every index has a write generation that writes bump, an entry is
+    # only served while its index is still at the generation the search was sent at. Callers
+    # can opt into getting an entry from an older generation as long as it is at most
+    # max_staleness_seconds old, for dashboards that care more about QPS than freshness.
+    #
+    # Responses are shared between callers and must not be modified.
+    #
+    # Both the entries and the write generations live in this process only. Writes made by any other
+    # process (another worker, another service, a script run against the same cluster) never bump
+    # them, so entries here can be served after such a write until they are evicted or cleared.
+    # Embedding pool workers (EMBEDDING_WORKERS) only compute vectors and never write, so they don't
+    # cause this. Processes that share an index with outside writers should use use_cache=False or
+    # a short-lived cache.
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, refresh_interval_seconds: float = REFRESH_INTERVAL_SECONDS):
+        self.max_entries = max_entries
+        self.refresh_interval_seconds = refresh_interval_seconds
+        # key -> (index name, write generation, time stored, response)
+        self._entries: OrderedDict[str, tuple[str, int, float, dict]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._last_write: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def write_generation(self, index_name: str) -> int:
+        with self._lock:
+            return self._generations.get(index_name, 0)
+
+    def bump_write_generation(self, index_name: str):
+        with self._lock:
+            self._generations[index_name] = self._generations.get(index_name, 0) + 1
+            self._last_write[index_name] = time.monotonic()
+
+    def get(self, key: str, index_name: str, max_staleness_seconds: float = 0.0) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            _, generation, stored_at, response = entry
+            if generation == self._generations.get(index_name, 0):
+                self.hits += 1
+            elif max_staleness_seconds > 0 and time.monotonic() - stored_at <= max_staleness_seconds:
+                self.stale_hits += 1
+            else:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return response
+
+    def put(self, key: str, index_name: str, generation: int, response: dict):
+        # generation has to be read before the search is sent, a write racing the search then
+        # leaves the entry already outdated instead of cached as current
+        with self._lock:
+            if generation != self._generations.get(index_name, 0):
+                return
+            if time.monotonic() - self._last_write.get(index_name, -float("inf")) < self.refresh_interval_seconds:
+                return
+            self._entries[key] = (index_name, generation, time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_search(
+        self,
+        key: str,
+        index_name: str,
+        search: Callable[[], dict],
+        max_staleness_seconds: float = 0.0,
+    ) -> dict:
+        response = self.get(key, index_name, max_staleness_seconds)
+        if response is not None:
+            return response
+        generation = self.write_generation(index_name)
+        response = search()
+        self.put(key, index_name, generation, response)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+search_result_cache = SearchResultCache()
+
+
+def bump_write_generation(index_name: str):
+    search_result_cache.bump_write_generation(index_name)
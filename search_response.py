@@ -0,0 +1,98 @@
+from collections.abc import Iterator
+
+
+# Compact views over a raw search response. Nothing is copied out of the response up front, a
+# hit becomes a DocumentResult when iteration reaches it and its inner hits become ChunkResults
+# the first time its chunks are read, so callers that stop after a few hits never pay for the rest.
+
+
+def _named_scores(hit: dict) -> dict[str, float | None]:
+    # With include_named_queries_score matched_queries maps each named query to its score,
+    # without it it is only the list of names that matched
+    matched = hit.get("matched_queries")
+    if matched is None:
+        return {}
+    if isinstance(matched, dict):
+        return matched
+    return dict.fromkeys(matched)
+
+
+class ChunkResult:
+    __slots__ = ("document_id", "chunk_index", "content", "score", "named_scores")
+
+    def __init__(self, document_id: str, chunk_index: int | None, content: str | None, score: float | None, named_scores: dict[str, float | None]):
+        self.document_id = document_id
+        self.chunk_index = chunk_index
+        self.content = content
+        self.score = score
+        # Per leg scores by query _name, chunk_vector_score for instance
+        self.named_scores = named_scores
+
+    @classmethod
+    def from_inner_hit(cls, document_id: str, inner_hit: dict) -> "ChunkResult":
+        source = inner_hit.get("_source", {})
+        chunk_index = source.get("chunk_index")
+        if chunk_index is None and "_nested" in inner_hit:
+            chunk_index = inner_hit["_nested"]["offset"]
+        return cls(document_id, chunk_index, source.get("content"), inner_hit.get("_score"), _named_scores(inner_hit))
+
+    def __repr__(self) -> str:
+        content = self.content if self.content is None or len(self.content) <= 60 else self.content[:57] + "..."
+        return f"ChunkResult({self.document_id!r}, chunk {self.chunk_index}, score={self.score}, {self.named_scores}, {content!r})"
+
+
+class DocumentResult:
+    __slots__ = ("document_id", "score", "named_scores", "_hit", "_chunks")
+
+    def __init__(self, hit: dict):
+        self.document_id = hit["_id"]
+        self.score = hit.get("_score")
+        self.named_scores = _named_scores(hit)
+        self._hit = hit
+        self._chunks: list[ChunkResult] | None = None
+
+    @property
+    def title(self) -> str | None:
+        return self._hit.get("_source", {}).get("title")
+
+    @property
+    def source(self) -> dict:
+        # Whatever _source the search asked for, without vectors by default
+        return self._hit.get("_source", {})
+
+    @property
+    def chunks(self) -> list[ChunkResult]:
+        if self._chunks is None:
+            inner_hits = self._hit.get("inner_hits", {}).get("chunks", {}).get("hits", {}).get("hits", [])
+            self._chunks = [ChunkResult.from_inner_hit(self.document_id, inner_hit) for inner_hit in inner_hits]
+        return self._chunks
+
+    def __repr__(self) -> str:
+        return f"DocumentResult({self.document_id!r}, score={self.score}, {self.named_scores}, title={self.title!r})"
+
+
+class SearchResults:
+    __slots__ = ("_response",)
+
+    def __init__(self, response: dict):
+        # The response can be shared with the result cache, it is only ever read here
+        self._response = response
+
+    @property
+    def took_ms(self) -> int | None:
+        return self._response.get("took")
+
+    @property
+    def total(self) -> int | None:
+        return self._response["hits"].get("total", {}).get("value")
+
+    def __len__(self) -> int:
+        return len(self._response["hits"]["hits"])
+
+    def __iter__(self) -> Iterator[DocumentResult]:
+        for hit in self._response["hits"]["hits"]:
+            yield DocumentResult(hit)
+
+    def chunks(self) -> Iterator[ChunkResult]:
+        for document in self:
+            yield from document.chunks
@@ -0,0 +1,30 @@
+from typing import Any
+
+import orjson
+from opensearchpy.exceptions import SerializationError
+from opensearchpy.serializer import JSONSerializer
+
+
+class OrjsonSerializer(JSONSerializer):
+    # Drop-in for the client's JSONSerializer. numpy arrays and scalars, datetimes (last_updated)
+    # and dataclasses are encoded natively by orjson instead of being walked value by value in
+    # Python, anything orjson doesn't know falls back to JSONSerializer.default.
+    # Responses are parsed with orjson as well since the client uses the same serializer for both.
+    OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def loads(self, s: str | bytes) -> Any:
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data: Any) -> str:
+        # Strings are already serialized, like in JSONSerializer
+        if isinstance(data, str):
+            return data
+
+        try:
+            # The client joins bulk lines as text so this has to be a str rather than orjson's bytes
+            return orjson.dumps(data, default=self.default, option=self.OPTIONS).decode("utf-8")
+        except (orjson.JSONEncodeError, TypeError) as e:
+            raise SerializationError(data, e)
@@ -0,0 +1,104 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from utils import EMBEDDING_DIM, TextType, batch_vectorize
+
+
+# Rows of the corpus scored per step of the blocked top k, 65536 x 384 float32 is 96 MiB
+DEFAULT_BLOCK_SIZE = 65536
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def embed_unique(texts: Sequence[str], text_type: TextType = TextType.PASSAGE) -> np.ndarray:
+    # Normalized float32 matrix with one row per text, each distinct text goes through the model
+    # (or the embedding cache) once no matter how often it repeats
+    positions: dict[str, int] = {}
+    for text in texts:
+        positions.setdefault(text, len(positions))
+    if not positions:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    unique_vectors = normalize_rows(np.stack(batch_vectorize([(text, text_type) for text in positions])))
+    return unique_vectors[[positions[text] for text in texts]]
+
+
+def similarity_matrix(a: np.ndarray, b: np.ndarray, normalized: bool = False) -> np.ndarray:
+    # Cosine similarity of every row of a with every row of b
+    if not normalized:
+        a, b = normalize_rows(a), normalize_rows(b)
+    return a @ b.T
+
+
+def text_similarity_matrix(texts_a: Sequence[str], texts_b: Sequence[str], text_type: TextType = TextType.PASSAGE) -> np.ndarray:
+    vectors = embed_unique([*texts_a, *texts_b], text_type)
+    return vectors[:len(texts_a)] @ vectors[len(texts_a):].T
+
+
+def query_chunk_similarities(query: str, chunk_texts: Sequence[str]) -> np.ndarray:
+    # For offline relevance checks, the query gets the query prefix and the chunks the passage one
+    query_vector = normalize_rows(batch_vectorize([(query, TextType.QUERY)])[0])
+    return embed_unique(chunk_texts) @ query_vector
+
+
+def top_k_similar(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    k: int,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    normalized: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Exact top k corpus rows per query by cosine, as (indices, scores) sorted best first.
+    # The corpus is read one block at a time so it can be a np.memmap larger than memory,
+    # only the running top k per query is kept between blocks.
+    queries = np.atleast_2d(queries if normalized else normalize_rows(queries))
+    k = min(k, len(corpus))
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_indices = np.zeros((len(queries), 0), dtype=np.int64)
+
+    for start in range(0, len(corpus), block_size):
+        block = np.asarray(corpus[start:start + block_size], dtype=np.float32)
+        if not normalized:
+            block = normalize_rows(block)
+        scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+        indices = np.concatenate(
+            [best_indices, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))],
+            axis=1,
+        )
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            indices = np.take_along_axis(indices, keep, axis=1)
+        best_scores, best_indices = scores, indices
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def find_near_duplicates(
+    texts: Sequence[str],
+    threshold: float = 0.95,
+    block_size: int = 4096,
+) -> list[tuple[int, int, float]]:
+    # Pairs (i, j, similarity) with i < j whose chunks are at least `threshold` similar, meant to
+    # run before indexing. Identical texts always pair up with a similarity of 1.
+    vectors = embed_unique(texts)
+    pairs = []
+    # Scored one block_size x block_size tile at a time, so memory stays flat however many chunks
+    # there are. Only columns after each row are needed, so tiles left of the diagonal are skipped.
+    for row_start in range(0, len(vectors), block_size):
+        row_block = vectors[row_start:row_start + block_size]
+        for column_start in range(row_start, len(vectors), block_size):
+            scores = row_block @ vectors[column_start:column_start + block_size].T
+            rows, columns = np.nonzero(scores >= threshold)
+            after_row = column_start + columns > row_start + rows
+            pairs.extend(
+                (row_start + int(row), column_start + int(column), float(scores[row, column]))
+                for row, column in zip(rows[after_row], columns[after_row])
+            )
+    pairs.sort()
+    return pairs
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import re
+import sys
+
+# Before utils is imported anywhere: keep the embedding cache in memory, never on disk
+os.environ["EMBEDDING_CACHE_DIR"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+import utils
+from embedding_cache import EmbeddingCache
+
+
+class FakeTokenizer:
+    # One token per run of non-whitespace, with the offsets a fast tokenizer returns, and
+    # [CLS] + [SEP] as special tokens
+    def num_special_tokens_to_add(self) -> int:
+        return 2
+
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False, truncation=False, max_length=None, **kwargs):
+        single = isinstance(texts, str)
+        offsets = [[match.span() for match in re.finditer(r"\S+", text)] for text in ([texts] if single else texts)]
+        if add_special_tokens:
+            offsets = [[(0, 0), *text_offsets, (0, 0)] for text_offsets in offsets]
+        if truncation and max_length is not None:
+            offsets = [text_offsets[:max_length] for text_offsets in offsets]
+        output = {"input_ids": [list(range(len(text_offsets))) for text_offsets in offsets]}
+        if return_offsets_mapping:
+            output["offset_mapping"] = offsets
+        return {key: value[0] for key, value in output.items()} if single else output
+
+
+def fake_vector(text: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(utils.EMBEDDING_DIM).astype(np.float32)
+
+
+class FakeModel:
+    # Stands in for the SentenceTransformer: deterministic vectors per text, every encode call recorded
+    max_seq_length = utils.MAX_SEQ_LENGTH
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.encoded: list[list[str]] = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        self.encoded.append(list(texts))
+        return np.stack([fake_vector(text) for text in texts])
+
+
+@pytest.fixture
+def fake_model(monkeypatch) -> FakeModel:
+    model = FakeModel()
+    monkeypatch.setattr(utils, "_model", model)
+    monkeypatch.setattr(utils, "_embedding_pool", None)
+    monkeypatch.setattr(utils, "_embedding_pool_disabled", False)
+    monkeypatch.setattr(utils, "embedding_cache", EmbeddingCache(max_entries=1000, dim=utils.EMBEDDING_DIM))
+    return model
+
+
+@pytest.fixture
+def fake_tokenizer() -> FakeTokenizer:
+    return FakeTokenizer()
@@ -0,0 +1,153 @@
+from collections.abc import Sequence
+from datetime import datetime
+
+import numpy as np
+import orjson
+from opensearchpy.exceptions import ConflictError
+
+from examples import DanswerDocument, DocumentChunk
+from serializer import OrjsonSerializer
+
+
+def make_document(
+    document_id: str = "doc",
+    chunk_texts: Sequence[str] = (),
+    title: str = "Title",
+    content: str = "NA",
+    chunk_embeddings: Sequence[np.ndarray | None] | None = None,
+    title_embedding: np.ndarray | None = None,
+    chunks: list[DocumentChunk] | None = None,
+    metadata: dict | None = None,
+    document_sets: list[str] | None = None,
+) -> DanswerDocument:
+    # A document with one chunk per text, carrying chunk_embeddings where given, unless `chunks` is passed
+    if chunks is None:
+        embeddings = chunk_embeddings or [None] * len(chunk_texts)
+        chunks = [
+            DocumentChunk(link=None, max_num_tokens=512, num_tokens=len(text.split()), chunk_index=i, content=text, embedding=embedding)
+            for i, (text, embedding) in enumerate(zip(chunk_texts, embeddings))
+        ]
+    return DanswerDocument(
+        document_id=document_id,
+        semantic_id=document_id,
+        title=title,
+        title_embedding=title_embedding,
+        content=content,
+        chunks=chunks,
+        source_type="web",
+        document_sets=["set1"] if document_sets is None else document_sets,
+        metadata={"space": "IT"} if metadata is None else metadata,
+        boost_count=0,
+        last_updated=datetime(2023, 11, 15),
+        hidden=False,
+    )
+
+
+class FakeClock:
+    # Stands in for time.monotonic, moved by setting `now`
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeSearchClient:
+    # Records the keyword arguments of each search and answers with the next of `responses`,
+    # the last one again once they run out
+    def __init__(self, *responses: dict):
+        self.responses = list(responses) or [{"hits": {"hits": []}}]
+        self.requests: list[dict] = []
+
+    def search(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.responses[min(len(self.requests), len(self.responses)) - 1]
+
+
+class FakeAsyncSearchClient(FakeSearchClient):
+    async def search(self, **kwargs):
+        return FakeSearchClient.search(self, **kwargs)
+
+
+class FakeTransport:
+    def __init__(self):
+        self.serializer = OrjsonSerializer()
+
+
+class FakeBulkClient:
+    # Answers _bulk requests item by item: documents whose _id is in `reject_once` get a 429 the
+    # first time they are sent, those in `fail` a 400, everything else is indexed
+    def __init__(self, reject_once=(), fail=()):
+        self.transport = FakeTransport()
+        self.reject_once = set(reject_once)
+        self.fail = set(fail)
+        self.requests: list[list[dict]] = []
+        self.indexed: dict[str, dict] = {}
+
+    def _items(self, body: str) -> list[dict]:
+        lines = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        actions = list(zip(lines[::2], lines[1::2]))
+        self.requests.append([source for _, source in actions])
+        items = []
+        for header, source in actions:
+            (op, meta), = header.items()
+            document_id = meta.get("_id")
+            if document_id in self.reject_once:
+                self.reject_once.discard(document_id)
+                items.append({op: {"_id": document_id, "status": 429, "error": {"type": "es_rejected_execution_exception"}}})
+            elif document_id in self.fail:
+                items.append({op: {"_id": document_id, "status": 400, "error": {"type": "mapper_parsing_exception"}}})
+            else:
+                self.indexed[document_id] = source
+                items.append({op: {"_id": document_id, "status": 201}})
+        return items
+
+    def bulk(self, body, *args, **kwargs):
+        items = self._items(body)
+        return {"errors": any(next(iter(item.values()))["status"] >= 300 for item in items), "items": items}
+
+
+class FakeAsyncBulkClient(FakeBulkClient):
+    async def bulk(self, body, *args, **kwargs):
+        return FakeBulkClient.bulk(self, body, *args, **kwargs)
+
+
+class FakeDocumentClient:
+    # Single document get/index/update with _seq_no versioning: writes carrying if_seq_no or
+    # op_type="create" fail with a 409 like the real APIs when the stored document has moved on.
+    # Documents are stored as their JSON round trip, the way _source comes back.
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.documents: dict[str, tuple[dict, int]] = {}
+        self.writes: list[tuple[str, str, dict]] = []
+        self._next_seq_no = 0
+
+    def _store(self, document_id: str, source: dict):
+        self.documents[document_id] = (source, self._next_seq_no)
+        self._next_seq_no += 1
+
+    def _check_version(self, document_id: str, if_seq_no=None, op_type=None):
+        stored = self.documents.get(document_id)
+        if op_type == "create" and stored is not None:
+            raise ConflictError(409, "version_conflict_engine_exception", {})
+        if if_seq_no is not None and (stored is None or stored[1] != if_seq_no):
+            raise ConflictError(409, "version_conflict_engine_exception", {})
+
+    def get(self, index, id, ignore=()):
+        if id not in self.documents:
+            return {"_id": id, "found": False}
+        source, seq_no = self.documents[id]
+        return {"_id": id, "found": True, "_source": source, "_seq_no": seq_no, "_primary_term": 1}
+
+    def index(self, index, id, body, op_type=None, if_seq_no=None, if_primary_term=None):
+        self._check_version(id, if_seq_no, op_type)
+        self.writes.append(("index", id, body))
+        self._store(id, self.transport.serializer.loads(self.transport.serializer.dumps(body)))
+        return {"result": "created"}
+
+    def update(self, index, id, body, if_seq_no=None, if_primary_term=None):
+        self._check_version(id, if_seq_no)
+        self.writes.append(("update", id, body))
+        partial = self.transport.serializer.loads(self.transport.serializer.dumps(body["doc"]))
+        self._store(id, {**self.documents[id][0], **partial})
+        return {"result": "updated"}
@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import async_search
+import full_example
+from fakes import FakeAsyncBulkClient, FakeAsyncSearchClient, FakeSearchClient
+from serializer import OrjsonSerializer
+
+
+QUERY_VECTOR = np.ones(384, dtype=np.float32)
+
+
+@pytest.mark.parametrize("variant", ["complete", "hybrid_outside"])
+def test_async_search_sends_the_same_request_as_sync(monkeypatch, variant):
+    monkeypatch.setattr(full_example, "embed_query", lambda query: QUERY_VECTOR)
+    monkeypatch.setattr(async_search, "embed_query", lambda query: QUERY_VECTOR)
+    sync_client, async_client = FakeSearchClient(), FakeAsyncSearchClient()
+
+    full_example.hybrid_search(sync_client, "index", "florida", variant=variant, use_cache=False)
+    asyncio.run(async_search.async_hybrid_search(async_client, "index", "florida", variant=variant))
+
+    sync_request, async_request = sync_client.requests[0], async_client.requests[0]
+    assert sync_request.keys() == async_request.keys()
+    assert sync_request["search_pipeline"] == async_request["search_pipeline"]
+    serializer = OrjsonSerializer()
+    assert serializer.dumps(sync_request["body"]) == serializer.dumps(async_request["body"])
+
+
+def test_async_search_applies_the_default_filters(monkeypatch):
+    monkeypatch.setattr(async_search, "embed_query", lambda query: QUERY_VECTOR)
+    client = FakeAsyncSearchClient()
+    asyncio.run(async_search.async_hybrid_search(client, "index", "florida", variant="complete"))
+
+    filters = client.requests[0]["body"]["query"]["bool"]["filter"]
+    assert {"term": {"not_hidden": True}} in filters
+
+
+def _generate_actions(index_name, documents, build_bodies, embed_batch_size):
+    return ({"_index": index_name, "_id": f"d{i}", "_source": {"n": i}} for i in documents)
+
+
+def test_async_bulk_retries_rejections_and_records_failures():
+    client = FakeAsyncBulkClient(reject_once={"d3"}, fail={"d5"})
+    result = asyncio.run(async_search.async_bulk_index_documents(
+        client, "index", range(10), None,
+        embed_batch_size=3, chunk_size=2, concurrency=2, initial_backoff=0, generate_actions=_generate_actions,
+    ))
+
+    assert result.indexed == 9
+    assert sorted(client.indexed) == sorted(f"d{i}" for i in range(10) if i != 5)
+    assert [(failure.document_id, failure.status) for failure in result.failures] == [("d5", 400)]
+
+
+def test_async_bulk_fails_instead_of_hanging_when_a_sender_raises():
+    class _BrokenSerializer:
+        def dumps(self, data):
+            raise ValueError("cannot serialize")
+
+    client = FakeAsyncBulkClient()
+    client.transport.serializer = _BrokenSerializer()
+
+    async def _load():
+        # A full queue (queue_size=1) used to leave the producer blocked forever
+        await asyncio.wait_for(async_search.async_bulk_index_documents(
+            client, "index", range(1000), None,
+            embed_batch_size=1, queue_size=1, concurrency=2, generate_actions=_generate_actions,
+        ), timeout=10)
+
+    with pytest.raises(ValueError, match="cannot serialize"):
+        asyncio.run(_load())
@@ -0,0 +1,89 @@
+import numpy as np
+from opensearchpy import TransportError
+
+import batch_search
+from batch_search import batch_hybrid_search
+from utils import EMBEDDING_DIM
+
+
+class _MsearchClient:
+    # Fails the whole request when it contains "down", single searches for queries containing "bad"
+    def __init__(self):
+        self.requests = []
+
+    def msearch(self, index, body, params=None):
+        self.requests.append((body, params))
+        queries = [search["query"] for search in body[1::2]]
+        if any("down" in query for query in queries):
+            raise TransportError(503, "unavailable", {})
+        return {"responses": [
+            {"error": {"type": "query_shard_exception"}} if "bad" in query else {"hits": {"hits": [{"_id": query}]}}
+            for query in queries
+        ]}
+
+
+class _RecordingClient:
+    def __init__(self):
+        self.bodies = []
+
+    def msearch(self, index, body, params=None):
+        self.bodies.append(body)
+        return {"responses": [{"hits": {"hits": []}} for _ in body[1::2]]}
+
+
+def _build_body(query, query_vector, max_num_results, filters):
+    return {"query": query, "size": max_num_results}
+
+
+def _fake_vectors(monkeypatch):
+    embedded = []
+
+    def batch_vectorize(items):
+        embedded.append(len(items))
+        return [np.zeros(EMBEDDING_DIM, dtype=np.float32) for _ in items]
+
+    monkeypatch.setattr(batch_search, "batch_vectorize", batch_vectorize)
+    return embedded
+
+
+def test_results_keep_query_order_across_msearch_chunks(monkeypatch):
+    embedded = _fake_vectors(monkeypatch)
+    client = _MsearchClient()
+    queries = [f"q{i}" for i in range(5)]
+
+    results = batch_hybrid_search(client, "index", queries, msearch_chunk_size=2, build_body=_build_body)
+
+    assert embedded == [5]
+    assert [len(body) // 2 for body, _ in client.requests] == [2, 2, 1]
+    assert [result.query for result in results] == queries
+    assert [result.response["hits"]["hits"][0]["_id"] for result in results] == queries
+    assert client.requests[0][1] == {"search_pipeline": "normalization_step"}
+
+
+def test_failures_are_recorded_per_query(monkeypatch):
+    _fake_vectors(monkeypatch)
+    queries = ["ok", "bad", "down", "after"]
+
+    results = batch_hybrid_search(_MsearchClient(), "index", queries, msearch_chunk_size=2, build_body=_build_body)
+
+    assert [result.error is None for result in results] == [True, False, False, False]
+    assert isinstance(results[2].error, TransportError) and isinstance(results[3].error, TransportError)
+
+
+def test_default_body_applies_the_default_filters(monkeypatch):
+    _fake_vectors(monkeypatch)
+    monkeypatch.setattr(batch_search, "SEARCH_BODY_VARIANT", "complete")
+    client = _RecordingClient()
+
+    batch_hybrid_search(client, "index", ["florida"])
+
+    assert {"term": {"not_hidden": True}} in client.bodies[0][1]["query"]["bool"]["filter"]
+
+
+def test_named_query_scores_are_requested_like_hybrid_search(monkeypatch):
+    _fake_vectors(monkeypatch)
+    client = _RecordingClient()
+
+    batch_hybrid_search(client, "index", ["a", "b"])
+
+    assert all(search["include_named_queries_score"] is True for search in client.bodies[0][1::2])
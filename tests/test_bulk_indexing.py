@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bulk_indexing import bulk_index_documents, generate_index_actions
+from fakes import FakeBulkClient
+
+
+def _documents(count: int):
+    return [SimpleNamespace(document_id=f"d{i}", text=f"text {i}") for i in range(count)]
+
+
+def _build_bodies(documents):
+    return [{"text": document.text} for document in documents]
+
+
+def test_actions_are_indexed_under_the_document_id():
+    actions = list(generate_index_actions("index", _documents(3), _build_bodies, embed_batch_size=2))
+    assert [action["_id"] for action in actions] == ["d0", "d1", "d2"]
+    assert actions[0] == {"_index": "index", "_source": {"text": "text 0"}, "_id": "d0"}
+
+
+def test_bodies_are_built_one_embed_batch_at_a_time():
+    batches = []
+
+    def build_bodies(documents):
+        batches.append(len(documents))
+        return _build_bodies(documents)
+
+    list(generate_index_actions("index", iter(_documents(5)), build_bodies, embed_batch_size=2))
+    assert batches == [2, 2, 1]
+
+
+@pytest.mark.parametrize("thread_count", [1, 3])
+def test_bulk_retries_rejections_and_records_failures(thread_count):
+    client = FakeBulkClient(reject_once={"d1", "d4"}, fail={"d2"})
+    result = bulk_index_documents(
+        client, "index", _documents(6), _build_bodies,
+        chunk_size=2, initial_backoff=0, thread_count=thread_count,
+    )
+
+    assert result.indexed == 5
+    assert sorted(client.indexed) == ["d0", "d1", "d3", "d4", "d5"]
+    assert [(failure.document_id, failure.status) for failure in result.failures] == [("d2", 400)]
+
+
+def test_bulk_requests_respect_chunk_size():
+    client = FakeBulkClient()
+    bulk_index_documents(client, "index", _documents(5), _build_bodies, chunk_size=2)
+    assert [len(request) for request in client.requests] == [2, 2, 1]
+
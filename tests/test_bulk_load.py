@@ -0,0 +1,94 @@
+import pytest
+
+import result_cache
+from bulk_load import LOAD_SETTINGS, bulk_load_mode
+
+
+class _Indices:
+    def __init__(self, settings: dict, calls: list):
+        self.settings = dict(settings)
+        self.calls = calls
+
+    def get_settings(self, index, flat_settings):
+        return {index: {"settings": dict(self.settings)}}
+
+    def put_settings(self, index, body):
+        self.calls.append(("put_settings", body))
+        for name, value in body.items():
+            if value is None:
+                self.settings.pop(name, None)
+            else:
+                self.settings[name] = value
+
+    def refresh(self, index):
+        self.calls.append(("refresh",))
+
+    def forcemerge(self, index, max_num_segments, request_timeout):
+        self.calls.append(("forcemerge", max_num_segments))
+
+    def segments(self, index):
+        return {"indices": {index: {"shards": {"0": [
+            {"routing": {"primary": True}, "segments": {"_0": {}, "_1": {}}},
+            {"routing": {"primary": False}, "segments": {"_0": {}}},
+        ]}}}}
+
+
+class _Cluster:
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    def health(self, **kwargs):
+        self.calls.append(("health",))
+
+
+class _Transport:
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    def perform_request(self, method, url):
+        self.calls.append((method, url))
+
+
+class _Client:
+    def __init__(self, settings: dict):
+        self.calls = []
+        self.indices = _Indices(settings, self.calls)
+        self.cluster = _Cluster(self.calls)
+        self.transport = _Transport(self.calls)
+
+
+def test_load_settings_apply_during_the_block_and_are_restored():
+    client = _Client({"index.refresh_interval": "5s", "index.number_of_shards": "1"})
+
+    with bulk_load_mode(client, "index") as stats:
+        assert {name: client.indices.settings.get(name) for name in LOAD_SETTINGS} == LOAD_SETTINGS
+
+    # The explicit refresh_interval comes back, the replica count goes back to its default
+    assert client.indices.settings == {"index.refresh_interval": "5s", "index.number_of_shards": "1"}
+    assert client.calls[-1] == ("GET", "/_plugins/_knn/warmup/index")
+    assert ("forcemerge", 1) in client.calls
+    assert stats.segments == 2
+
+
+def test_settings_are_restored_when_the_load_fails():
+    client = _Client({"index.number_of_replicas": "2"})
+    before = result_cache.search_result_cache.write_generation("index")
+
+    with pytest.raises(RuntimeError):
+        with bulk_load_mode(client, "index"):
+            raise RuntimeError("load failed")
+
+    assert client.indices.settings == {"index.number_of_replicas": "2"}
+    assert not any(call[0] == "forcemerge" for call in client.calls)
+    assert result_cache.search_result_cache.write_generation("index") == before + 1
+
+
+def test_warmup_can_be_skipped():
+    client = _Client({})
+
+    with bulk_load_mode(client, "index", max_num_segments=3, warm=False) as stats:
+        pass
+
+    assert ("forcemerge", 3) in client.calls
+    assert not any(call[0] in ("health", "GET") for call in client.calls)
+    assert stats.warmup_seconds == 0.0
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+import chunker
+from chunker import chunk_documents, chunk_text, passage_token_budget
+from examples import DocumentChunk
+from fakes import make_document
+from utils import MAX_SEQ_LENGTH
+
+
+def _words(count: int) -> str:
+    return " ".join(f"w{i}" for i in range(count))
+
+
+def test_budget_leaves_room_for_the_prefix_and_special_tokens(fake_tokenizer):
+    # [CLS] + [SEP] and the one token of "passage: "
+    assert passage_token_budget(fake_tokenizer) == MAX_SEQ_LENGTH - 3
+
+
+def test_chunks_fill_the_budget_and_overlap(fake_tokenizer):
+    chunks = list(chunk_text(_words(10), max_num_tokens=4, overlap_tokens=1, link="url", tokenizer=fake_tokenizer))
+
+    assert [chunk.content for chunk in chunks] == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    assert [chunk.chunk_index for chunk in chunks] == [0, 1, 2]
+    assert all(chunk.num_tokens == 4 and chunk.max_num_tokens == 4 and chunk.link == "url" for chunk in chunks)
+
+
+def test_a_last_chunk_of_only_overlap_is_not_emitted(fake_tokenizer):
+    chunks = list(chunk_text(_words(7), max_num_tokens=4, overlap_tokens=1, tokenizer=fake_tokenizer))
+    assert [chunk.content for chunk in chunks] == ["w0 w1 w2 w3", "w3 w4 w5 w6"]
+
+    chunks = list(chunk_text(_words(9), max_num_tokens=4, overlap_tokens=1, tokenizer=fake_tokenizer))
+    assert [(chunk.content, chunk.num_tokens) for chunk in chunks][-1] == ("w6 w7 w8", 3)
+
+
+def test_chunk_contents_are_the_original_text_across_lines(fake_tokenizer):
+    text = "first line\n\nsecond   line here\nthird"
+    chunks = list(chunk_text(io.StringIO(text), max_num_tokens=3, tokenizer=fake_tokenizer, tokenize_batch_size=2))
+
+    assert [chunk.content for chunk in chunks] == ["first line\n\nsecond", "line here\nthird"]
+
+
+def test_long_lines_are_cut_before_tokenizing(fake_tokenizer, monkeypatch):
+    monkeypatch.setattr(chunker, "MAX_SEGMENT_CHARS", 8)
+    text = "aaaa bbbb cccc " + "x" * 20
+
+    assert list(chunker._segments(text)) == ["aaaa ", "bbbb ", "cccc ", "x" * 8, "x" * 8, "x" * 4]
+    assert "".join(chunk.content for chunk in chunk_text(text, max_num_tokens=1, tokenizer=fake_tokenizer)) == "aaaabbbbcccc" + "x" * 20
+
+
+def test_overlap_has_to_be_smaller_than_the_chunk(fake_tokenizer):
+    with pytest.raises(ValueError):
+        list(chunk_text("a b", max_num_tokens=4, overlap_tokens=4, tokenizer=fake_tokenizer))
+
+
+def test_documents_are_chunked_with_their_title(fake_tokenizer):
+    document = make_document(content=_words(6), title="My title")
+
+    chunked = next(chunk_documents([document], max_num_tokens=5, tokenizer=fake_tokenizer))
+
+    assert [chunk.content for chunk in chunked.chunks] == ["My title\nw0 w1 w2", "My title\nw3 w4 w5"]
+    assert all(chunk.num_tokens == 5 and chunk.max_num_tokens == 5 for chunk in chunked.chunks)
+    assert document.chunks == []
+
+
+def test_titles_over_half_the_budget_are_left_out(fake_tokenizer):
+    chunked = next(chunk_documents([make_document(content=_words(4), title="a b c")], max_num_tokens=4, tokenizer=fake_tokenizer))
+    assert [chunk.content for chunk in chunked.chunks] == ["w0 w1 w2 w3"]
+
+    chunked = next(chunk_documents([make_document(content=_words(4))], max_num_tokens=4, include_title=False, tokenizer=fake_tokenizer))
+    assert [chunk.content for chunk in chunked.chunks] == ["w0 w1 w2 w3"]
+
+
+def test_documents_with_chunks_or_without_content_pass_through(fake_tokenizer):
+    chunk = DocumentChunk(link=None, max_num_tokens=512, num_tokens=1, chunk_index=0, content="kept", embedding=None)
+    documents = [make_document(content="ignored", chunks=[chunk]), make_document(content="")]
+
+    passed = list(chunk_documents(documents, tokenizer=fake_tokenizer))
+    assert len(passed) == 2 and all(a is b for a, b in zip(passed, documents))
@@ -0,0 +1,138 @@
+import pytest
+
+import context_expansion
+from context_expansion import MAX_INNER_HITS, _flat_searches, _nested_searches, expand_context, merge_windows
+
+
+def _in_ranges(chunk_index: int, should: list[dict], field: str) -> bool:
+    return any(
+        clause["range"][field]["gte"] <= chunk_index <= clause["range"][field]["lte"]
+        for clause in should
+    )
+
+
+class _ChunkStore:
+    # Answers the context searches from documents held as lists of chunks
+    def __init__(self, documents: dict[str, int]):
+        self.documents = {
+            document_id: [{"chunk_index": i, "content": f"{document_id} {i}"} for i in range(num_chunks)]
+            for document_id, num_chunks in documents.items()
+        }
+        self.msearches = []
+
+    def msearch(self, index, body):
+        self.msearches.append(body)
+        responses = []
+        for search in body[1::2]:
+            if "should" in search["query"]["bool"]:
+                responses.append(self._flat(search))
+                continue
+            document_id = search["query"]["bool"]["filter"][0]["ids"]["values"][0]
+            nested = search["query"]["bool"]["must"][0]["nested"]
+            chunks = [
+                chunk for chunk in self.documents.get(document_id, [])
+                if _in_ranges(chunk["chunk_index"], nested["query"]["bool"]["should"], "chunks.chunk_index")
+            ][:nested["inner_hits"]["size"]]
+            hits = [{"_id": document_id, "inner_hits": {"chunks": {"hits": {"hits": [{"_source": chunk} for chunk in chunks]}}}}] if chunks else []
+            responses.append({"hits": {"hits": hits}})
+        return {"responses": responses}
+
+    def _flat(self, body):
+        hits = []
+        for clause in body["query"]["bool"]["should"]:
+            term, chunk_range = clause["bool"]["filter"]
+            document_id = term["term"]["document_id"]
+            hits.extend(
+                {"_source": {**chunk, "document_id": document_id}}
+                for chunk in self.documents.get(document_id, [])
+                if _in_ranges(chunk["chunk_index"], [chunk_range], "chunk_index")
+            )
+        hits.sort(key=lambda hit: hit["_source"]["chunk_index"])
+        return {"hits": {"hits": hits[:body["size"]]}}
+
+
+def test_overlapping_and_touching_windows_merge():
+    windows = merge_windows([("a", 5), ("b", 0), ("a", 1), ("a", 3), ("a", 9), ("a", 3)], window=1)
+
+    assert [(w.document_id, w.first_chunk_index, w.last_chunk_index, w.hit_chunk_indices) for w in windows] == [
+        ("a", 0, 6, [1, 3, 5]),
+        ("a", 8, 10, [9]),
+        ("b", 0, 1, [0]),
+    ]
+
+
+def test_windows_that_only_touch_merge_but_gaps_do_not():
+    assert len(merge_windows([("a", 0), ("a", 3)], window=1)) == 1
+    assert len(merge_windows([("a", 0), ("a", 4)], window=1)) == 2
+
+
+def test_large_windows_are_split_at_the_inner_hits_limit():
+    windows = merge_windows([("a", 150), ("b", 0)], window=120)
+
+    searches = _nested_searches(windows)
+
+    sizes = [search["query"]["bool"]["must"][0]["nested"]["inner_hits"]["size"] for _, search in searches]
+    # 241 chunks around a's hit and 121 around b's, every search within the limit
+    assert sizes == [MAX_INNER_HITS, MAX_INNER_HITS, 41, MAX_INNER_HITS, 21]
+    assert [search_windows[0].document_id for search_windows, _ in searches] == ["a", "a", "a", "b", "b"]
+
+
+@pytest.mark.parametrize("layout", ["nested", "flat"])
+def test_context_is_fetched_in_one_round_trip(layout):
+    client = _ChunkStore({"a": 10, "b": 2})
+
+    windows = expand_context(client, "index", [("a", 5), ("b", 1), ("a", 0)], window=1, layout=layout)
+
+    assert [(w.document_id, [chunk["chunk_index"] for chunk in w.chunks]) for w in windows] == [
+        ("a", [0, 1]),
+        ("a", [4, 5, 6]),
+        ("b", [0, 1]),
+    ]
+    assert len(client.msearches) == 1
+
+
+def test_windows_past_the_end_of_a_document_stop_short():
+    client = _ChunkStore({"a": 3})
+
+    window, = expand_context(client, "index", [("a", 2)], window=5)
+
+    assert (window.first_chunk_index, window.last_chunk_index) == (0, 7)
+    assert [chunk["chunk_index"] for chunk in window.chunks] == [0, 1, 2]
+
+
+def test_more_than_max_inner_hits_chunks_are_all_fetched():
+    client = _ChunkStore({"a": 300})
+
+    window, = expand_context(client, "index", [("a", 150)], window=120)
+
+    assert [chunk["chunk_index"] for chunk in window.chunks] == list(range(30, 271))
+
+
+def test_flat_searches_stay_within_the_result_window(monkeypatch):
+    monkeypatch.setattr(context_expansion, "MAX_RESULT_WINDOW", 100)
+    windows = merge_windows([("a", 150), ("b", 0), ("c", 0)], window=120)
+
+    searches = _flat_searches(windows)
+
+    # 241 chunks around a's hit, 121 around b's and c's, packed into searches of at most 100 hits
+    assert [search["size"] for search in searches] == [100, 100, 100, 100, 83]
+
+    client = _ChunkStore({"a": 300, "b": 200, "c": 200})
+    windows = expand_context(client, "index", [("a", 150), ("b", 0), ("c", 0)], window=120, layout="flat")
+
+    assert [[chunk["chunk_index"] for chunk in w.chunks] for w in windows] == [list(range(30, 271)), list(range(121)), list(range(121))]
+    assert len(client.msearches) == 1
+
+
+def test_no_hits_sends_nothing():
+    client = _ChunkStore({})
+    assert expand_context(client, "index", []) == []
+    assert client.msearches == []
+
+
+def test_a_failed_search_is_raised():
+    client = _ChunkStore({})
+    client.msearch = lambda index, body: {"responses": [{"error": {"type": "index_not_found_exception"}}]}
+
+    with pytest.raises(RuntimeError, match="a"):
+        expand_context(client, "index", [("a", 0)])
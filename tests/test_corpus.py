@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.corpus import generate_corpus, generate_queries
+from benchmarks.end_to_end import latency_summary
+
+
+def test_corpus_is_deterministic_per_seed():
+    first = list(generate_corpus(num_documents=5, chunks_per_document=3, seed=7))
+
+    assert first == list(generate_corpus(num_documents=5, chunks_per_document=3, seed=7))
+    assert first != list(generate_corpus(num_documents=5, chunks_per_document=3, seed=8))
+    assert generate_queries(10, seed=3) == generate_queries(10, seed=3)
+
+
+def test_corpus_respects_its_shape_arguments():
+    start, end = datetime(2023, 1, 1), datetime(2023, 2, 1)
+    documents = list(generate_corpus(
+        num_documents=20,
+        chunks_per_document=4,
+        min_words_per_chunk=5,
+        max_words_per_chunk=10,
+        metadata_keys=2,
+        metadata_values_per_key=3,
+        num_document_sets=4,
+        document_sets_per_document=2,
+        start_date=start,
+        end_date=end,
+        hidden_fraction=1.0,
+    ))
+
+    assert [document.document_id for document in documents] == [f"synthetic{i}" for i in range(20)]
+    for document in documents:
+        assert [chunk.chunk_index for chunk in document.chunks] == [0, 1, 2, 3]
+        assert all(5 <= chunk.num_tokens == len(chunk.content.split()) <= 10 for chunk in document.chunks)
+        assert all(chunk.embedding is None for chunk in document.chunks)
+        assert set(document.metadata) == {"key0", "key1"}
+        assert set(document.metadata.values()) <= {"value0", "value1", "value2"}
+        assert len(set(document.document_sets)) == 2
+        assert start <= document.last_updated < end
+        assert document.hidden
+
+
+def test_latency_summary_reports_milliseconds():
+    summary = latency_summary([0.001] * 99 + [0.101])
+
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == pytest.approx(1.0)
+    assert summary["mean_ms"] == pytest.approx(2.0)
+    assert summary["p99_ms"] > summary["p95_ms"]
@@ -0,0 +1,59 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache, embedding_cache_key
+
+
+def _vectors(count: int, dim: int = 4) -> np.ndarray:
+    return np.arange(count * dim, dtype=np.float32).reshape(count, dim)
+
+
+def test_key_depends_on_model_prefix_and_text():
+    key = embedding_cache_key("model", "passage", "text")
+    assert key == embedding_cache_key("model", "passage", "text")
+    assert key != embedding_cache_key("other", "passage", "text")
+    assert key != embedding_cache_key("model", "query", "text")
+    assert key != embedding_cache_key("model", "passage", "other text")
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2, dim=4)
+    cache.put_many(["a", "b"], _vectors(2))
+    cache.get_many(["a"])
+    cache.put_many(["c"], _vectors(1))
+
+    a, b, c = cache.get_many(["a", "b", "c"])
+    assert a is not None and b is None and c is not None
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_cached_vectors_are_copies():
+    cache = EmbeddingCache(max_entries=10, dim=4)
+    vectors = _vectors(2)
+    cache.put_many(["a", "b"], vectors)
+    vectors[:] = 0
+
+    np.testing.assert_array_equal(cache.get_many(["b"])[0], _vectors(2)[1])
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    cache = EmbeddingCache(max_entries=10, dim=4, disk_directory=str(tmp_path))
+    cache.put_many(["a", "b", "a"], _vectors(3))
+
+    reopened = EmbeddingCache(max_entries=10, dim=4, disk_directory=str(tmp_path))
+    a, b, missing = reopened.get_many(["a", "b", "c"])
+    np.testing.assert_array_equal(a, _vectors(3)[0])
+    np.testing.assert_array_equal(b, _vectors(3)[1])
+    assert missing is None
+    assert reopened.stats()["disk_hits"] == 2
+
+
+def test_disk_tier_drops_rows_of_an_interrupted_write(tmp_path):
+    cache = EmbeddingCache(max_entries=10, dim=4, disk_directory=str(tmp_path))
+    cache.put_many(["a", "b"], _vectors(2))
+    # A key whose vector never made it to disk
+    with open(tmp_path / "keys_4.txt", "a", encoding="utf-8") as f:
+        f.write("c\n")
+
+    reopened = EmbeddingCache(max_entries=10, dim=4, disk_directory=str(tmp_path))
+    assert reopened.get_many(["c"]) == [None]
+    assert reopened.get_many(["b"])[0] is not None
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import utils
+from conftest import fake_vector
+from embedding_pool import EmbeddingPool
+from utils import TextType, batch_vectorize
+
+
+class _RecordingPool:
+    def __init__(self):
+        self.encoded: list[list[str]] = []
+        self.closed = False
+
+    def encode(self, prefixed_texts, batch_size):
+        self.encoded.append(list(prefixed_texts))
+        return np.stack([fake_vector(text) for text in prefixed_texts])
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def in_process_pool():
+    # The real pool's splitting and shared memory, with threads in place of the spawned workers
+    pool = EmbeddingPool(2, threads_per_worker=1, task_size=2)
+    pool._executor.shutdown()
+    pool._executor = ThreadPoolExecutor(2)
+    with pool:
+        yield pool
+
+
+def test_only_encodes_over_one_batch_go_to_the_pool(fake_model, monkeypatch):
+    pool = _RecordingPool()
+    monkeypatch.setattr(utils, "_embedding_pool", pool)
+
+    batch_vectorize([("short", TextType.QUERY)], batch_size=2)
+    vectors = batch_vectorize([(f"text {i}", TextType.PASSAGE) for i in range(3)], batch_size=2)
+
+    assert fake_model.encoded == [["query: short"]]
+    assert pool.encoded == [["passage: text 0", "passage: text 1", "passage: text 2"]]
+    np.testing.assert_array_equal(vectors[2], fake_vector("passage: text 2"))
+
+
+def test_use_embedding_pool_switches_back_to_in_process(fake_model):
+    pool = _RecordingPool()
+    utils.use_embedding_pool(pool)
+    batch_vectorize([(f"text {i}", TextType.PASSAGE) for i in range(3)], batch_size=2)
+    utils.use_embedding_pool(None)
+    batch_vectorize([(f"other {i}", TextType.PASSAGE) for i in range(3)], batch_size=2)
+
+    assert len(pool.encoded) == 1
+    assert pool.closed
+    assert sorted(text for batch in fake_model.encoded for text in batch) == [f"passage: other {i}" for i in range(3)]
+
+
+def test_a_disabled_pool_is_not_started_again_by_embedding_workers(fake_model, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("no pool should be started once disabled")
+
+    monkeypatch.setattr(utils, "EMBEDDING_WORKERS", 2)
+    monkeypatch.setattr("embedding_pool.EmbeddingPool", no_pool)
+    utils.use_embedding_pool(None)
+
+    batch_vectorize([(f"text {i}", TextType.PASSAGE) for i in range(3)], batch_size=2)
+
+    assert sorted(text for batch in fake_model.encoded for text in batch) == [f"passage: text {i}" for i in range(3)]
+
+
+def test_embedding_workers_start_a_pool_until_disabled(fake_model, monkeypatch):
+    pool = _RecordingPool()
+    monkeypatch.setattr(utils, "EMBEDDING_WORKERS", 2)
+    monkeypatch.setattr("embedding_pool.EmbeddingPool", lambda num_workers: pool)
+
+    batch_vectorize([(f"text {i}", TextType.PASSAGE) for i in range(3)], batch_size=2)
+    assert len(pool.encoded) == 1
+
+    utils.use_embedding_pool(None)
+    assert pool.closed
+
+
+def test_replacing_a_pool_closes_the_previous_one(fake_model):
+    first, second = _RecordingPool(), _RecordingPool()
+    utils.use_embedding_pool(first)
+    utils.use_embedding_pool(first)
+    assert not first.closed
+
+    utils.use_embedding_pool(second)
+
+    assert first.closed and not second.closed
+
+
+def test_pool_rows_come_back_in_input_order(fake_model, in_process_pool):
+    texts = ["a", "a much longer text", "bb", "medium text", "c"]
+
+    embeddings = in_process_pool.encode(texts, batch_size=2)
+
+    np.testing.assert_array_equal(embeddings, np.stack([fake_vector(text) for text in texts]))
+    # Tasks of task_size texts, longest first, each one encode of batch_size here
+    assert sorted(sorted(batch) for batch in fake_model.encoded) == [
+        ["a", "bb"], ["a much longer text", "medium text"], ["c"],
+    ]
+
+
+def test_pool_encode_of_nothing(in_process_pool):
+    assert in_process_pool.encode([]).shape == (0, utils.EMBEDDING_DIM)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.hnsw_sweep import embed_corpus, pareto_front, run_queries, top_chunks
+from conftest import fake_vector
+from fakes import FakeSearchClient
+from utils import EMBEDDING_DIM
+
+
+def _response(*hits: tuple[str, list[tuple[int, float]]]) -> dict:
+    return {"hits": {"hits": [
+        {"_id": document_id, "inner_hits": {"chunks": {"hits": {"hits": [
+            {"_score": score, "_nested": {"field": "chunks", "offset": offset}} for offset, score in chunks
+        ]}}}}
+        for document_id, chunks in hits
+    ]}}
+
+
+def test_pareto_front_keeps_settings_nothing_beats_on_both():
+    rows = [
+        {"recall": 0.90, "p50_ms": 2.0},
+        {"recall": 0.95, "p50_ms": 3.0},
+        {"recall": 0.90, "p50_ms": 2.5},  # Same recall, slower
+        {"recall": 0.99, "p50_ms": 3.0},  # Same latency, better recall than the second
+        {"recall": 0.90, "p50_ms": 2.0},  # Tie with the first, neither beats the other
+    ]
+    assert pareto_front(rows) == [True, False, False, True, True]
+
+
+def test_top_chunks_ranks_inner_hits_across_documents():
+    response = _response(("a", [(0, 0.9), (3, 0.5)]), ("b", [(1, 0.7)]))
+    assert top_chunks(response, 2) == [("a", 0), ("b", 1)]
+
+
+def test_recall_is_the_share_of_exact_top_k_found():
+    client = FakeSearchClient(_response(("a", [(0, 0.9), (3, 0.5)]), ("b", [(1, 0.7)])))
+
+    result = run_queries(client, "index", [[1.0], [2.0]], [{("a", 0), ("b", 1)}, {("a", 0), ("c", 0)}], k=2, query_k=50)
+
+    assert result["recall"] == pytest.approx(0.75)
+    assert client.requests[-1]["body"]["query"]["nested"]["query"]["knn"]["chunks.embedding"] == {"vector": [2.0], "k": 50}
+
+
+def test_corpus_is_embedded_once_with_chunk_rows_in_order(fake_model):
+    documents = list(generate_corpus(num_documents=2, chunks_per_document=2, min_words_per_chunk=1, max_words_per_chunk=3))
+
+    matrix = embed_corpus(documents)
+
+    assert matrix.shape == (4, EMBEDDING_DIM)
+    np.testing.assert_array_equal(matrix[3], fake_vector(f"passage: {documents[1].chunks[1].content}"))
+    assert documents[0].title_embedding is not None
+    assert sum(len(batch) for batch in fake_model.encoded) <= 6
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from hybrid_fusion import build_fusion_searches, fuse_responses, normalize_scores
+
+
+def _hit(document_id: str, score: float, chunks: list[tuple[int, float]]) -> dict:
+    # Inner hits come back best first with their stored chunk_index, offsets reversed on purpose
+    return {
+        "_id": document_id,
+        "_score": score,
+        "inner_hits": {"chunks": {"hits": {"hits": [
+            {"_score": chunk_score, "_nested": {"field": "chunks", "offset": 100 - chunk_index}, "_source": {"chunk_index": chunk_index}}
+            for chunk_index, chunk_score in chunks
+        ]}}},
+    }
+
+
+def _response(*hits: dict) -> dict:
+    return {"hits": {"hits": list(hits)}}
+
+
+def test_min_max_normalization():
+    np.testing.assert_allclose(normalize_scores(np.array([1.0, 3.0, 2.0])), [0.0, 1.0, 0.5])
+    np.testing.assert_array_equal(normalize_scores(np.array([2.0, 2.0])), [1.0, 1.0])
+    assert normalize_scores(np.array([])).size == 0
+    with pytest.raises(ValueError):
+        normalize_scores(np.array([1.0]), "unknown")
+
+
+def test_fusion_combines_both_legs_per_chunk():
+    keyword = _response(_hit("a", 4.0, [(0, 4.0), (1, 2.0)]), _hit("b", 0.0, [(0, 0.0)]))
+    vector = _response(_hit("b", 1.0, [(0, 1.0)]), _hit("a", 0.5, [(1, 0.5)]))
+
+    fused = fuse_responses(keyword, vector, weights=(0.5, 0.5))
+    scores = {(chunk.document_id, chunk.chunk_index): (chunk.keyword_score, chunk.vector_score, chunk.score) for chunk in fused}
+
+    assert scores[("a", 0)] == pytest.approx((1.0, 0.0, 0.5))
+    assert scores[("a", 1)] == pytest.approx((0.5, 0.0, 0.25))
+    assert scores[("b", 0)] == pytest.approx((0.0, 1.0, 0.5))
+    assert [chunk.score for chunk in fused] == sorted((chunk.score for chunk in fused), reverse=True)
+    assert len(fuse_responses(keyword, vector, top_k=2)) == 2
+
+
+def test_fusion_uses_the_stored_chunk_index():
+    fused = fuse_responses(_response(_hit("a", 1.0, [(3, 1.0)])), _response())
+    assert fused[0].chunk_index == 3
+
+
+def test_fusion_falls_back_to_the_nested_offset():
+    hit = _hit("a", 1.0, [(3, 1.0)])
+    hit["inner_hits"]["chunks"]["hits"]["hits"][0]["_source"] = {}
+    assert fuse_responses(_response(hit), _response())[0].chunk_index == 97
+
+
+def test_title_score_is_added_to_every_chunk_of_the_keyword_leg():
+    # Document score 5 = best chunk 3 + title 2
+    keyword = _response(_hit("a", 5.0, [(0, 3.0), (1, 1.0)]), _hit("b", 2.0, [(0, 2.0)]))
+    fused = {chunk.chunk_index if chunk.document_id == "a" else "b": chunk for chunk in fuse_responses(keyword, _response(), weights=(1.0, 0.0))}
+
+    # Before normalization: a/0 = 5, a/1 = 3, b/0 = 2
+    assert fused[0].keyword_score == pytest.approx(1.0)
+    assert fused[1].keyword_score == pytest.approx(1 / 3)
+    assert fused["b"].keyword_score == pytest.approx(0.0)
+
+
+def test_keyword_leg_boosts_the_title_and_both_legs_are_filtered():
+    filters = [{"term": {"not_hidden": True}}]
+    _, keyword_leg, _, vector_leg = build_fusion_searches("florida", [0.0], num_documents=5, filters=filters)
+
+    keyword_query = keyword_leg["query"]["bool"]
+    assert keyword_query["filter"] == filters
+    should = keyword_query["must"][0]["bool"]["should"]
+    assert should[0]["nested"]["query"] == {"match": {"chunks.content": {"query": "florida"}}}
+    assert should[1] == {"match": {"title": {"query": "florida", "boost": 1.2}}}
+    assert vector_leg["query"]["bool"]["filter"] == filters
+    assert vector_leg["query"]["bool"]["must"][0]["nested"]["query"]["knn"]["chunks.embedding"]["k"] == 5
+
+
+def test_z_score_ranks_chunks_a_leg_missed_at_its_bottom():
+    # c is below the keyword mean but matched, d was never matched by the keyword leg
+    keyword = _response(_hit("a", 3.0, [(0, 3.0)]), _hit("b", 2.0, [(0, 2.0)]), _hit("c", 0.5, [(0, 0.5)]))
+    fused = {chunk.document_id: chunk for chunk in fuse_responses(keyword, _response(_hit("d", 1.0, [(0, 1.0)])), weights=(1.0, 0.0), technique="z_score")}
+
+    assert fused["d"].keyword_score == pytest.approx(fused["c"].keyword_score)
+    assert fused["d"].keyword_score < 0
+    assert fused["d"].score <= fused["c"].score
+
+
+def test_ties_keep_the_order_the_legs_returned_chunks_in():
+    keyword = _response(*(_hit(document_id, 1.0, [(0, 1.0)]) for document_id in "zyxwv"))
+    vector = _response(*(_hit(document_id, 1.0, [(0, 1.0)]) for document_id in "utsrq"))
+
+    assert [chunk.document_id for chunk in fuse_responses(keyword, vector, weights=(0.5, 0.5))] == list("zyxwvutsrq")
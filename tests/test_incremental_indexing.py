@@ -0,0 +1,112 @@
+import dataclasses
+
+import pytest
+from opensearchpy.exceptions import ConflictError
+
+from fakes import FakeDocumentClient, make_document
+from incremental_indexing import upsert_document
+
+
+class _RacingClient(FakeDocumentClient):
+    # Another writer updates the document right after each of the first `races` reads
+    def __init__(self, races: int):
+        super().__init__()
+        self.races = races
+
+    def get(self, index, id, ignore=()):
+        response = super().get(index, id, ignore)
+        if self.races and id in self.documents:
+            self.races -= 1
+            self._store(id, self.documents[id][0])
+        return response
+
+
+def test_new_documents_are_created(fake_model):
+    client = FakeDocumentClient()
+
+    report = upsert_document(client, "index", make_document(chunk_texts=["one", "two"]))
+
+    assert (report.action, report.embeddings_computed, report.embeddings_reused) == ("created", 3, 0)
+    assert client.writes[0][:2] == ("index", "doc")
+    assert report.bytes_sent > 0
+
+
+def test_unchanged_documents_are_not_written(fake_model):
+    client = FakeDocumentClient()
+    upsert_document(client, "index", make_document(chunk_texts=["one", "two"]))
+
+    report = upsert_document(client, "index", make_document(chunk_texts=["one", "two"]))
+
+    assert (report.action, report.embeddings_computed, report.embeddings_reused) == ("unchanged", 0, 3)
+    assert len(client.writes) == 1
+    assert report.bytes_sent == 0
+
+
+def test_field_only_changes_are_partial_updates(fake_model):
+    client = FakeDocumentClient()
+    upsert_document(client, "index", make_document(chunk_texts=["one", "two"]))
+
+    report = upsert_document(client, "index", make_document(chunk_texts=["one", "two"], metadata={"space": "HR"}))
+
+    assert report.action == "partial_update"
+    assert client.writes[-1] == ("update", "doc", {"doc": {"metadata": [{"key": "space", "value": "HR"}]}})
+    assert report.bytes_saved > report.bytes_sent > 0
+    assert client.documents["doc"][0]["metadata"] == [{"key": "space", "value": "HR"}]
+
+
+def test_only_changed_chunks_are_embedded(fake_model):
+    client = FakeDocumentClient()
+    upsert_document(client, "index", make_document(chunk_texts=["one", "two", "three"]))
+    stored_vectors = [chunk["embedding"] for chunk in client.documents["doc"][0]["chunks"]]
+
+    report = upsert_document(client, "index", make_document(chunk_texts=["one", "changed", "three"]))
+
+    assert (report.action, report.embeddings_computed, report.embeddings_reused) == ("reindexed", 1, 3)
+    chunks = client.documents["doc"][0]["chunks"]
+    assert chunks[0]["embedding"] == pytest.approx(stored_vectors[0])
+    assert chunks[2]["embedding"] == pytest.approx(stored_vectors[2])
+    assert chunks[1]["embedding"] != pytest.approx(stored_vectors[1])
+
+
+def test_the_callers_document_is_left_alone(fake_model):
+    client = FakeDocumentClient()
+    upsert_document(client, "index", make_document(chunk_texts=["one"]))
+    document = make_document(chunk_texts=["one"], title="New title")
+    before = dataclasses.replace(document, chunks=[dataclasses.replace(chunk) for chunk in document.chunks])
+
+    upsert_document(client, "index", document)
+
+    assert document == before
+    assert document.title_embedding is None
+    assert document.chunks[0].embedding is None
+
+
+def test_writes_are_conditional_on_the_version_read(fake_model):
+    client = FakeDocumentClient()
+    upsert_document(client, "index", make_document(chunk_texts=["one"]))
+    upsert_document(client, "index", make_document(chunk_texts=["one"], metadata={"space": "HR"}))
+
+    with pytest.raises(ConflictError):
+        client.index(index="index", id="doc", body={}, op_type="create")
+    with pytest.raises(ConflictError):
+        client.update(index="index", id="doc", body={"doc": {}}, if_seq_no=0, if_primary_term=1)
+
+
+def test_conflicting_writes_start_over_from_a_fresh_read(fake_model):
+    client = _RacingClient(races=0)
+    upsert_document(client, "index", make_document(chunk_texts=["one"]))
+    client.races = 2
+
+    report = upsert_document(client, "index", make_document(chunk_texts=["two"]))
+
+    assert report.action == "reindexed"
+    assert client.documents["doc"][0]["chunks"][0]["content"] == "two"
+
+
+def test_conflicts_past_the_retry_limit_are_raised(fake_model):
+    client = _RacingClient(races=0)
+    upsert_document(client, "index", make_document(chunk_texts=["one"]))
+    client.races = 2
+
+    with pytest.raises(ConflictError):
+        upsert_document(client, "index", make_document(chunk_texts=["two"]), max_conflict_retries=1)
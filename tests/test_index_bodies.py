@@ -0,0 +1,40 @@
+import numpy as np
+
+from conftest import fake_vector
+from fakes import make_document
+from full_example import build_index_bodies
+from serializer import OrjsonSerializer
+from utils import EMBEDDING_DIM, content_hash
+
+
+def _document(title: str, chunk_embeddings: list[np.ndarray | None], title_embedding: np.ndarray | None = None):
+    chunk_texts = [f"{title} chunk{i}" for i in range(len(chunk_embeddings))]
+    return make_document(title, chunk_texts, title, chunk_embeddings=chunk_embeddings, title_embedding=title_embedding)
+
+
+def test_only_missing_embeddings_are_computed_in_one_batch(fake_model):
+    existing = np.ones(EMBEDDING_DIM, dtype=np.float32)
+    documents = [_document("first", [existing, None], title_embedding=existing), _document("second", [None])]
+
+    bodies = build_index_bodies(documents)
+
+    # One encode call (batch_vectorize orders it by length) with nothing that already had an embedding
+    assert len(fake_model.encoded) == 1
+    assert sorted(fake_model.encoded[0]) == ["passage: first chunk1", "passage: second", "passage: second chunk0"]
+    assert bodies[0]["title_vector"] is existing
+    assert bodies[0]["chunks"][0]["embedding"] is existing
+    np.testing.assert_array_equal(bodies[0]["chunks"][1]["embedding"], fake_vector("passage: first chunk1"))
+    np.testing.assert_array_equal(bodies[1]["title_vector"], fake_vector("passage: second"))
+    assert all(chunk["embedding"].dtype == np.float32 for body in bodies for chunk in body["chunks"])
+
+
+def test_bodies_carry_hashes_and_serialize_vectors_as_lists(fake_model):
+    body = build_index_bodies([_document("title", [None])])[0]
+
+    assert body["title_hash"] == content_hash("title")
+    assert body["chunks"][0]["content_hash"] == content_hash("title chunk0")
+    assert body["metadata"] == [{"key": "space", "value": "IT"}]
+    assert body["not_hidden"] is True
+
+    serialized = OrjsonSerializer().loads(OrjsonSerializer().dumps(body))
+    np.testing.assert_array_equal(np.array(serialized["chunks"][0]["embedding"], dtype=np.float32), fake_vector("passage: title chunk0"))
@@ -0,0 +1,138 @@
+import pytest
+
+import index_layouts
+from fakes import FakeBulkClient, FakeSearchClient, make_document
+from index_layouts import (
+    SEARCH_PIPELINE,
+    _stale_chunks_query,
+    build_flat_index_bodies,
+    index_documents,
+    search_documents,
+    update_document_fields,
+)
+from query_builder import SearchFilters
+
+
+def _document(document_id: str, num_chunks: int):
+    return make_document(document_id, [f"{document_id} chunk{i}" for i in range(num_chunks)], f"title {document_id}")
+
+
+class _FlatClient(FakeBulkClient):
+    def __init__(self):
+        super().__init__()
+        self.deletes = []
+        self.updates = []
+
+    def delete_by_query(self, index, body, refresh, conflicts):
+        self.deletes.append(body["query"])
+
+    def update(self, index, id, body):
+        self.updates.append((id, body))
+
+    def update_by_query(self, index, body, conflicts):
+        self.updates.append(body)
+        return {"updated": 3}
+
+
+def _search_response(document_ids: list[str], total: int) -> dict:
+    return {
+        "took": 2,
+        "hits": {
+            "total": {"value": total},
+            "hits": [
+                {"_id": document_id, "_score": 1.0, "_source": {"document_id": document_id}, "inner_hits": {"chunks": {"hits": {"hits": [{"_source": {"chunk_index": 0}}]}}}}
+                for document_id in document_ids
+            ],
+        },
+    }
+
+
+@pytest.fixture
+def fixed_query_vector(monkeypatch):
+    monkeypatch.setattr(index_layouts, "embed_query", lambda query: [0.5, 0.5])
+
+
+def test_flat_bodies_copy_document_fields_onto_each_chunk(fake_model):
+    bodies = build_flat_index_bodies([_document("a", 2)])
+
+    assert [body["chunk_index"] for body in bodies[0]] == [0, 1]
+    assert all(body["document_id"] == "a" and body["title"] == "title a" and body["not_hidden"] for body in bodies[0])
+    assert "chunks" not in bodies[0][0] and "title_vector" not in bodies[0][0]
+
+
+def test_flat_indexing_writes_chunks_in_place_and_removes_stale_ones(fake_model):
+    client = _FlatClient()
+
+    result = index_documents(client, "index", "flat", [_document("a", 2), _document("b", 1)], initial_backoff=0)
+
+    assert result.indexed == 3
+    assert sorted(client.indexed) == ["a__0", "a__1", "b__0"]
+    assert client.deletes == [_stale_chunks_query({"a": 2, "b": 1})]
+
+
+def test_stale_chunks_are_those_past_the_current_count():
+    query = _stale_chunks_query({"a": 2})
+    assert query["bool"]["should"] == [{"bool": {"filter": [
+        {"term": {"document_id": "a"}},
+        {"range": {"chunk_index": {"gte": 2}}},
+    ]}}]
+
+
+def test_field_updates_rewrite_one_document_per_layout_unit():
+    client = _FlatClient()
+
+    assert update_document_fields(client, "index", "nested", "a", {"boost_count": 1}) == 1
+    assert client.updates[0] == ("a", {"doc": {"boost_count": 1}})
+    assert update_document_fields(client, "index", "flat", "a", {"boost_count": 1}) == 3
+    assert client.updates[1]["query"] == {"term": {"document_id": "a"}}
+    with pytest.raises(ValueError):
+        update_document_fields(client, "index", "sharded", "a", {})
+
+
+@pytest.mark.parametrize("layout", ["nested", "flat"])
+def test_hybrid_search_runs_both_legs_through_the_pipeline(fixed_query_vector, layout):
+    client = FakeSearchClient(_search_response(["a"], 1))
+    filters = SearchFilters(document_sets=["set1"])
+
+    search_documents(client, "index", layout, "query", num_documents=1, filters=filters)
+
+    body, pipeline = client.requests[0]["body"], client.requests[0]["search_pipeline"]
+    keyword, knn = body["query"]["hybrid"]["queries"]
+    assert pipeline == SEARCH_PIPELINE
+    assert keyword["bool"]["filter"] == knn["bool"]["filter"] == filters.to_clauses()
+    if layout == "nested":
+        assert keyword["bool"]["must"][0]["bool"]["should"][0] == {"match": {"title": {"query": "query", "boost": 1.2}}}
+    else:
+        assert keyword["bool"]["must"][0]["multi_match"]["fields"] == ["title^1.2", "content"]
+
+
+def test_knn_only_search_skips_the_pipeline(fixed_query_vector):
+    client = FakeSearchClient(_search_response(["a"], 1))
+
+    search_documents(client, "index", "flat", "query", num_documents=1, hybrid=False)
+
+    body, pipeline = client.requests[0]["body"], client.requests[0]["search_pipeline"]
+    assert pipeline is None
+    assert "knn" in body["query"]
+
+
+def test_k_doubles_until_there_are_enough_documents(fixed_query_vector):
+    client = FakeSearchClient(
+        _search_response(["a"], 4),
+        _search_response(["a", "b"], 8),
+        _search_response(["a", "b", "c"], 16),
+    )
+
+    result = search_documents(client, "index", "flat", "query", num_documents=3, initial_k_factor=2)
+
+    assert (result.k, result.rounds, result.took_ms) == (24, 3, 6)
+    assert [document.document_id for document in result.documents] == ["a", "b", "c"]
+
+
+def test_over_fetching_stops_once_candidates_stop_growing(fixed_query_vector):
+    client = FakeSearchClient(_search_response(["a"], 4), _search_response(["a"], 4))
+
+    result = search_documents(client, "index", "nested", "query", num_documents=3)
+
+    assert result.rounds == 2
+    assert len(result.documents) == 1
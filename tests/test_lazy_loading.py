@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+import utils
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_examples_does_not_load_the_model():
+    # In a fresh interpreter, since this one may already have imported anything
+    code = (
+        "import sys, full_example, utils\n"
+        "assert utils._model is None\n"
+        "assert 'sentence_transformers' not in sys.modules and 'torch' not in sys.modules\n"
+    )
+    env = {**os.environ, "EMBEDDING_CACHE_DIR": ""}
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+
+def test_get_model_loads_once(monkeypatch):
+    loads = []
+    monkeypatch.setattr(utils, "_model", None)
+    monkeypatch.setattr(utils, "load_model", lambda: loads.append(1) or object())
+
+    assert utils.get_model() is utils.get_model()
+    assert loads == [1]
+
+
+def test_warmup_encodes_once_and_skips_the_cluster_without_a_client(fake_model):
+    assert utils.warmup() is None
+    assert fake_model.encoded == [["query: warmup"]]
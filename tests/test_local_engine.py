@@ -0,0 +1,106 @@
+import math
+from array import array
+
+import numpy as np
+import pytest
+
+from local_engine import LocalSearchEngine, _as_numpy, analyze
+
+
+DIM = 4
+
+
+def _source(*chunks: tuple[str, list[float]]) -> dict:
+    return {"title": "t", "chunks": [{"content": content, "embedding": embedding} for content, embedding in chunks]}
+
+
+@pytest.fixture
+def engine() -> LocalSearchEngine:
+    engine = LocalSearchEngine(dim=DIM)
+    engine.index_documents(
+        [
+            _source(("the quick brown fox", [1, 0, 0, 0]), ("lazy dogs sleep", [0, 1, 0, 0])),
+            _source(("fox fox fox", [0, 0, 1, 0])),
+            _source(("nothing relevant here at all", [0, 0, 0, 1])),
+        ],
+        ["a", "b", "c"],
+    )
+    return engine
+
+
+def _bm25(frequency: int, length: int, average_length: float, matching: int, total: int, k1=1.2, b=0.75) -> float:
+    idf = math.log(1 + (total - matching + 0.5) / (matching + 0.5))
+    return idf * frequency / (frequency + k1 * (1 - b + b * length / average_length))
+
+
+def test_analyze_lowercases_and_splits_on_non_word_characters():
+    assert analyze("Hello, World! it's") == ["hello", "world", "it", "s"]
+
+
+def test_keyword_scores_match_lucene_bm25(engine):
+    scores = engine.keyword_chunk_scores("fox")
+    average_length = (4 + 3 + 3 + 5) / 4
+
+    np.testing.assert_allclose(scores, [
+        _bm25(1, 4, average_length, 2, 4),
+        0.0,
+        _bm25(3, 3, average_length, 2, 4),
+        0.0,
+    ], rtol=1e-6)
+
+
+def test_documents_score_as_their_best_chunk(engine):
+    hits = engine.keyword_search("fox dogs")
+    scores = engine.keyword_chunk_scores("fox dogs")
+    by_id = {hit.document_id: hit for hit in hits}
+
+    assert set(by_id) == {"a", "b"}
+    assert by_id["a"].score == pytest.approx(max(scores[0], scores[1]))
+    assert by_id["b"].score == pytest.approx(scores[2])
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+    # Inner hits are (chunk offset, score) best first
+    assert [offset for offset, _ in by_id["a"].inner_hits] == list(np.argsort(-scores[:2], kind="stable"))
+
+
+def test_knn_is_exact_cosine_in_the_lucene_score_range(engine):
+    hits = engine.knn_search([0, 0, 2, 0], k=1)
+
+    assert [hit.document_id for hit in hits] == ["b"]
+    assert hits[0].score == pytest.approx(1.0)
+    assert engine.vector_chunk_scores([0, 0, -1, 0])[2] == pytest.approx(0.0)
+
+
+def test_reindexing_replaces_the_document(engine):
+    engine.index_document(_source(("cats only", [0, 0, 1, 0])), "b")
+
+    assert engine.num_documents == 3
+    assert [hit.document_id for hit in engine.keyword_search("fox")] == ["a"]
+    assert [hit.document_id for hit in engine.knn_search([0, 0, 1, 0], k=1)] == ["b"]
+    assert engine.get_source("b")["chunks"] == [{"content": "cats only"}]
+
+
+def test_hybrid_combines_normalized_legs(engine):
+    hits = engine.hybrid_search("fox", [0, 0, 0, 1], size=3, weights=(0.5, 0.5))
+    scores = {hit.document_id: hit.score for hit in hits}
+
+    # Keyword: b best, a worst of the two. Vector: c best, b worst of the three.
+    assert scores["b"] == pytest.approx(0.5)
+    assert scores["c"] == pytest.approx(0.5)
+    assert scores["a"] < scores["b"]
+    assert [hit.score for hit in hits] == sorted(scores.values(), reverse=True)
+
+
+def test_an_index_of_empty_chunks_scores_zero_rather_than_nan():
+    engine = LocalSearchEngine(dim=DIM)
+    engine.index_document(_source(("", [1, 0, 0, 0]), ("...", [0, 1, 0, 0])))
+
+    with np.errstate(all="raise"):
+        scores = engine.keyword_chunk_scores("anything")
+
+    assert np.isfinite(scores).all()
+    assert engine.keyword_search("anything") == []
+
+
+@pytest.mark.parametrize("typecode", ["I", "L", "Q"])
+def test_columns_are_viewed_with_their_own_item_size(typecode):
+    np.testing.assert_array_equal(_as_numpy(array(typecode, [1, 2, 2**31])), [1, 2, 2**31])
@@ -0,0 +1,32 @@
+import opensearch_client
+from opensearch_client import client_options, get_opensearch_client
+from serializer import OrjsonSerializer
+
+
+def test_hosts_are_parsed_into_a_pool():
+    options = client_options(hosts="node1:9200, node2:9201")
+    assert options["hosts"] == [{"host": "node1", "port": 9200}, {"host": "node2", "port": 9201}]
+    assert options["http_compress"] is True
+    assert isinstance(options["serializer"], OrjsonSerializer)
+
+
+def test_sniffing_is_opt_in():
+    assert "sniff_on_start" not in client_options()
+    assert client_options(sniff=True, sniff_interval=30)["sniffer_timeout"] == 30
+
+
+def test_one_client_per_process_and_options(monkeypatch):
+    monkeypatch.setattr(opensearch_client, "_clients", {})
+    client = get_opensearch_client(hosts="localhost:9200")
+
+    assert get_opensearch_client(hosts="localhost:9200") is client
+    assert get_opensearch_client(hosts="localhost:9201") is not client
+
+
+def test_a_forked_child_builds_its_own_clients(monkeypatch):
+    monkeypatch.setattr(opensearch_client, "_clients", {})
+    client = get_opensearch_client()
+    # What a child process sees: the parent's clients under another pid
+    monkeypatch.setattr(opensearch_client, "_clients_pid", -1)
+
+    assert get_opensearch_client() is not client
@@ -0,0 +1,41 @@
+import numpy as np
+
+import utils
+from conftest import FakeModel, fake_vector
+from query_cache import QueryVectorCache
+from utils import TextType, batch_vectorize, content_hash
+
+
+def test_encode_local_uses_the_model_it_is_given(monkeypatch):
+    def no_default_model():
+        raise AssertionError("the default model should not be loaded")
+
+    monkeypatch.setattr(utils, "get_model", no_default_model)
+    model = FakeModel()
+
+    embeddings = utils._encode_local(["query: a", "query: b"], batch_size=2, model=model)
+
+    assert model.encoded == [["query: a", "query: b"]]
+    np.testing.assert_array_equal(embeddings[1], fake_vector("query: b"))
+
+
+def test_content_hashes_change_with_the_model_id(monkeypatch):
+    float32_hash = content_hash("text")
+    monkeypatch.setattr(utils, "MODEL_ID", f"{utils.MODEL_NAME}:int8")
+
+    assert content_hash("text") != float32_hash
+    assert content_hash("text") == content_hash("text")
+
+
+def test_embedding_cache_entries_are_per_model_id(fake_model, monkeypatch):
+    batch_vectorize([("text", TextType.PASSAGE)])
+    batch_vectorize([("text", TextType.PASSAGE)])
+    assert len(fake_model.encoded) == 1
+
+    monkeypatch.setattr(utils, "MODEL_ID", f"{utils.MODEL_NAME}:int8")
+    batch_vectorize([("text", TextType.PASSAGE)])
+    assert len(fake_model.encoded) == 2
+
+
+def test_query_vectors_are_cached_per_model_id():
+    assert QueryVectorCache().model_name == utils.MODEL_ID
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+from query_builder import (
+    COMPLETE_TEMPLATE,
+    DEFAULT_SOURCE,
+    OMIT,
+    SEARCH_BODY_VARIANTS,
+    Param,
+    SearchFilters,
+    build_search_body,
+    compile_template,
+    template_params,
+)
+
+
+def test_filters_give_canonical_clauses():
+    first = SearchFilters(document_sets=["b", "a", "b"], metadata={"space": ["IT", "HR"], "team": "x"})
+    second = SearchFilters(document_sets=["a", "b"], metadata={"team": "x", "space": ["HR", "IT"]})
+
+    assert first.to_clauses() == second.to_clauses()
+    assert first.to_clauses()[:2] == [{"term": {"not_hidden": True}}, {"terms": {"document_sets": ["a", "b"]}}]
+    assert [
+        [term["term"]["metadata.value"] for term in clause["nested"]["query"]["bool"]["filter"][1:]]
+        for clause in first.to_clauses()[2:]
+    ] == [["HR"], ["IT"], ["x"]]
+
+
+def test_empty_filters_only_hide_hidden_documents():
+    assert SearchFilters().to_clauses() == [{"term": {"not_hidden": True}}]
+    assert SearchFilters(include_hidden=True, source_types=[]).to_clauses() == []
+
+
+def test_date_range_has_only_the_given_bounds():
+    clauses = SearchFilters(include_hidden=True, last_updated_from=datetime(2023, 11, 14)).to_clauses()
+    assert clauses == [{"range": {"last_updated": {"gte": "2023-11-14T00:00:00"}}}]
+
+
+def test_compiled_templates_fill_params_and_share_static_subtrees():
+    static = {"script": {"source": "x"}}
+    build = compile_template({"size": Param("size"), "query": [{"term": Param("term")}, static], "filter": Param("filter")})
+
+    first = build({"size": 1, "term": "a", "filter": OMIT})
+    second = build({"size": 2, "term": "b", "filter": []})
+
+    assert first == {"size": 1, "query": [{"term": "a"}, static]}
+    assert second == {"size": 2, "query": [{"term": "b"}, static], "filter": []}
+    assert first["query"][1] is second["query"][1] is static
+
+
+def test_template_params():
+    assert template_params(COMPLETE_TEMPLATE) == {"size", "source", "query", "query_vector", "k", "inner_hits_source", "filters"}
+    assert template_params({"a": [1, {"b": 2}]}) == set()
+
+
+@pytest.mark.parametrize("variant", SEARCH_BODY_VARIANTS)
+def test_every_variant_builds(variant):
+    body = build_search_body(variant, "query", [0.5, 0.5], max_num_results=7)
+
+    assert body["size"] == 7
+    assert body["_source"] == DEFAULT_SOURCE
+
+
+def test_only_the_complete_variant_applies_filters():
+    filters = SearchFilters(document_sets=["set1"])
+
+    complete = build_search_body("complete", "query", [0.5], filters=filters)
+    assert complete["query"]["bool"]["filter"] == filters.to_clauses()
+    assert "filter" not in build_search_body("complete", "query", [0.5], filters=SearchFilters(include_hidden=True))["query"]["bool"]
+    assert "bool" not in build_search_body("hybrid_outside", "query", [0.5], filters=filters)["query"]
+
+
+def test_none_sources_are_left_out():
+    body = build_search_body("hybrid_outside", "query", [0.5], source=None, inner_hits_source=None)
+
+    assert "_source" not in body
+    assert "_source" not in body["query"]["hybrid"]["queries"][0]["nested"]["inner_hits"]
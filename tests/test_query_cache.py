@@ -0,0 +1,109 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import query_cache
+from conftest import fake_vector
+from fakes import FakeClock
+from query_cache import QueryVectorCache, normalize_query
+
+
+def test_normalize_query_folds_case_and_whitespace():
+    assert normalize_query("  Weather in\tFlorida \n") == "weather in florida"
+
+
+def test_hits_share_one_encode_per_normalized_query(fake_model):
+    cache = QueryVectorCache()
+
+    first = cache.get("Florida weather")
+    second = cache.get("florida   WEATHER")
+
+    assert second is first
+    np.testing.assert_array_equal(first, fake_vector("query: florida weather"))
+    assert fake_model.encoded == [["query: florida weather"]]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(fake_model):
+    cache = QueryVectorCache(max_entries=2)
+
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    cache.get("a")
+    cache.get("b")
+
+    assert [text for batch in fake_model.encoded for text in batch] == ["query: a", "query: b", "query: c", "query: b"]
+
+
+def test_entries_expire_after_the_ttl(fake_model, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    cache = QueryVectorCache(ttl_seconds=10)
+
+    cache.get("a")
+    clock.now += 9
+    cache.get("a")
+    clock.now += 2
+    cache.get("a")
+
+    assert len(fake_model.encoded) == 2
+    assert cache.stats()["expired"] == 1
+
+
+class _BlockingCache(QueryVectorCache):
+    def __init__(self, fail: bool = False):
+        super().__init__()
+        self.release = threading.Event()
+        self.encodes = 0
+        self.fail = fail
+
+    def _encode(self, normalized_query: str) -> np.ndarray:
+        self.encodes += 1
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("model failed")
+        return fake_vector(normalized_query)
+
+
+def _concurrent_gets(cache: _BlockingCache, num_threads: int) -> list:
+    with ThreadPoolExecutor(num_threads) as pool:
+        futures = [pool.submit(cache.get, "same query") for _ in range(num_threads)]
+        # Every thread is either encoding or waiting on the one encode before it is released
+        while cache.stats()["misses"] + cache.stats()["coalesced"] < num_threads:
+            pass
+        cache.release.set()
+        return [future.exception() or future.result() for future in futures]
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = _BlockingCache()
+
+    vectors = _concurrent_gets(cache, 4)
+
+    assert cache.encodes == 1
+    assert all(vector is vectors[0] for vector in vectors)
+    assert cache.stats()["coalesced"] == 3
+
+
+def test_a_failed_encode_reaches_every_waiter_and_is_not_cached():
+    cache = _BlockingCache(fail=True)
+
+    errors = _concurrent_gets(cache, 3)
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    cache.fail = False
+    assert cache.get("same query") is not None
+    assert cache.encodes == 2
+
+
+def test_clear_drops_every_entry(fake_model):
+    cache = QueryVectorCache()
+    cache.get("a")
+    cache.clear()
+    cache.get("a")
+
+    assert len(fake_model.encoded) == 2
+    assert cache.stats()["entries"] == 1
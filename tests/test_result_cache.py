@@ -0,0 +1,131 @@
+from types import SimpleNamespace
+
+import pytest
+
+import full_example
+import result_cache
+from bulk_indexing import bulk_index_documents
+from fakes import FakeBulkClient, FakeClock
+from result_cache import SearchResultCache, search_cache_key
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    return clock
+
+
+def _search(response: dict):
+    calls = []
+
+    def search():
+        calls.append(1)
+        return response
+
+    return search, calls
+
+
+def test_cache_key_ignores_dict_key_order():
+    assert search_cache_key(query="q", filters={"a": 1, "b": [1, 2]}) == search_cache_key(filters={"b": [1, 2], "a": 1}, query="q")
+    assert search_cache_key(query="q", size=10) != search_cache_key(query="q", size=20)
+
+
+def test_entries_are_served_until_their_index_is_written(clock):
+    cache = SearchResultCache(refresh_interval_seconds=0)
+    search, calls = _search({"hits": {}})
+
+    assert cache.get_or_search("key", "index", search) is cache.get_or_search("key", "index", search)
+    assert len(calls) == 1
+
+    cache.bump_write_generation("other-index")
+    cache.get_or_search("key", "index", search)
+    assert len(calls) == 1
+
+    cache.bump_write_generation("index")
+    cache.get_or_search("key", "index", search)
+    assert len(calls) == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_stale_entries_are_served_within_max_staleness(clock):
+    cache = SearchResultCache(refresh_interval_seconds=0)
+    search, calls = _search({})
+    cache.get_or_search("key", "index", search)
+    cache.bump_write_generation("index")
+
+    clock.now += 5
+    cache.get_or_search("key", "index", search, max_staleness_seconds=10)
+    assert len(calls) == 1
+    assert cache.stats()["stale_hits"] == 1
+
+    clock.now += 10
+    cache.get_or_search("key", "index", search, max_staleness_seconds=10)
+    assert len(calls) == 2
+
+
+def test_results_are_not_cached_within_the_refresh_interval_of_a_write(clock):
+    cache = SearchResultCache(refresh_interval_seconds=1)
+    search, calls = _search({})
+    cache.bump_write_generation("index")
+
+    cache.get_or_search("key", "index", search)
+    cache.get_or_search("key", "index", search)
+    assert len(calls) == 2
+
+    clock.now += 1
+    cache.get_or_search("key", "index", search)
+    cache.get_or_search("key", "index", search)
+    assert len(calls) == 3
+
+
+def test_a_write_during_the_search_keeps_the_result_out(clock):
+    cache = SearchResultCache(refresh_interval_seconds=0)
+
+    def search():
+        cache.bump_write_generation("index")
+        return {}
+
+    cache.get_or_search("key", "index", search)
+    assert cache.get("key", "index") is None
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = SearchResultCache(max_entries=2, refresh_interval_seconds=0)
+    for key in ["a", "b", "a", "c"]:
+        cache.get_or_search(key, "index", lambda: {"key": key})
+
+    assert cache.get("b", "index") is None
+    assert cache.get("a", "index") == {"key": "a"}
+
+
+def test_bulk_indexing_bumps_once_per_bulk_request():
+    client = FakeBulkClient(reject_once={"d1"})
+    documents = [SimpleNamespace(document_id=f"d{i}") for i in range(5)]
+    before = result_cache.search_result_cache.write_generation("index")
+
+    bulk_index_documents(client, "index", documents, lambda batch: [{} for _ in batch], chunk_size=2, initial_backoff=0)
+
+    # Three requests for the five documents plus one retrying the rejected one
+    assert len(client.requests) == 4
+    assert result_cache.search_result_cache.write_generation("index") == before + 4
+
+
+def test_index_documents_bumps_once_for_the_lot(monkeypatch):
+    class _IndexClient:
+        def __init__(self):
+            self.indexed = []
+
+        def index(self, index, body, id):
+            self.indexed.append(id)
+            return {"result": "created"}
+
+    documents = [SimpleNamespace(document_id=f"d{i}", title=f"title {i}") for i in range(3)]
+    monkeypatch.setattr(full_example, "build_index_bodies", lambda batch: [{} for _ in batch])
+    client = _IndexClient()
+    before = result_cache.search_result_cache.write_generation("index")
+
+    full_example.index_documents(client, "index", documents)
+
+    assert client.indexed == ["d0", "d1", "d2"]
+    assert result_cache.search_result_cache.write_generation("index") == before + 1
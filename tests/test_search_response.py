@@ -0,0 +1,72 @@
+import full_example
+from benchmarks.search_response import _exclude
+from fakes import FakeSearchClient
+from query_builder import DEFAULT_INNER_HITS_SOURCE, DEFAULT_SOURCE
+from search_response import ChunkResult, SearchResults
+
+
+def _response() -> dict:
+    return {
+        "took": 12,
+        "hits": {
+            "total": {"value": 2},
+            "hits": [
+                {
+                    "_id": "a",
+                    "_score": 0.9,
+                    "_source": {"title": "Title a"},
+                    "matched_queries": {"chunk_vector_score": 0.8},
+                    "inner_hits": {"chunks": {"hits": {"hits": [
+                        {"_score": 0.8, "_nested": {"field": "chunks", "offset": 4}, "_source": {"chunk_index": 2, "content": "two"}, "matched_queries": ["chunk_vector_score"]},
+                        {"_score": 0.5, "_nested": {"field": "chunks", "offset": 1}, "_source": {"content": "one"}},
+                    ]}}},
+                },
+                {"_id": "b", "_score": 0.4},
+            ],
+        },
+    }
+
+
+def test_results_read_the_response_lazily():
+    response = _response()
+    results = SearchResults(response)
+
+    assert (results.took_ms, results.total, len(results)) == (12, 2, 2)
+    first, second = results
+    assert (first.document_id, first.score, first.title, first.named_scores) == ("a", 0.9, "Title a", {"chunk_vector_score": 0.8})
+    assert first._chunks is None
+    assert (second.title, second.chunks, second.named_scores) == (None, [], {})
+    assert response == _response()
+
+
+def test_chunks_use_the_stored_chunk_index_then_the_nested_offset():
+    chunks = list(SearchResults(_response()).chunks())
+
+    assert [(chunk.document_id, chunk.chunk_index, chunk.content) for chunk in chunks] == [("a", 2, "two"), ("a", 1, "one")]
+    assert chunks[0].named_scores == {"chunk_vector_score": None}
+    assert ChunkResult.from_inner_hit("a", {}).chunk_index is None
+
+
+def test_long_contents_are_shortened_in_repr():
+    chunk = ChunkResult("a", 0, "x" * 100, 1.0, {})
+    assert "x" * 57 + "..." in repr(chunk)
+    assert "x" * 58 not in repr(chunk)
+
+
+def test_default_excludes_leave_vectors_chunks_and_content_out():
+    body = {"title": "t", "content": "full text", "title_vector": [0.1], "chunks": [{"content": "c", "embedding": [0.2]}]}
+
+    assert _exclude(body, DEFAULT_SOURCE["excludes"]) == {"title": "t"}
+    assert _exclude({"chunks": body["chunks"]}, DEFAULT_INNER_HITS_SOURCE["excludes"]) == {"chunks": [{"content": "c"}]}
+
+
+def test_hybrid_search_sends_the_default_excludes(monkeypatch):
+    monkeypatch.setattr(full_example, "embed_query", lambda query: [0.5])
+    client = FakeSearchClient(_response())
+
+    full_example.hybrid_search(client, "index", "query", use_cache=False)
+
+    body = client.requests[0]["body"]
+    assert body["_source"] == DEFAULT_SOURCE
+    inner_hits = body["query"]["hybrid"]["queries"][0]["nested"]["inner_hits"]
+    assert inner_hits["_source"] == DEFAULT_INNER_HITS_SOURCE
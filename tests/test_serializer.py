@@ -0,0 +1,50 @@
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from opensearchpy.exceptions import SerializationError
+from opensearchpy.serializer import JSONSerializer
+
+from serializer import OrjsonSerializer
+
+
+def test_numpy_and_datetimes_are_encoded_natively():
+    data = {
+        "embedding": np.array([0.5, -1.25], dtype=np.float32),
+        "count": np.int64(3),
+        "last_updated": datetime(2023, 11, 15, 12, 30),
+    }
+
+    assert json.loads(OrjsonSerializer().dumps(data)) == {
+        "embedding": [0.5, -1.25],
+        "count": 3,
+        "last_updated": "2023-11-15T12:30:00",
+    }
+
+
+def test_matches_the_default_serializer_on_plain_bodies():
+    body = {"query": {"bool": {"filter": [{"term": {"not_hidden": True}}]}}, "size": 10, "name": "é"}
+
+    assert json.loads(OrjsonSerializer().dumps(body)) == json.loads(JSONSerializer().dumps(body))
+
+
+def test_falls_back_to_the_default_serializer_for_other_types():
+    identifier = uuid.UUID(int=1)
+
+    assert json.loads(OrjsonSerializer().dumps({"id": identifier, "price": Decimal("1.5")})) == {"id": str(identifier), "price": 1.5}
+
+
+def test_strings_pass_through_as_already_serialized():
+    bulk_lines = '{"index":{}}\n{"title":"t"}\n'
+    assert OrjsonSerializer().dumps(bulk_lines) is bulk_lines
+
+
+def test_errors_are_serialization_errors():
+    with pytest.raises(SerializationError):
+        OrjsonSerializer().dumps({"value": object()})
+    with pytest.raises(SerializationError):
+        OrjsonSerializer().loads("{not json")
+    assert OrjsonSerializer().loads(b'{"took": 3}') == {"took": 3}
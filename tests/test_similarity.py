@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import utils
+from conftest import fake_vector
+from similarity import embed_unique, find_near_duplicates, normalize_rows, similarity_matrix, top_k_similar
+
+
+def test_embed_unique_encodes_each_text_once(fake_model):
+    vectors = embed_unique(["a", "b", "a"])
+
+    assert sorted(text for batch in fake_model.encoded for text in batch) == ["passage: a", "passage: b"]
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-6)
+
+
+def test_embed_unique_of_nothing_is_an_empty_matrix(fake_model):
+    vectors = embed_unique([])
+
+    assert vectors.shape == (0, utils.EMBEDDING_DIM)
+    assert vectors.dtype == np.float32
+    assert fake_model.encoded == []
+
+
+def test_similarity_matrix_is_cosine():
+    a = np.array([[1.0, 0.0], [0.0, 0.0]])
+    b = np.array([[2.0, 0.0], [1.0, 1.0]])
+
+    np.testing.assert_allclose(similarity_matrix(a, b), [[1.0, np.sqrt(0.5)], [0.0, 0.0]], rtol=1e-6)
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 100])
+def test_top_k_matches_a_full_sort(block_size):
+    rng = np.random.default_rng(0)
+    queries, corpus = rng.standard_normal((4, 8)), rng.standard_normal((20, 8))
+
+    indices, scores = top_k_similar(queries, corpus, k=5, block_size=block_size)
+
+    full = similarity_matrix(queries, corpus)
+    np.testing.assert_array_equal(indices, np.argsort(-full, axis=1, kind="stable")[:, :5])
+    np.testing.assert_allclose(scores, np.sort(full, axis=1)[:, ::-1][:, :5], rtol=1e-6)
+
+
+def test_top_k_is_capped_at_the_corpus_size():
+    indices, _ = top_k_similar(np.ones(3), np.eye(3), k=10)
+    assert indices.shape == (1, 3)
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 4096])
+def test_near_duplicates_match_brute_force(fake_model, block_size):
+    texts = ["alpha", "beta", "alpha", "gamma", "beta", "alpha"]
+
+    pairs = find_near_duplicates(texts, threshold=0.99, block_size=block_size)
+
+    vectors = normalize_rows(np.stack([fake_vector(f"passage: {text}") for text in texts]))
+    expected = [
+        (i, j) for i in range(len(texts)) for j in range(i + 1, len(texts))
+        if vectors[i] @ vectors[j] >= 0.99
+    ]
+    assert [(i, j) for i, j, _ in pairs] == expected == [(0, 2), (0, 5), (1, 4), (2, 5)]
+    assert all(score == pytest.approx(1.0) for _, _, score in pairs)
+
+
+def test_get_cosine_sim_goes_through_the_similarity_module(fake_model):
+    expected = normalize_rows(fake_vector("passage: a")) @ normalize_rows(fake_vector("passage: b"))
+
+    assert utils.get_cosine_sim("a", "b") == pytest.approx(float(expected), rel=1e-6)
+    assert utils.get_cosine_sim("a", "a") == pytest.approx(1.0)
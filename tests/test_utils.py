@@ -0,0 +1,37 @@
+import numpy as np
+
+import utils
+from conftest import fake_vector
+from utils import TextType, batch_vectorize
+
+
+def test_batch_vectorize_keeps_input_order(fake_model):
+    texts = ["a b c d e", "a", "a b c", "a b"]
+    vectors = batch_vectorize([(text, TextType.PASSAGE) for text in texts], batch_size=2)
+
+    for text, vector in zip(texts, vectors):
+        np.testing.assert_array_equal(vector, fake_vector(f"passage: {text}"))
+    assert all(vector.dtype == np.float32 for vector in vectors)
+
+
+def test_batch_vectorize_buckets_batches_by_length(fake_model):
+    texts = ["a b c d e", "a", "a b c", "a b"]
+    batch_vectorize([(text, TextType.PASSAGE) for text in texts], batch_size=2, use_cache=False)
+
+    assert fake_model.encoded == [["passage: a", "passage: a b"], ["passage: a b c", "passage: a b c d e"]]
+
+
+def test_batch_vectorize_encodes_repeated_texts_once(fake_model):
+    vectors = batch_vectorize([("same", TextType.PASSAGE), ("same", TextType.PASSAGE), ("same", TextType.QUERY)])
+
+    assert sorted(text for batch in fake_model.encoded for text in batch) == ["passage: same", "query: same"]
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+
+
+def test_batch_vectorize_empty(fake_model):
+    assert batch_vectorize([]) == []
+    assert fake_model.encoded == []
+
+
+def test_vectorize_matches_batch(fake_model):
+    np.testing.assert_array_equal(utils.vectorize("hello", TextType.QUERY), fake_vector("query: hello"))
@@ -1,32 +1,222 @@
-from sentence_transformers import SentenceTransformer  # type:ignore
-from sentence_transformers.util import cos_sim  # type:ignore
+import hashlib
+import os
+import threading
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+import numpy as np
 from enum import Enum
 
+from embedding_cache import EmbeddingCache, embedding_cache_key
+
+if TYPE_CHECKING:
+    from embedding_pool import EmbeddingPool
+    from sentence_transformers import SentenceTransformer  # type:ignore
+    from transformers import PreTrainedTokenizerFast  # type:ignore
+
 
+MODEL_NAME = "intfloat/e5-small-v2"
 EMBEDDING_DIM = 384
+# Model window in tokens, counting [CLS], [SEP] and the "passage: " / "query: " prefix
+MAX_SEQ_LENGTH = 512
+# Number of texts per forward pass, larger is faster on CPU until memory bandwidth becomes the limit
+EMBEDDING_BATCH_SIZE = 32
+# Setting the directory to an empty string keeps the cache in memory only
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", ".embedding_cache")
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 100_000))
+# "int8" runs the model's linear layers with dynamically quantized int8 weights, faster on CPU
+# at a small cost in accuracy (python -m benchmarks.quantization measures both). Empty for float32.
+EMBEDDING_QUANTIZATION = os.environ.get("EMBEDDING_QUANTIZATION", "")
+# Vectors from a quantized model differ slightly, so caches key on this rather than MODEL_NAME
+MODEL_ID = f"{MODEL_NAME}:{EMBEDDING_QUANTIZATION}" if EMBEDDING_QUANTIZATION else MODEL_NAME
+# Above 0, large encodes are spread over this many worker processes (see embedding_pool)
+EMBEDDING_WORKERS = int(os.environ.get("EMBEDDING_WORKERS", 0))
 
 
 class TextType(Enum):
     PASSAGE = "passage"
     QUERY = "query"
 
-model = SentenceTransformer('intfloat/e5-small-v2')
+# Importing sentence_transformers pulls in torch and building the model loads the weights, both take
+# seconds so neither happens until something actually needs an embedding
+_model: "SentenceTransformer | None" = None
+_model_lock = threading.Lock()
+
+
+def load_model(quantization: str = EMBEDDING_QUANTIZATION) -> "SentenceTransformer":
+    from sentence_transformers import SentenceTransformer  # type:ignore
+    model = SentenceTransformer(MODEL_NAME, device="cpu" if quantization else None)
+    if quantization == "int8":
+        import torch  # type:ignore
+        # Weights are quantized once here, activations are quantized on the fly per batch.
+        # Only the Linear layers (attention projections and feed forward, nearly all the compute)
+        # are swapped, embeddings and layer norms stay float32.
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif quantization:
+        raise ValueError(f"Unknown embedding quantization {quantization}")
+    return model
+
+
+def get_model() -> "SentenceTransformer":
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
+    return _model
+
+
+_tokenizer: "PreTrainedTokenizerFast | None" = None
+
+
+def get_tokenizer() -> "PreTrainedTokenizerFast":
+    # Chunking only needs the tokenizer, which loads in a fraction of the time the model takes.
+    # Once the model is loaded its own tokenizer is the same thing.
+    global _tokenizer
+    if _model is not None:
+        return _model.tokenizer
+    if _tokenizer is None:
+        with _model_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer  # type:ignore
+                _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
+    return _tokenizer
+
+
+embedding_cache = EmbeddingCache(
+    max_entries=EMBEDDING_CACHE_SIZE,
+    dim=EMBEDDING_DIM,
+    disk_directory=EMBEDDING_CACHE_DIR or None,
+)
+
+
+def content_hash(text: str) -> str:
+    # Stored next to each indexed chunk and title. The model, quantization included, is part of it
+    # so that switching either makes every stored vector look changed.
+    return hashlib.sha256(f"{MODEL_ID}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _prefix_text(text: str, text_type: TextType) -> str:
+    return f"{text_type.value}: {text}"
+
+
+def vectorize(text: str, text_type: TextType) -> np.ndarray:
+    return batch_vectorize([(text, text_type)])[0]
+
+
+_embedding_pool: "EmbeddingPool | None" = None
+# Set by use_embedding_pool(None), keeps EMBEDDING_WORKERS from starting a pool again
+_embedding_pool_disabled = False
+_embedding_pool_lock = threading.Lock()
+
+
+def use_embedding_pool(pool: "EmbeddingPool | None"):
+    # Routes large encodes through the given pool, None goes back to encoding in process even
+    # with EMBEDDING_WORKERS set. The pool being replaced is closed, its workers exit.
+    global _embedding_pool, _embedding_pool_disabled
+    with _embedding_pool_lock:
+        previous, _embedding_pool = _embedding_pool, pool
+        _embedding_pool_disabled = pool is None
+    if previous is not None and previous is not pool:
+        previous.close()
+
+
+def _get_embedding_pool() -> "EmbeddingPool | None":
+    global _embedding_pool
+    if _embedding_pool is None and not _embedding_pool_disabled and EMBEDDING_WORKERS > 0:
+        with _embedding_pool_lock:
+            if _embedding_pool is None and not _embedding_pool_disabled:
+                from embedding_pool import EmbeddingPool
+                _embedding_pool = EmbeddingPool(EMBEDDING_WORKERS)
+    return _embedding_pool
+
+
+def _encode(prefixed_texts: list[str], batch_size: int) -> np.ndarray:
+    # Anything up to one batch, a query for instance, isn't worth the round trip to the pool
+    pool = _get_embedding_pool()
+    if pool is not None and len(prefixed_texts) > batch_size:
+        return pool.encode(prefixed_texts, batch_size)
+    return _encode_local(prefixed_texts, batch_size)
+
+
+def _encode_local(prefixed_texts: list[str], batch_size: int, model: "SentenceTransformer | None" = None) -> np.ndarray:
+    # Bucket by token length so every batch is padded to roughly its own length instead of
+    # the longest text in the whole input. Anything past the model window is truncated by
+    # the model anyway so there is no point counting beyond it.
+    if model is None:
+        model = get_model()
+    token_ids = model.tokenizer(
+        prefixed_texts,
+        truncation=True,
+        max_length=model.max_seq_length,
+    )["input_ids"]
+    order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+
+    embeddings = np.empty((len(prefixed_texts), EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        embeddings[batch_indices] = model.encode(
+            [prefixed_texts[i] for i in batch_indices],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+        )
+    return embeddings
+
+
+def batch_vectorize(
+    items: Sequence[tuple[str, TextType]],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    use_cache: bool = True,
+) -> list[np.ndarray]:
+    # Returns one float32 vector per (text, text_type) pair, in the same order as the input
+    if not items:
+        return []
+
+    prefixed_texts = [_prefix_text(text, text_type) for text, text_type in items]
+    if not use_cache:
+        return list(_encode(prefixed_texts, batch_size))
+
+    keys = [embedding_cache_key(MODEL_ID, text_type.value, text) for text, text_type in items]
+    embeddings = np.empty((len(items), EMBEDDING_DIM), dtype=np.float32)
+
+    # Identical texts within one call are only encoded once
+    missing: dict[str, list[int]] = {}
+    for i, (key, cached) in enumerate(zip(keys, embedding_cache.get_many(keys))):
+        if cached is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            embeddings[i] = cached
+
+    if missing:
+        missing_keys = list(missing)
+        encoded = _encode([prefixed_texts[missing[key][0]] for key in missing_keys], batch_size)
+        for key, vector in zip(missing_keys, encoded):
+            embeddings[missing[key]] = vector
+        embedding_cache.put_many(missing_keys, encoded)
+
+    # Rows are views into the one contiguous matrix
+    return list(embeddings)
+
 
+def warmup(client=None, index_name: str | None = None):
+    # Loads the model and runs one throwaway encode so the first real query doesn't pay for
+    # lazy allocations. With a client, also loads the index's HNSW graphs into native memory.
+    # Note the k-NN warmup API only applies to the nmslib and faiss engines, lucene graphs
+    # are read through the page cache and warm up on their own as they get queried.
+    _encode([_prefix_text("warmup", TextType.QUERY)], batch_size=1)
 
-def vectorize(text: str, text_type: TextType) -> list[float]:
-    prefixed_text = f"{text_type.value}: {text}"
-    embedding = model.encode(prefixed_text)
-    return embedding.tolist()  # type:ignore
+    if client is not None and index_name is not None:
+        return client.transport.perform_request("GET", f"/_plugins/_knn/warmup/{index_name}")
+    return None
 
 
 def get_cosine_sim(
     text1: str,
     text2: str
 ) -> float:
-    embedding1 = vectorize(text1, TextType.PASSAGE)
-    embedding2 = vectorize(text2, TextType.PASSAGE)
-    similarity = cos_sim(embedding1, embedding2)
-    return similarity.item()
+    # Kept for existing callers, similarity has the batched versions (imported here as it imports utils)
+    from similarity import text_similarity_matrix
+    return text_similarity_matrix([text1], [text2]).item()
 
 
 def min_max_normalize(number: float, min_value: float, max_value: float) -> float: